@@ -1,27 +1,156 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, inspect, text, func, literal_column, Column, Integer, String, DateTime, ForeignKey, Text, Table, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Mapped, mapped_column, DeclarativeBase
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import sessionmaker, relationship, Mapped, mapped_column, DeclarativeBase, Session
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from datetime import datetime
 from app.config import settings
-from typing import Optional, List
+from typing import Any, Callable, Dict, Optional, List, TypeVar, Union
+
+T = TypeVar("T")
 
 # Importar settings apenas quando necessário para evitar import circular
 def get_database_url():
     from app.config import settings
     return settings.DATABASE_URL
 
-engine = create_engine(
-    get_database_url(),
-    pool_pre_ping=True,
-    echo=False,
-    connect_args={
-        "client_encoding": "utf8",
-        "options": "-c client_encoding=utf8",
-        "sslmode": "allow"
-    }
-)
+# Argumentos do psycopg2 usados pelos engines síncronos do PostgreSQL
+SYNC_CONNECT_ARGS = {
+    "client_encoding": "utf8",
+    "options": "-c client_encoding=utf8",
+    "sslmode": "allow"
+}
+
+def pool_options(url: str, async_driver: bool = False) -> dict:
+    """Configuração do pool de conexões definida em ``Settings``.
+
+    Com ``DB_PGBOUNCER`` o pool fica a cargo do PgBouncer: cada sessão abre e
+    fecha sua conexão (NullPool) e o asyncpg não usa prepared statements,
+    que não sobrevivem ao modo de pool por transação.
+    """
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    # SQLite (testes e benchmarks) usa o pool padrão do dialeto
+    if make_url(url).get_backend_name() == "sqlite":
+        return options
+    if settings.DB_PGBOUNCER:
+        options["poolclass"] = NullPool
+        if async_driver:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+    return options
+
+def create_db_engine(url: Optional[str] = None) -> Engine:
+    """Engine síncrono (psycopg2) para o banco configurado (ou para ``url``)"""
+    url = url or get_database_url()
+    options = pool_options(url)
+    if make_url(url).get_backend_name() == "postgresql":
+        options["connect_args"] = {**SYNC_CONNECT_ARGS, **options.get("connect_args", {})}
+    return create_engine(url, echo=False, **options)
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de leitura: sem DATABASE_REPLICA_URL as leituras vão para o primário
+replica_engine = create_db_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+def get_async_database_url(url: Optional[str] = None) -> str:
+    """URL do banco com o driver assíncrono (asyncpg no PostgreSQL, aiosqlite no SQLite)"""
+    url = make_url(url or get_database_url())
+    drivers = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    return url.set(drivername=drivers.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+def create_async_db_engine(url: Optional[str] = None, **kwargs) -> AsyncEngine:
+    """AsyncEngine para o banco configurado (ou para ``url``)"""
+    url = get_async_database_url(url)
+    return create_async_engine(url, echo=False, **{**pool_options(url, async_driver=True), **kwargs})
+
+# Criados na primeira sessão assíncrona; com DB_MODE=sync o asyncpg nem é importado.
+# Chaves: "primary" e "replica" (a réplica reaproveita o primário se não configurada)
+async_engines: Dict[str, AsyncEngine] = {}
+async_sessionmakers: Dict[str, async_sessionmaker] = {}
+
+def get_async_sessionmaker(replica: bool = False) -> async_sessionmaker:
+    role = "replica" if replica and settings.DATABASE_REPLICA_URL else "primary"
+    if role not in async_sessionmakers:
+        async_engines[role] = create_async_db_engine(settings.DATABASE_REPLICA_URL if role == "replica" else None)
+        async_sessionmakers[role] = async_sessionmaker(async_engines[role], autoflush=False, expire_on_commit=False)
+    return async_sessionmakers[role]
+
+async def dispose_async_engines() -> None:
+    """Fecha as conexões dos AsyncEngines criados"""
+    for async_engine in async_engines.values():
+        await async_engine.dispose()
+    async_engines.clear()
+    async_sessionmakers.clear()
+
+class ThreadedSession:
+    """Session síncrona com a mesma interface ``await`` da ``AsyncSession``.
+
+    Usada com ``DB_MODE=sync``: cada operação roda no threadpool, então as
+    rotas escrevem o mesmo código nos dois modos e o event loop não fica
+    bloqueado esperando o psycopg2.
+    """
+
+    def __init__(self, sync_session: Session) -> None:
+        self.sync_session = sync_session
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    def get_bind(self):
+        return self.sync_session.get_bind()
+
+    async def run_sync(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance: Any, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+# Tipo da sessão recebida pelas rotas via get_db
+DBSession = Union[AsyncSession, ThreadedSession]
+
 class Base(DeclarativeBase):
     pass
 
@@ -34,11 +163,17 @@ class User(Base):
     email: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Incrementado a cada alteração nos projetos/arquivos do usuário (ETag das listagens)
+    cache_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     projects: Mapped[List["Project"]] = relationship("Project", back_populates="owner")
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Listagem paginada dos projetos do usuário por (created_at, id)
+        Index("ix_projects_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
@@ -46,37 +181,257 @@ class Project(Base):
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Incrementado a cada alteração no projeto ou nos seus arquivos (ETag das listagens)
+    cache_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     
     owner: Mapped["User"] = relationship("User", back_populates="projects")
-    files: Mapped[List["File"]] = relationship("File", back_populates="project")
+    # Os arquivos saem junto com o projeto via ON DELETE CASCADE no banco
+    files: Mapped[List["File"]] = relationship(
+        "File", back_populates="project", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        # Listagem paginada dos arquivos do projeto por (created_at, id)
+        Index("ix_files_project_created_id", "project_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     filename: Mapped[str] = mapped_column(String, nullable=False)
     file_path: Mapped[str] = mapped_column(String, nullable=False)
     file_type: Mapped[str] = mapped_column(String, nullable=False)
     size: Mapped[int] = mapped_column(Integer, nullable=False)
-    project_id: Mapped[int] = mapped_column(Integer, ForeignKey("projects.id"))
+    project_id: Mapped[int] = mapped_column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
     secondary_file_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # SHA-256 do conteúdo, usado para reaproveitar uploads repetidos
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    # pending/processing enquanto o upload assíncrono não termina; ready ou failed ao final
+    status: Mapped[str] = mapped_column(String, nullable=False, default="ready", server_default="ready")
+    # Última sincronização das tags com a API secundária (None = nunca sincronizado)
+    tags_synced_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Última tentativa da sincronização periódica, com ou sem sucesso: falhas vão para o fim da fila
+    tags_sync_attempted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Última falha ao buscar o conteúdo para as miniaturas: esses arquivos vão para o fim da fila
+    derivatives_attempted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     project: Mapped["Project"] = relationship("Project", back_populates="files")
+    tags: Mapped[List["Tag"]] = relationship("Tag", secondary="file_tags", order_by="Tag.name")
+
+class UploadJob(Base):
+    """Upload aceito e aguardando envio à API secundária (fila durável)"""
+    __tablename__ = "upload_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    file_id: Mapped[int] = mapped_column(Integer, ForeignKey("files.id", ondelete="CASCADE"), index=True)
+    # queued, running, done ou failed
+    status: Mapped[str] = mapped_column(String, nullable=False, default="queued", index=True)
+    staging_path: Mapped[str] = mapped_column(String, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-def get_db():
-    # Fornece sessão do banco de dados
-    db = SessionLocal()
-    try: 
+class SecondaryDeletion(Base):
+    """Arquivo a remover da API secundária (outbox processado em segundo plano)"""
+    __tablename__ = "secondary_deletions"
+    __table_args__ = (
+        # Próximos itens a processar
+        Index("ix_secondary_deletions_status_next", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    secondary_file_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    # pending ou failed; os itens concluídos são apagados
+    status: Mapped[str] = mapped_column(String, nullable=False, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class FileDerivative(Base):
+    """Miniatura/prévia gerada de um arquivo de imagem; o conteúdo fica no armazenamento por hash"""
+    __tablename__ = "file_derivatives"
+    __table_args__ = (
+        UniqueConstraint("file_id", "kind", name="uq_file_derivatives_file_kind"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    file_id: Mapped[int] = mapped_column(Integer, ForeignKey("files.id", ondelete="CASCADE"), nullable=False)
+    # thumbnail ou preview
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    # ready ou failed (imagem que não pôde ser lida; não é tentada de novo)
+    status: Mapped[str] = mapped_column(String, nullable=False, default="ready")
+    # SHA-256 do conteúdo gerado: nome do arquivo no armazenamento
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    media_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    width: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    height: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+# Associação N:N entre arquivos e tags
+file_tags = Table(
+    "file_tags",
+    Base.metadata,
+    Column("file_id", Integer, ForeignKey("files.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+
+# Busca por tag sem diferenciar maiúsculas/minúsculas
+Index("ix_tags_name_lower", func.lower(Tag.name))
+
+# Busca textual (PostgreSQL). As consultas precisam usar exatamente estas
+# expressões para que o planejador aproveite os índices GIN abaixo.
+SEARCH_TEXT_CONFIG = literal_column("'simple'")
+
+def file_search_document():
+    """tsvector do nome do arquivo"""
+    return func.to_tsvector(SEARCH_TEXT_CONFIG, func.coalesce(File.filename, literal_column("''")))
+
+def project_search_document():
+    """tsvector de nome, cliente e descrição do projeto"""
+    return func.to_tsvector(
+        SEARCH_TEXT_CONFIG,
+        func.coalesce(Project.name, literal_column("''"))
+        .op("||")(literal_column("' '"))
+        .op("||")(func.coalesce(Project.client_name, literal_column("''")))
+        .op("||")(literal_column("' '"))
+        .op("||")(func.coalesce(Project.description, literal_column("''")))
+    )
+
+def postgres_only(index: Index) -> Index:
+    """Marca o índice para ser criado apenas no PostgreSQL"""
+    index.info["dialect"] = "postgresql"
+    return index.ddl_if(dialect="postgresql")
+
+postgres_only(Index(
+    "ix_files_filename_trgm", File.filename,
+    postgresql_using="gin", postgresql_ops={"filename": "gin_trgm_ops"}
+))
+postgres_only(Index("ix_files_search_tsv", file_search_document(), postgresql_using="gin", _table=File.__table__))
+postgres_only(Index("ix_projects_search_tsv", project_search_document(), postgresql_using="gin", _table=Project.__table__))
+
+@asynccontextmanager
+async def open_session(replica: bool = False):
+    """Sessão no modo configurado em DB_MODE, no primário ou na réplica"""
+    if settings.DB_MODE == "async":
+        async with get_async_sessionmaker(replica)() as db:
+            yield db
+        return
+
+    # Sem expirar no commit, como a AsyncSession: evita recarregar atributos fora do threadpool
+    factory = ReplicaSessionLocal if replica else SessionLocal
+    db = ThreadedSession(factory(expire_on_commit=False))
+    try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+async def get_db():
+    # Fornece sessão do banco de dados no modo configurado em DB_MODE
+    async with open_session() as db:
+        yield db
+
+async def get_read_db():
+    # Sessão para rotas somente leitura: usa a réplica quando configurada
+    async with open_session(replica=True) as db:
+        yield db
+
+# Colunas adicionadas a tabelas já existentes (create_all só cria tabelas novas)
+COLUMN_MIGRATIONS = [
+    ("files", "tags_synced_at", "TIMESTAMP"),
+    ("files", "tags_sync_attempted_at", "TIMESTAMP"),
+    ("files", "derivatives_attempted_at", "TIMESTAMP"),
+    ("files", "status", "VARCHAR NOT NULL DEFAULT 'ready'"),
+    ("files", "content_hash", "VARCHAR(64)"),
+    ("users", "cache_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("projects", "cache_version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+def apply_column_migrations():
+    """Adiciona as colunas de COLUMN_MIGRATIONS que ainda não existem"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column, ddl in COLUMN_MIGRATIONS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                print(f"🔧 Adicionando coluna {table}.{column}")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+# Chaves estrangeiras que passaram a usar ON DELETE CASCADE: (tabela, coluna, tabela referenciada)
+CASCADE_MIGRATIONS = [
+    ("files", "project_id", "projects"),
+]
+
+def apply_cascade_migrations():
+    """Recria com ON DELETE CASCADE as chaves de CASCADE_MIGRATIONS criadas sem ele.
+
+    Só no PostgreSQL: o SQLite não altera constraints de tabelas existentes.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column, referred in CASCADE_MIGRATIONS:
+            for fk in inspector.get_foreign_keys(table):
+                if fk["constrained_columns"] != [column] or fk["referred_table"] != referred:
+                    continue
+                if (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+                    continue
+                print(f"🔧 Recriando {fk['name']} com ON DELETE CASCADE")
+                conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{fk["name"]}"'))
+                conn.execute(text(
+                    f'ALTER TABLE {table} ADD CONSTRAINT "{fk["name"]}" FOREIGN KEY ({column}) '
+                    f"REFERENCES {referred} (id) ON DELETE CASCADE"
+                ))
+
+def create_missing_indexes():
+    """Cria índices declarados nos modelos que ainda não existem no banco"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.info.get("dialect", conn.dialect.name) != conn.dialect.name:
+                    continue
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+# Índices que deixaram de existir nos modelos: files.project_id (ix_files_project_id)
+# foi substituído pelo composto ix_files_project_created_id, que cobre as mesmas buscas
+OBSOLETE_INDEXES = [
+    "ix_files_project_id",
+]
+
+def drop_obsolete_indexes():
+    """Remove de bancos já existentes os índices de OBSOLETE_INDEXES"""
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def enable_extensions():
+    """Habilita o pg_trgm, usado pelo índice de trigramas da busca"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
 
 def init_db():
     """Cria tabelas do banco de dados"""
     try:
         print("🔄 Iniciando criação das tabelas do banco de dados...")
+        enable_extensions()
         Base.metadata.create_all(bind=engine)
+        apply_column_migrations()
+        apply_cascade_migrations()
+        create_missing_indexes()
+        drop_obsolete_indexes()
         print("✅ Tabelas criadas com sucesso!")
     except Exception as e:
         print(f"❌ Erro ao criar tabelas: {str(e)}")
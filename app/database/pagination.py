@@ -0,0 +1,93 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.database.db import DBSession
+
+# Conversão do valor salvo no cursor de volta para o tipo da coluna
+_DECODERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: datetime.fromisoformat,
+    int: int,
+    str: str,
+}
+
+@dataclass
+class Page:
+    """Parâmetros de paginação por cursor (keyset) de uma listagem"""
+    sort: str
+    order: str
+    limit: int
+    cursor: Optional[str] = None
+
+def encode_cursor(sort: str, order: str, value: Any, row_id: int) -> str:
+    """Gera um cursor opaco com a posição do último item da página"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "o": order, "v": value, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str, value_type: type) -> Tuple[Any, int]:
+    """Lê o cursor; ele só vale para a mesma ordenação em que foi gerado"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["s"] != sort or data["o"] != order:
+            raise ValueError("ordenação diferente")
+        return _DECODERS[value_type](data["v"]), int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def paginate(
+    db: DBSession,
+    statement: Select,
+    page: Page,
+    sort_column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    value_type: type,
+) -> Tuple[List[Any], Optional[str]]:
+    """Aplica ordenação e cursor à consulta e retorna (itens, próximo cursor).
+
+    A posição é o par ``(sort_column, id)``, então cada página usa o índice
+    composto em vez de OFFSET. Consultas de uma só entidade retornam os
+    objetos; as demais retornam as linhas, que devem ter as colunas de
+    ordenação e id (projeção de colunas) ou o objeto paginado como primeiro
+    elemento.
+    """
+    key = tuple_(sort_column, id_column)
+    descending = page.order == "desc"
+
+    if page.cursor:
+        value, row_id = decode_cursor(page.cursor, page.sort, page.order, value_type)
+        position = tuple_(value, row_id)
+        statement = statement.where(key < position if descending else key > position)
+
+    if descending:
+        statement = statement.order_by(sort_column.desc(), id_column.desc())
+    else:
+        statement = statement.order_by(sort_column.asc(), id_column.asc())
+
+    result = await db.execute(statement.limit(page.limit + 1))
+    rows = result.scalars().all() if len(statement.column_descriptions) == 1 else result.all()
+    if len(rows) <= page.limit:
+        return rows, None
+
+    rows = rows[:page.limit]
+    last = rows[-1]
+    if isinstance(last, Row) and sort_column.key not in last._fields:
+        last = last[0]
+    return rows, encode_cursor(page.sort, page.order, getattr(last, sort_column.key), getattr(last, id_column.key))
+
+def set_next_page_headers(request: Request, response: Response, next_cursor: Optional[str]) -> None:
+    """Informa o próximo cursor nos cabeçalhos, mantendo o corpo como lista"""
+    if next_cursor is None:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
@@ -1,8 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.database.db import init_db
-from app.routes import auth, projects, files
+from app.database.db import init_db, dispose_async_engines
+from app.routes import auth, projects, files, metrics, admin
+from app.services.api_secondary import secondary_api
+from app.services.content_cache import content_cache
+from app.services.deletions import secondary_deletions
+from app.services.derivatives import derivative_worker
+from app.services.metrics import MetricsMiddleware, install_sqlalchemy_hooks, loop_lag_monitor
+from app.services.passwords import password_hasher
+from app.services.profiling import ProfilingMiddleware
+from app.services.tag_sync import tag_reconciler
+from app.services.upload_jobs import upload_queue
 from fastapi.responses import RedirectResponse
 
 app = FastAPI(
@@ -18,17 +27,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeçalhos de paginação, ETag e os do download precisam ser visíveis para o frontend
+    expose_headers=["X-Next-Cursor", "Link", "ETag", "Content-Range", "Accept-Ranges", "Content-Disposition"],
 )
 
 # Rotas
 app.include_router(auth.router)
 app.include_router(projects.router)
 app.include_router(files.router)
+app.include_router(admin.router)
+
+# Profiling das requisições lentas (PROFILING_ENABLED ou X-Profile: 1 com X-Admin-Token).
+# Registrado antes do MetricsMiddleware para rodar dentro dele e reaproveitar seus contadores
+if settings.PROFILING_ENABLED or settings.PROFILING_ADMIN_TOKEN:
+    install_sqlalchemy_hooks()
+    app.add_middleware(ProfilingMiddleware)
+
+# Métricas: latência por rota, consultas SQL, API secundária e event loop
+if settings.METRICS_ENABLED:
+    install_sqlalchemy_hooks()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
 
 @app.on_event("startup")
 async def startup_event():
     # Inicializa banco de dados
     init_db()
+    # Abre o pool de conexões com a API secundária
+    await secondary_api.startup()
+    # Reconstrói o índice do cache em disco do conteúdo dos arquivos
+    content_cache.load()
+    # Agenda a sincronização periódica das tags locais
+    tag_reconciler.start()
+    # Remove da API secundária os arquivos excluídos (outbox secondary_deletions)
+    secondary_deletions.start()
+    # Gera miniaturas e prévias das imagens enviadas (requer Pillow)
+    derivative_worker.start()
+    # Inicia os workers de upload e retoma os jobs pendentes no banco
+    await upload_queue.start()
+    if settings.METRICS_ENABLED:
+        loop_lag_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_lag_monitor.stop()
+    await upload_queue.stop()
+    await tag_reconciler.stop()
+    await secondary_deletions.stop()
+    # Encerra também o pool de processos das miniaturas
+    await derivative_worker.stop()
+    # Fecha as conexões mantidas com a API secundária
+    await secondary_api.shutdown()
+    # Fecha os pools dos AsyncEngines (DB_MODE=async)
+    await dispose_async_engines()
+    # Encerra o pool de hash de senhas
+    password_hasher.shutdown()
 
 @app.get("/", include_in_schema=False)
 async def root():
@@ -37,5 +90,10 @@ async def root():
 
 @app.get("/health")
 async def health():
-    # Verifica saúde da aplicação
-    return {"status": "healthy"}
\ No newline at end of file
+    # Verifica saúde da aplicação; com o circuito da API secundária aberto
+    # uploads falham rápido e as listagens usam só as tags em cache
+    resilience = secondary_api.resilience_stats()
+    return {
+        "status": "degraded" if resilience["circuit"]["state"] != "closed" else "healthy",
+        "secondary_api": resilience,
+    }
\ No newline at end of file
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
 
 # User Schemas
 class UserBase(BaseModel):
@@ -52,8 +52,54 @@ class FileResponse(FileBase):
     id: int
     project_id: int 
     tags: List[str] = []
+    status: str = "ready"
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class UploadAccepted(BaseModel):
+    job_id: Optional[int] = None  # None quando o conteúdo já havia sido processado
+    file_id: int
+    status: str
+    status_url: str
+
+class BatchUploadItem(BaseModel):
+    filename: str
+    status: str  # "created" ou "failed"
+    status_code: int
+    file: Optional[FileResponse] = None
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    project_id: int
+    created: int
+    failed: int
+    results: List[BatchUploadItem]
+
+class FileBulkDelete(BaseModel):
+    """Arquivos a excluir: pelos ids e/ou pelos filtros (combinados com E)"""
+    ids: Optional[List[int]] = None
+    project_id: Optional[int] = None
+    file_type: Optional[str] = None
+    tags: Optional[List[str]] = None
+    match: Literal["any", "all"] = "any"
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class ProjectBulkDelete(BaseModel):
+    ids: List[int]
+
+class DeleteResponse(BaseModel):
+    projects_deleted: int = 0
+    files_deleted: int
+    # Arquivos enfileirados para remoção na API secundária
+    secondary_deletions: int
+
+class FileStatusResponse(BaseModel):
+    file_id: int
+    status: str
+    job_id: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    file: Optional[FileResponse] = None
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Header, HTTPException, status, Depends
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.profiling import is_admin, profile_store
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not settings.PROFILING_ADMIN_TOKEN:
+        # Sem token configurado os endpoints administrativos não existem
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administrador inválido")
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles() -> List[Dict[str, Any]]:
+    # Requisições lentas perfiladas, da mais recente à mais antiga
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: int) -> Dict[str, Any]:
+    # Pilhas mais frequentes, funções, flamegraph (formato folded), SQL e chamadas à API secundária
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil não encontrado")
+    return profile
+
+@router.delete("/profiles", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_admin)])
+async def clear_profiles():
+    profile_store.clear()
@@ -1,26 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session 
+from sqlalchemy import select
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from typing import Optional
 
-from app.database.db import get_db, User
+from app.database.db import get_db, DBSession, User
 from app.models.schemas import UserCreate, UserResponse, Token
 from app.config import settings
+from app.services.auth_cache import Principal, auth_cache
+from app.services.passwords import PasswordHasherBusy, password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def verify_password(plain_password, hashed_password):
-    # Valida senha contra o hash
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    # Valida senha contra o hash (no pool de senhas, fora do event loop)
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _overloaded()
 
-def get_password_hash(password):
-    # Gera hash bcrypt da senha
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    # Gera hash bcrypt da senha (no pool de senhas, fora do event loop)
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _overloaded()
+
+def _overloaded():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servidor sobrecarregado, tente novamente em instantes",
+        headers={"Retry-After": "1"},
+    )
 
 def create_access_token(data: dict):
     # Codifica token JWT com expiração
@@ -31,63 +45,81 @@ def create_access_token(data: dict):
 
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    # Valida e retorna o usuário autenticado pelo token JWT
+async def _load_user(db: DBSession, user_id: Optional[int], email: str) -> Optional[User]:
+    # Tokens novos trazem o id do usuário (busca pela chave primária)
+    if user_id is not None:
+        return await db.get(User, user_id)
+    return await db.scalar(select(User).where(User.email == email))
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: DBSession = Depends(get_db)) -> Principal:
+    # Valida e retorna o usuário autenticado pelo token JWT.
+    # No primário: um token recém-emitido vale antes de o usuário chegar à
+    # réplica, e as rotas de escrita reaproveitam a mesma sessão do get_db
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar sua credenciais",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email = payload.get("sub")
-        if email is None:
+    # Tokens repetidos não têm a assinatura verificada de novo
+    payload = auth_cache.get_token(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+        auth_cache.set_token(token, payload)
+
+    email = payload.get("sub")
+    if email is None:
         raise credentials_exception
-    return user
+    user_id = payload.get("uid")
+
+    principal = auth_cache.get_user(user_id, email)
+    if principal is None:
+        user = await _load_user(db, user_id, email)
+        if user is None or user.email != email:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        auth_cache.set_user(principal, by_id=user_id is not None)
+    return principal
 
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: DBSession = Depends(get_db)):
     # Verifica se o usuário já existe
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email já registrado")
     
     # Cria novo usuário
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     new_user = User(
         name=user.name,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Cria Token
-    access_token = create_access_token(data={"sub": new_user.email})
+    access_token = create_access_token(data={"sub": new_user.email, "uid": new_user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: DBSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user.email, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     # Retorna informações do usuário autenticado
     return current_user
 
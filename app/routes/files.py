@@ -1,30 +1,200 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as FastAPIFile, Form
-from sqlalchemy.orm import Session
-from typing import List
-
-from app.database.db import get_db, User, Project, File
-from app.models.schemas import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File as FastAPIFile, Form
+from sqlalchemy import Row, insert, select
+from sqlalchemy.orm import selectinload
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import asyncio
+import httpx
+import math
+import time
+
+from pydantic import TypeAdapter
+
+from app.config import settings
+from app.database.db import get_db, get_read_db, DBSession, Project, File, FileDerivative, SecondaryDeletion, UploadJob
+from app.database.pagination import Page, paginate, set_next_page_headers
+from app.models.schemas import BatchUploadResponse, DeleteResponse, FileBulkDelete, FileResponse, FileStatusResponse, UploadAccepted
 from app.routes.auth import get_current_user
+from app.services.auth_cache import Principal
 from app.services.api_secondary import secondary_api
+from app.services.metrics import record_upload
+from app.services.resilience import SecondaryAPIUnavailable
+from app.services.response_cache import project_version, response_cache, user_version
+from app.services.serialization import trusted_response
+from app.services.deletions import complete_deletion, delete_files, secondary_deletions
+from app.services.dedupe import copy_processed_data, dedupe_enabled, dedupe_stats, find_duplicate, find_duplicates, hash_stream
+from app.services import derivatives, downloads, search
+from app.services.tags import local_tag_names, tag_filter
+from app.services.upload_jobs import upload_queue
+from app.services.upload_stream import HashingReader, UploadTooLarge
+from app.services.uploads import FILE_ROW_COLUMNS, apply_secondary_response, apply_secondary_responses, bulk_insert_files, discard_staged, file_to_dict, stage_upload
 
 router = APIRouter(prefix="/files", tags=["files"])
 
-@router.post("/upload")
+# Status de arquivos cujo upload assíncrono ainda não terminou
+PENDING_STATUSES = ("pending", "processing")
+
+# Campos aceitos em ?sort= e a coluna/tipo usados no cursor
+SORT_COLUMNS = {
+    "created_at": (File.created_at, datetime),
+    "name": (File.filename, str),
+    "size": (File.size, int),
+}
+
+# Usado só com RESPONSE_VALIDATION; compilado uma vez no import
+FILE_LIST_ADAPTER = TypeAdapter(List[FileResponse])
+
+def _unsynced_ids(files: Sequence[Row]) -> List[int]:
+    return [file.secondary_file_id for file in files if file.tags_synced_at is None and file.secondary_file_id]
+
+async def _files_with_tags(db: DBSession, files: Sequence[Row]) -> List[dict]:
+    # Usa as tags gravadas localmente (uma consulta para a página inteira);
+    # só arquivos ainda não sincronizados consultam a API secundária (com cache)
+    local_tags = await local_tag_names(db, [file.id for file in files if file.tags_synced_at is not None])
+    unsynced = _unsynced_ids(files)
+    remote_tags = await secondary_api.get_tags_for_files(unsynced) if unsynced else {}
+
+    return [
+        file_to_dict(
+            file,
+            local_tags.get(file.id, [])
+            if file.tags_synced_at is not None
+            else remote_tags.get(file.secondary_file_id, [])
+        )
+        for file in files
+    ]
+
+def _secondary_error(error: Exception) -> HTTPException:
+    # Traduz falhas da API secundária para o status HTTP devolvido ao cliente
+    if isinstance(error, UploadTooLarge):
+        return HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo permitido")
+    if isinstance(error, SecondaryAPIUnavailable):
+        # Circuito aberto ou limite de chamadas: falha rápido em vez de esperar a API
+        return HTTPException(
+            status_code=503,
+            detail="API secundária indisponível no momento, tente novamente",
+            headers={"Retry-After": str(math.ceil(error.retry_after))}
+        )
+    if "timeout" in str(error).lower():
+        return HTTPException(status_code=504, detail="Timeout ao processar arquivo na API secundária")
+    if "connection" in str(error).lower():
+        return HTTPException(status_code=502, detail="Não foi possível conectar com a API secundária")
+    return HTTPException(status_code=500, detail=f"Erro ao processar o arquivo: {str(error)}")
+
+async def _discard_uploaded(db: DBSession, secondary_responses: List[Tuple[File, dict]]) -> None:
+    # Envios já concluídos de um lote que não foi gravado ficariam órfãos na
+    # API secundária: vão para o outbox de exclusão (que ignora os ainda em uso)
+    secondary_ids = sorted({
+        response["file_id"] for _, response in secondary_responses if response.get("file_id") is not None
+    })
+    if not secondary_ids:
+        return
+    try:
+        await db.execute(insert(SecondaryDeletion), [{"secondary_file_id": file_id} for file_id in secondary_ids])
+        await db.commit()
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).error(f"❌ Erro ao enfileirar a remoção de {len(secondary_ids)} arquivos órfãos: {str(e)}")
+        await db.rollback()
+        return
+    secondary_deletions.wake()
+
+async def _save_duplicate(db: DBSession, file: UploadFile, project: Project, donor: File, size: int) -> File:
+    # Registra o upload repetido reaproveitando o processamento do original,
+    # sem nova chamada à API secundária
+    try:
+        new_file = File(
+            filename=file.filename,
+            file_type=file.content_type or "application/octet-stream",
+            size=size,
+            project_id=project.id
+        )
+        copy_processed_data(new_file, donor)
+        db.add(new_file)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
+
+    dedupe_stats.record(size)
+    record_upload(size, "deduplicated")
+    derivatives.derivative_worker.wake()
+    return new_file
+
+async def _accept_upload(db: DBSession, file: UploadFile, project: Project, user_id: int) -> JSONResponse:
+    # Copia o upload para a área de espera, registra o arquivo como pendente
+    # e deixa o envio à API secundária para os workers da fila
+    try:
+        staged = await run_in_threadpool(stage_upload, file.file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo permitido")
+
+    # Conteúdo já processado: não há o que enfileirar
+    donor = await db.run_sync(find_duplicate, staged.content_hash, user_id)
+    if donor:
+        discard_staged(staged.path)
+        new_file = await _save_duplicate(db, file, project, donor, staged.size)
+        return JSONResponse(
+            status_code=202,
+            content={
+                "job_id": None,
+                "file_id": new_file.id,
+                "status": new_file.status,
+                "status_url": f"{router.prefix}/{new_file.id}/status"
+            }
+        )
+
+    try:
+        new_file = File(
+            filename=file.filename,
+            file_path="",
+            file_type=file.content_type or "application/octet-stream",
+            size=staged.size,
+            project_id=project.id,
+            content_hash=staged.content_hash,
+            status="pending"
+        )
+        db.add(new_file)
+        await db.flush()
+        job = UploadJob(file_id=new_file.id, staging_path=staged.path)
+        db.add(job)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        discard_staged(staged.path)
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
+
+    upload_queue.enqueue(job.id)
+    record_upload(staged.size, "staged")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job.id,
+            "file_id": new_file.id,
+            "status": new_file.status,
+            "status_url": f"{router.prefix}/{new_file.id}/status"
+        }
+    )
+
+@router.post("/upload", responses={202: {"model": UploadAccepted}})
 async def upload_file(
     file: UploadFile = FastAPIFile(...),
     project_id: int = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    mode: str = Query("sync", pattern="^(sync|async)$"),
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
 ):
     import logging
     logger = logging.getLogger(__name__)
     logger.info(f"📤 Upload iniciado: {file.filename}, projeto: {project_id}")
     
     # Verifica se o projeto existe e pertence ao usuário
-    project = db.query(Project).filter(
+    project = await db.scalar(select(Project).where(
         Project.id == project_id,
         Project.user_id == current_user.id
-    ).first()
+    ))
 
     if not project:
         logger.error(f"❌ Projeto {project_id} não encontrado para usuário {current_user.id}")
@@ -32,173 +202,462 @@ async def upload_file(
     
     logger.info(f"✅ Projeto encontrado: {project.name}")
     
-    # Lê o conteúdo do arquivo
-    try:
-        content = await file.read()
-        logger.info(f"✅ Arquivo lido: {len(content)} bytes")
-    except Exception as e:
-        logger.error(f"❌ Erro ao ler arquivo: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao ler arquivo: {str(e)}")
+    # Rejeita cedo arquivos acima do limite, antes de contatar a API secundária
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE_BYTES:
+        raise HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo permitido")
+
+    # mode=async: responde 202 e processa em segundo plano
+    if mode == "async":
+        return await _accept_upload(db, file, project, current_user.id)
+
+    # Com deduplicação ativa o hash é calculado antes do envio, para não
+    # reenviar à API secundária um conteúdo que ela já processou
+    if dedupe_enabled():
+        size, content_hash = await run_in_threadpool(hash_stream, file.file)
+        if size > settings.MAX_UPLOAD_SIZE_BYTES:
+            raise HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo permitido")
+        donor = await db.run_sync(find_duplicate, content_hash, current_user.id)
+        if donor:
+            new_file = await _save_duplicate(db, file, project, donor, size)
+            logger.info(f"♻️ Conteúdo repetido, reaproveitando o arquivo {donor.id}: ID {new_file.id}")
+            return file_to_dict(new_file, [tag.name for tag in new_file.tags])
+
+    # O arquivo é enviado em pedaços a partir do arquivo temporário do upload,
+    # contando o tamanho e calculando o hash durante o envio
+    reader = HashingReader(file.file, max_size=settings.MAX_UPLOAD_SIZE_BYTES)
 
     # Envia o arquivo para API secundária para processamento
     try:
         logger.info(f"📡 Enviando para API secundária...")
         secondary_response = await secondary_api.upload_file(
-            file_content=content,
+            file_content=reader,
             filename=file.filename or "uploaded_file",
             file_type=file.content_type or "application/octet-stream"
         )
         logger.info(f"✅ Resposta da API secundária: {secondary_response}")
+        logger.info(f"✅ Arquivo enviado: {reader.size} bytes, sha256 {reader.hexdigest()}")
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Arquivo excede o tamanho máximo permitido")
     except Exception as e:
         logger.error(f"❌ Erro na API secundária: {str(e)}", exc_info=True)
-        error_detail = f"Erro ao processar o arquivo: {str(e)}"
-        if "timeout" in str(e).lower():
-            raise HTTPException(status_code=504, detail="Timeout ao processar arquivo na API secundária")
-        elif "connection" in str(e).lower():
-            raise HTTPException(status_code=502, detail="Não foi possível conectar com a API secundária")
-        else:
-            raise HTTPException(status_code=500, detail=error_detail)
+        raise _secondary_error(e)
     
     # Salva informações do arquivo no banco
     try:
         logger.info(f"💾 Salvando no banco de dados...")
         new_file = File(
             filename=file.filename,
-            file_path=secondary_response.get("file_path", ""),
             file_type=file.content_type or "application/octet-stream",
-            size=len(content),
+            size=reader.size,
             project_id=project.id,
-            secondary_file_id=secondary_response.get("file_id")
+            content_hash=reader.hexdigest()
         )
+        await db.run_sync(apply_secondary_response, new_file, secondary_response)
         db.add(new_file)
-        db.commit()
-        db.refresh(new_file)
+        await db.commit()
         logger.info(f"✅ Arquivo salvo no banco: ID {new_file.id}")
     except Exception as e:
         logger.error(f"❌ Erro ao salvar no banco: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
 
+    record_upload(reader.size, "secondary")
+    derivatives.derivative_worker.wake()
     logger.info(f"🎉 Upload concluído com sucesso!")
+    return file_to_dict(new_file, secondary_response.get("tags", []))
+
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_files_batch(
+    files: List[UploadFile] = FastAPIFile(...),
+    project_id: int = Form(...),
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
+):
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.info(f"📤 Upload em lote iniciado: {len(files)} arquivos, projeto: {project_id}")
+
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Envie no máximo {settings.UPLOAD_BATCH_MAX_FILES} arquivos por lote")
+
+    # Verifica uma única vez se o projeto existe e pertence ao usuário
+    project = await db.scalar(select(Project).where(
+        Project.id == project_id,
+        Project.user_id == current_user.id
+    ))
+    if not project:
+        raise HTTPException(status_code=404, detail="Projeto não encontrado")
+
+    # Resultado por posição do arquivo no lote; falhas não interrompem os demais
+    results: List[Optional[dict]] = [None] * len(files)
+
+    def fail(index: int, error: HTTPException) -> None:
+        results[index] = {
+            "filename": files[index].filename or "uploaded_file",
+            "status": "failed",
+            "status_code": error.status_code,
+            "error": error.detail,
+        }
+
+    semaphore = asyncio.Semaphore(max(1, settings.UPLOAD_BATCH_CONCURRENCY))
+    hashes: Dict[int, str] = {}
+    sizes: Dict[int, int] = {}
+    donors: Dict[str, File] = {}
+
+    # Com deduplicação, calcula os hashes antes e busca as origens numa só consulta
+    if dedupe_enabled():
+        async def hash_one(index: int, file: UploadFile) -> None:
+            async with semaphore:
+                size, content_hash = await run_in_threadpool(hash_stream, file.file)
+            if size > settings.MAX_UPLOAD_SIZE_BYTES:
+                fail(index, _secondary_error(UploadTooLarge(settings.MAX_UPLOAD_SIZE_BYTES)))
+            else:
+                hashes[index], sizes[index] = content_hash, size
+
+        await asyncio.gather(*(hash_one(index, file) for index, file in enumerate(files)))
+        donors = await db.run_sync(find_duplicates, hashes.values(), current_user.id)
+
+    # Envia à API secundária com concorrência limitada; conteúdo repetido
+    # dentro do próprio lote é enviado uma única vez
+    uploads: Dict[str, asyncio.Future] = {}
+    shared: Set[int] = set()
+    processed: Dict[int, Tuple[int, str, dict]] = {}
+
+    async def send(file: UploadFile) -> Tuple[int, str, dict]:
+        reader = HashingReader(file.file, max_size=settings.MAX_UPLOAD_SIZE_BYTES)
+        async with semaphore:
+            secondary_response = await secondary_api.upload_file(
+                file_content=reader,
+                filename=file.filename or "uploaded_file",
+                file_type=file.content_type or "application/octet-stream"
+            )
+        return reader.size, reader.hexdigest(), secondary_response
+
+    async def upload_one(index: int, file: UploadFile) -> None:
+        content_hash = hashes.get(index)
+        try:
+            if content_hash is None:
+                processed[index] = await send(file)
+                return
+            if content_hash in uploads:
+                shared.add(index)
+            else:
+                uploads[content_hash] = asyncio.ensure_future(send(file))
+            processed[index] = await uploads[content_hash]
+        except Exception as e:
+            logger.error(f"❌ Erro na API secundária ({file.filename}): {str(e)}")
+            fail(index, _secondary_error(e))
+
+    await asyncio.gather(*(
+        upload_one(index, file) for index, file in enumerate(files)
+        if results[index] is None and hashes.get(index) not in donors
+    ))
+
+    # Grava todos os arquivos do lote numa única transação
+    created: List[Tuple[int, File, List[str]]] = []
+    secondary_responses: List[Tuple[File, dict]] = []
+    for index, file in enumerate(files):
+        if results[index] is not None:
+            continue
+        new_file = File(
+            filename=file.filename or "uploaded_file",
+            file_type=file.content_type or "application/octet-stream",
+            project_id=project.id
+        )
+        donor = donors.get(hashes.get(index))
+        if donor is not None:
+            new_file.size = sizes[index]
+            copy_processed_data(new_file, donor)
+            tags = [tag.name for tag in donor.tags]
+        else:
+            new_file.size, new_file.content_hash, secondary_response = processed[index]
+            secondary_responses.append((new_file, secondary_response))
+            tags = secondary_response.get("tags", [])
+        created.append((index, new_file, tags))
+
+    try:
+        await db.run_sync(apply_secondary_responses, secondary_responses)
+        await db.run_sync(bulk_insert_files, [new_file for _, new_file, _ in created])
+        await db.commit()
+    except Exception as e:
+        logger.error(f"❌ Erro ao salvar lote no banco: {str(e)}", exc_info=True)
+        await db.rollback()
+        for index, _, _ in created:
+            fail(index, HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}"))
+        created = []
+        await _discard_uploaded(db, secondary_responses)
+
+    for index, new_file, tags in created:
+        if index in shared or donors.get(hashes.get(index)) is not None:
+            dedupe_stats.record(new_file.size)
+            record_upload(new_file.size, "deduplicated")
+        else:
+            record_upload(new_file.size, "secondary")
+        results[index] = {
+            "filename": new_file.filename,
+            "status": "created",
+            "status_code": 201,
+            "file": file_to_dict(new_file, tags),
+        }
+
+    if created:
+        derivatives.derivative_worker.wake()
+    logger.info(f"🎉 Lote concluído: {len(created)} criados, {len(files) - len(created)} com falha")
     return {
-        "id": new_file.id,
-        "filename": new_file.filename,
-        "file_type": new_file.file_type,
-        "size": new_file.size,
-        "project_id": new_file.project_id,
-        "tags": secondary_response.get("tags", []),
-        "created_at": new_file.created_at
+        "project_id": project.id,
+        "created": len(created),
+        "failed": len(files) - len(created),
+        "results": results,
     }
 
 @router.get("", response_model=List[FileResponse])
 async def get_files(
+    request: Request,
+    response: Response,
     project_id: int | None = None, 
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    file_type: Optional[str] = None,
+    min_size: Optional[int] = Query(None, ge=0),
+    max_size: Optional[int] = Query(None, ge=0),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    sort: str = Query("created_at", pattern="^(created_at|name|size)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_read_db)
 ): 
-    query = db.query(File).join(Project).filter(Project.user_id == current_user.id)
+    # Filtrada por projeto a listagem só muda com o projeto; sem filtro, com qualquer projeto do usuário
+    if project_id is not None:
+        scope, version = f"p{project_id}", await project_version(db, current_user.id, project_id)
+    else:
+        scope, version = f"u{current_user.id}", await user_version(db, current_user.id)
+    cached = response_cache.lookup(request, response, current_user.id, scope, version)
+    if cached is not None:
+        return cached
+
+    # Só as colunas da resposta, sem entidades; as tags locais vêm em uma consulta extra
+    statement = select(*FILE_ROW_COLUMNS).join(Project).where(
+        Project.user_id == current_user.id
+    )
 
     if project_id is not None:
-        query = query.filter(File.project_id == project_id)
-
-    files = query.all()
-
-    result = []
-    for file in files:
-        # Busca tags do arquivo na API secundária
-        tags = []
-        if file.secondary_file_id:
-            try:
-                tag_response = await secondary_api.get_file_tags(file.secondary_file_id)
-                tags = tag_response.get("tags", [])
-            except:
-                tags = []
-        
-        result.append({
-            "id": file.id,
-            "filename": file.filename,
-            "file_type": file.file_type,
-            "size": file.size,
-            "project_id": file.project_id,
-            "tags": tags,
-            "created_at": file.created_at
-        })
-    
-    return result
+        statement = statement.where(File.project_id == project_id)
+    if file_type:
+        statement = statement.where(File.file_type == file_type)
+    if min_size is not None:
+        statement = statement.where(File.size >= min_size)
+    if max_size is not None:
+        statement = statement.where(File.size <= max_size)
+    if created_after is not None:
+        statement = statement.where(File.created_at >= created_after)
+    if created_before is not None:
+        statement = statement.where(File.created_at < created_before)
+
+    # Próxima página segue em X-Next-Cursor / Link
+    sort_column, value_type = SORT_COLUMNS[sort]
+    files, next_cursor = await paginate(
+        db, statement, Page(sort=sort, order=order, limit=limit, cursor=cursor),
+        sort_column, File.id, value_type
+    )
+    set_next_page_headers(request, response, next_cursor)
+
+    # Tags ainda vindas da API secundária podem mudar sem alterar a versão
+    return response_cache.store(
+        request, current_user.id, trusted_response(await _files_with_tags(db, files), response, FILE_LIST_ADAPTER),
+        cacheable=not _unsynced_ids(files)
+    )
 
 @router.get("/search")
 async def search_files(
-    q: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    match: str = Query("any", pattern="^(any|all)$"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_read_db)
 ): 
-    # Busca nos nomes de arquivos
-    files = db.query(File).join(Project).filter(
-        Project.user_id == current_user.id,
-        File.filename.ilike(f"%{q}%")
-    ).all()
-
-    result = []
-    for file in files:
-        tags = []
-        if file.secondary_file_id:
-            try:
-                tag_response = await secondary_api.get_file_tags(file.secondary_file_id)
-                tags = tag_response.get("tags", [])
-            except:
-                tags = []
-        
-        result.append({
-            "id": file.id,
-            "filename": file.filename,
-            "file_type": file.file_type,
-            "size": file.size,
-            "project_id": file.project_id,
-            "tags": tags,
-            "created_at": file.created_at
-        })
-    
-    return result
-
-@router.delete("/{file_id}")
-async def delete_file(
+    if not (q and q.strip()) and not tags:
+        raise HTTPException(status_code=400, detail="Informe um termo de busca ou tags")
+
+    cached = response_cache.lookup(request, response, current_user.id, f"u{current_user.id}",
+                                   await user_version(db, current_user.id))
+    if cached is not None:
+        return cached
+
+    # Resultados por relevância; próxima página segue em X-Next-Cursor / Link
+    files, next_cursor = await search.search_files(
+        db, current_user.id, q, tags, match_all=(match == "all"), limit=limit, cursor=cursor
+    )
+    set_next_page_headers(request, response, next_cursor)
+
+    return response_cache.store(
+        request, current_user.id, trusted_response(await _files_with_tags(db, files), response, FILE_LIST_ADAPTER),
+        cacheable=not _unsynced_ids(files)
+    )
+
+@router.get("/{file_id}/status", response_model=FileStatusResponse)
+async def get_file_status(
     file_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    wait: float = Query(0, ge=0, description="Segundos para aguardar a conclusão (long-poll)"),
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
 ):
-    file = db.query(File).join(Project).filter(
-        File.id == file_id,
-        Project.user_id == current_user.id
-    ).first()
+    def load():
+        return db.scalar(select(File).join(Project).where(
+            File.id == file_id,
+            Project.user_id == current_user.id
+        ).options(selectinload(File.tags)).execution_options(populate_existing=True))
 
+    file = await load()
     if not file:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
-    
-    db.delete(file)
-    db.commit()
-
-    return {"detail": "Arquivo deletado com sucesso"}
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
 
+    # Long-poll: espera o processamento terminar sem segurar a conexão do banco;
+    # consulta de novo a cada segundo caso outro processo conclua o job
+    deadline = time.monotonic() + min(wait, settings.UPLOAD_STATUS_MAX_WAIT_SECONDS)
+    while file.status in PENDING_STATUSES and time.monotonic() < deadline:
+        await db.rollback()
+        await upload_queue.wait_for_file(file_id, min(1.0, deadline - time.monotonic()))
+        file = await load()
+        if not file:
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    job = await db.scalar(
+        select(UploadJob).where(UploadJob.file_id == file_id).order_by(UploadJob.id.desc()).limit(1)
+    )
+    return {
+        "file_id": file.id,
+        "status": file.status,
+        "job_id": job.id if job else None,
+        "attempts": job.attempts if job else 0,
+        "error": job.last_error if job and file.status == "failed" else None,
+        "file": file_to_dict(file, [tag.name for tag in file.tags]) if file.status == "ready" else None
+    }
 
+@router.get("/{file_id}/content")
+async def get_file_content(
+    file_id: int,
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_read_db)
+):
+    # Só as colunas usadas no download; o dono é verificado pelo projeto
+    file = (await db.execute(
+        select(
+            File.filename, File.file_type, File.size, File.status, File.secondary_file_id,
+            File.content_hash, File.created_at
+        ).join(Project).where(
+            File.id == file_id,
+            Project.user_id == current_user.id
+        )
+    )).first()
+    if not file:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    if file.status != "ready" or not file.secondary_file_id:
+        raise HTTPException(status_code=409, detail="Conteúdo do arquivo ainda não disponível")
 
+    try:
+        return await downloads.content_response(request, file)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Conteúdo do arquivo não encontrado na API secundária")
+        raise _secondary_error(e)
+    except (httpx.HTTPError, SecondaryAPIUnavailable) as e:
+        raise _secondary_error(e)
+
+@router.get("/{file_id}/thumbnail")
+async def get_file_thumbnail(
+    file_id: int,
+    request: Request,
+    kind: str = Query("thumbnail", pattern="^(thumbnail|preview)$"),
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_read_db)
+):
+    # Miniatura (ou prévia) em JPEG gerada pelo worker depois do upload
+    derivative = (await db.execute(
+        select(
+            FileDerivative.status, FileDerivative.content_hash, FileDerivative.media_type,
+            FileDerivative.size, FileDerivative.created_at
+        )
+        .join(File, File.id == FileDerivative.file_id)
+        .join(Project, Project.id == File.project_id)
+        .where(
+            FileDerivative.file_id == file_id,
+            FileDerivative.kind == kind,
+            Project.user_id == current_user.id
+        )
+    )).first()
+    if not derivative or derivative.status != "ready":
+        raise HTTPException(status_code=404, detail="Miniatura não disponível")
+
+    headers = {
+        "ETag": f'"{derivative.content_hash}"',
+        "Last-Modified": downloads.http_date(derivative.created_at),
+        "Cache-Control": derivatives.CACHE_CONTROL,
+    }
+    if downloads.not_modified(request, headers["ETag"], derivative.created_at):
+        return Response(status_code=304, headers=headers)
+
+    blob = await run_in_threadpool(derivatives.derivative_store.open, derivative.content_hash)
+    if blob is None:
+        await derivatives.forget_missing(derivative.content_hash)
+        raise HTTPException(status_code=404, detail="Miniatura não disponível")
+    headers["Content-Type"] = derivative.media_type
+    return downloads.FileRangeResponse(blob, 0, derivative.size - 1, 200, headers)
+
+@router.post("/delete", response_model=DeleteResponse)
+async def delete_files_bulk(
+    body: FileBulkDelete,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
+):
+    # Exclui os arquivos do usuário que atendem a todos os critérios informados
+    criteria = []
+    if body.ids is not None:
+        if len(body.ids) > settings.BULK_DELETE_MAX_IDS:
+            raise HTTPException(status_code=400, detail=f"Máximo de {settings.BULK_DELETE_MAX_IDS} ids por requisição")
+        criteria.append(File.id.in_(body.ids))
+    if body.project_id is not None:
+        criteria.append(File.project_id == body.project_id)
+    if body.file_type:
+        criteria.append(File.file_type == body.file_type)
+    if body.tags:
+        criteria.append(tag_filter(body.tags, match_all=(body.match == "all")))
+    if body.created_after is not None:
+        criteria.append(File.created_at >= body.created_after)
+    if body.created_before is not None:
+        criteria.append(File.created_at < body.created_before)
+    if not criteria:
+        raise HTTPException(status_code=400, detail="Informe ids ou ao menos um filtro")
+
+    result = await delete_files(db, select(File.id).join(Project).where(
+        Project.user_id == current_user.id, *criteria
+    ))
+    await db.commit()
+    await complete_deletion(result)
+
+    return result.summary()
 
+@router.delete("/{file_id}")
+async def delete_file(
+    file_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
+):
+    result = await delete_files(db, select(File.id).join(Project).where(
+        File.id == file_id,
+        Project.user_id == current_user.id
+    ))
 
+    if not result.files_deleted:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
+    await db.commit()
+    # Remove as tags do cache e agenda a remoção na API secundária
+    await complete_deletion(result)
 
+    return {"detail": "Arquivo deletado com sucesso"}
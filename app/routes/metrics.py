@@ -0,0 +1,63 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Tuple
+
+from app.database import db as database
+from app.services.api_secondary import secondary_api
+from app.services.auth_cache import auth_cache
+from app.services.content_cache import content_cache
+from app.services.dedupe import dedupe_stats
+from app.services.derivatives import renderer
+from app.services.metrics import flatten_stats, registry
+from app.services.passwords import password_hasher
+from app.services.response_cache import response_cache
+
+router = APIRouter(tags=["metrics"])
+
+# Formato de texto do Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _component_stats() -> Dict[Tuple[str, str], float]:
+    # Contadores que os próprios serviços já mantêm, lidos só na coleta
+    components = {
+        "dedupe": dedupe_stats.snapshot(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "tag_cache": secondary_api.cache_stats(),
+        "secondary_api_pool": secondary_api.pool_stats(),
+        "secondary_api": secondary_api.resilience_stats(),
+        "response_cache": response_cache.stats(),
+        "content_cache": content_cache.stats(),
+        "derivatives": renderer.stats(),
+    }
+    return {
+        (component, stat): value
+        for component, stats in components.items()
+        for stat, value in flatten_stats(stats).items()
+    }
+
+def _db_pool_stats() -> Dict[Tuple[str, str], float]:
+    engines = {"primary": database.engine}
+    if database.replica_engine is not database.engine:
+        engines["replica"] = database.replica_engine
+    for role, async_engine in list(database.async_engines.items()):
+        engines[f"{role}_async"] = async_engine.sync_engine
+
+    result = {}
+    for name, engine in engines.items():
+        # Só o QueuePool tem esses contadores (NullPool/SQLite não)
+        for stat in ("size", "checkedout", "checkedin", "overflow"):
+            read = getattr(engine.pool, stat, None)
+            if callable(read):
+                result[(name, stat)] = float(read())
+    return result
+
+registry.gauge(
+    "app_component_stats", "Estatísticas internas de caches, pools e circuit breaker",
+    _component_stats, ("component", "stat")
+)
+registry.gauge("db_pool_connections", "Conexões dos pools do banco", _db_pool_stats, ("engine", "stat"))
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -1,18 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session 
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select
+from datetime import datetime
+from typing import List, Optional
 
-from app.database.db import get_db, User, Project
-from app.models.schemas import ProjectCreate, ProjectResponse
+from pydantic import TypeAdapter
+
+from app.config import settings
+from app.database.db import get_db, get_read_db, DBSession, Project, File
+from app.database.pagination import Page, paginate, set_next_page_headers
+from app.models.schemas import DeleteResponse, ProjectBulkDelete, ProjectCreate, ProjectResponse
 from app.routes.auth import get_current_user
+from app.services.auth_cache import Principal
+from app.services.deletions import complete_deletion, delete_files, delete_projects
+from app.services.response_cache import project_version, response_cache, user_version
+from app.services.serialization import trusted_response
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
+# Campos aceitos em ?sort= e a coluna/tipo usados no cursor
+SORT_COLUMNS = {
+    "created_at": (Project.created_at, datetime),
+    "name": (Project.name, str),
+}
+
+# Usados só com RESPONSE_VALIDATION; compilados uma vez no import
+PROJECT_ADAPTER = TypeAdapter(ProjectResponse)
+PROJECT_LIST_ADAPTER = TypeAdapter(List[ProjectResponse])
+
+# Colunas de ProjectResponse lidas pelas listagens, sem montar entidades Project
+PROJECT_ROW_COLUMNS = (
+    Project.id, Project.name, Project.client_name, Project.description, Project.user_id, Project.created_at,
+)
+
+def _project_dict(project: Project, file_count: int) -> dict:
+    return {
+        "id": project.id,
+        "name": project.name,
+        "client_name": project.client_name,
+        "description": project.description,
+        "user_id": project.user_id,
+        "created_at": project.created_at,
+        "file_count": file_count
+    }
+
+def _projects_with_file_count(user_id: int, project_id: Optional[int] = None):
+    """Projetos do usuário com a contagem de arquivos em uma única consulta.
+
+    A contagem vem de um ``COUNT ... GROUP BY`` restrito aos projetos do
+    usuário, sem carregar as linhas de ``files``. Retorna linhas com as
+    colunas de ``ProjectResponse`` (``file_count`` inclusive), não entidades.
+    """
+    counts = (
+        select(File.project_id, func.count(File.id).label("file_count"))
+        .join(Project, Project.id == File.project_id)
+        .where(Project.user_id == user_id)
+        .group_by(File.project_id)
+    )
+    if project_id is not None:
+        counts = counts.where(File.project_id == project_id)
+    counts = counts.subquery()
+
+    statement = select(
+        *PROJECT_ROW_COLUMNS, func.coalesce(counts.c.file_count, 0).label("file_count")
+    ).outerjoin(
+        counts, counts.c.project_id == Project.id
+    ).where(Project.user_id == user_id)
+    if project_id is not None:
+        statement = statement.where(Project.id == project_id)
+    return statement
+
 @router.post("", response_model=ProjectResponse)
 async def create_project(
     project: ProjectCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
 ): 
     # Cria um novo projeto para o usuário autenticado
     new_project = Project(
@@ -22,82 +83,78 @@ async def create_project(
         user_id=current_user.id
     )
     db.add(new_project)
-    db.commit()
-    db.refresh(new_project)
-
-    # Adiciona contagem de arquivos
-    project_dict = {
-    "id": new_project.id,
-    "name": new_project.name,
-    "client_name": new_project.client_name,
-    "description": new_project.description,
-    "user_id": new_project.user_id,
-    "created_at": new_project.created_at,
-    "file_count": 0
-    }
+    await db.commit()
+    await db.refresh(new_project)
 
-    return project_dict
+    # Projeto novo ainda não tem arquivos
+    return _project_dict(new_project, 0)
 
 @router.get("", response_model=List[ProjectResponse])
 async def get_projects(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    sort: str = Query("created_at", pattern="^(created_at|name)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_read_db)
 ): 
-    projects = db.query(Project).filter(Project.user_id == current_user.id).all()
+    # Sem alterações desde a última resposta: 304 ou conteúdo em cache, sem as consultas
+    cached = response_cache.lookup(request, response, current_user.id, f"u{current_user.id}",
+                                   await user_version(db, current_user.id))
+    if cached is not None:
+        return cached
+
+    # Próxima página segue em X-Next-Cursor / Link
+    sort_column, value_type = SORT_COLUMNS[sort]
+    rows, next_cursor = await paginate(
+        db, _projects_with_file_count(current_user.id),
+        Page(sort=sort, order=order, limit=limit, cursor=cursor),
+        sort_column, Project.id, value_type
+    )
+    set_next_page_headers(request, response, next_cursor)
 
     # adiciona contagem de arquivos para cada projeto
-    result = []
-    for project in projects:
-        project_dict = {
-            "id": project.id,
-            "name": project.name, 
-            "client_name": project.client_name,
-            "description": project.description,
-            "user_id": project.user_id,
-            "created_at": project.created_at,
-            "file_count": len(project.files)  # Supondo que haja um relacionamento 'files'
-        }
-        result.append(project_dict)
-    
-    return result
+    projects = [_project_dict(row, row.file_count) for row in rows]
+    return response_cache.store(
+        request, current_user.id, trusted_response(projects, response, PROJECT_LIST_ADAPTER)
+    )
 
 @router.get("/{project_id}", response_model=ProjectResponse)
 async def get_project (
     project_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_read_db)
 ): 
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    # Sem versão (projeto inexistente, de outro usuário ou réplica atrasada) a consulta decide o 404
+    version = await project_version(db, current_user.id, project_id)
+    cached = response_cache.lookup(request, response, current_user.id, f"p{project_id}", version)
+    if cached is not None:
+        return cached
 
-    if not project:
+    row = (await db.execute(_projects_with_file_count(current_user.id, project_id))).first()
+
+    if not row:
         raise HTTPException(status_code=404, detail="Projeto não encontrado")
     
-    project_dict = {
-        "id": project.id,
-        "name": project.name,
-        "client_name": project.client_name,
-        "description": project.description,
-        "user_id": project.user_id,
-        "created_at": project.created_at,
-        "file_count": len(project.files) # Supondo que haja um relacionamento 'files'
-    }
-
-    return project_dict
+    return response_cache.store(
+        request, current_user.id, trusted_response(_project_dict(row, row.file_count), response, PROJECT_ADAPTER)
+    )
 
 @router.put("/{project_id}", response_model=ProjectResponse)
 async def update_project(
     project_id: int,
     project_update: ProjectCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
 ):
-    project = db.query(Project).filter(
+    project = await db.scalar(select(Project).where(
         Project.id == project_id,
         Project.user_id == current_user.id
-    ).first()
+    ))
 
     if not project:
         raise HTTPException(status_code=404, detail="Projeto não encontrado")
@@ -106,57 +163,67 @@ async def update_project(
     project.client_name = project_update.client_name
     project.description = project_update.description
 
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
 
-    project_dict = {
-        "id": project.id,
-        "name": project.name,
-        "client_name": project.client_name,
-        "description": project.description,
-        "user_id": project.user_id,
-        "created_at": project.created_at,
-        "file_count": len(project.files)
-    }
+    file_count = await db.scalar(select(func.count(File.id)).where(File.project_id == project.id))
+    return _project_dict(project, file_count)
 
-    return project_dict
+@router.post("/delete", response_model=DeleteResponse)
+async def delete_projects_bulk(
+    body: ProjectBulkDelete,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
+):
+    # Exclui vários projetos do usuário (ids de outros usuários são ignorados)
+    if len(body.ids) > settings.BULK_DELETE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {settings.BULK_DELETE_MAX_IDS} ids por requisição")
 
-@router.delete("/{project_id}")
-async def delete_project(
+    result = await delete_projects(db, select(Project.id).where(
+        Project.id.in_(body.ids),
+        Project.user_id == current_user.id
+    ))
+    await db.commit()
+    await complete_deletion(result)
+
+    return result.summary()
+
+@router.delete("/{project_id}/files", response_model=DeleteResponse)
+async def delete_project_files(
     project_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
 ):
-    project = db.query(Project).filter(
+    # Esvazia o projeto, mantendo o projeto em si
+    owned = await db.scalar(select(Project.id).where(
         Project.id == project_id,
         Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
+    ))
+    if owned is None:
         raise HTTPException(status_code=404, detail="Projeto não encontrado")
-    
-    db.delete(project)
-    db.commit()
-    
-    return {"message": "Projeto excluído com sucesso"}
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
 
+    result = await delete_files(db, select(File.id).where(File.project_id == project_id))
+    await db.commit()
+    await complete_deletion(result)
 
+    return result.summary()
 
+@router.delete("/{project_id}")
+async def delete_project(
+    project_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: DBSession = Depends(get_db)
+):
+    # Projeto e arquivos saem com DELETEs em conjunto, sem carregar os arquivos
+    result = await delete_projects(db, select(Project.id).where(
+        Project.id == project_id,
+        Project.user_id == current_user.id
+    ))
 
+    if not result.projects_deleted:
+        raise HTTPException(status_code=404, detail="Projeto não encontrado")
 
+    await db.commit()
+    await complete_deletion(result)
 
+    return {"message": "Projeto excluído com sucesso"}
@@ -1,35 +1,405 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
 import httpx
 from app.config import settings
+from app.services.metrics import record_secondary_call, record_secondary_rejection
+from app.services.resilience import Bulkhead, CircuitBreaker, SecondaryAPIUnavailable, hedge, is_failure, retry
+from app.services.tag_cache import TagCache, create_tag_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Status que indicam que a API secundária não possui o endpoint de tags em lote
+BULK_UNSUPPORTED_STATUS = {404, 405, 501}
+
+def _timeout(read: float) -> httpx.Timeout:
+    # Timeout de uma operação, com conexão e espera no pool configuráveis à parte
+    return httpx.Timeout(
+        connect=settings.SECONDARY_API_CONNECT_TIMEOUT,
+        read=read,
+        write=read,
+        pool=settings.SECONDARY_API_POOL_TIMEOUT,
+    )
 
 class SecondaryAPIService:
     """Serviço para interagir com a API secundária"""
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        tag_cache: Optional[TagCache] = None,
+    ) -> None:
         self.base_url = settings.SECONDARY_API_URL
+        # None = ainda não sabemos se o endpoint em lote existe
+        self._bulk_supported: bool | None = None
+        self._bulk_delete_supported: bool | None = None
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.tag_cache = tag_cache if tag_cache is not None else create_tag_cache()
+        self.breaker = CircuitBreaker(
+            settings.SECONDARY_API_BREAKER_FAILURE_THRESHOLD,
+            settings.SECONDARY_API_BREAKER_RECOVERY_SECONDS,
+        )
+        # Uploads demoram muito mais: ficam num compartimento próprio para não
+        # esgotar as vagas das consultas de tags
+        self.bulkhead = Bulkhead(
+            "requests", settings.SECONDARY_API_MAX_IN_FLIGHT, settings.SECONDARY_API_BULKHEAD_WAIT_SECONDS
+        )
+        self.upload_bulkhead = Bulkhead(
+            "uploads", settings.SECONDARY_API_MAX_IN_FLIGHT_UPLOADS, settings.SECONDARY_API_BULKHEAD_WAIT_SECONDS
+        )
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """Cria o cliente HTTP compartilhado com o pool configurado"""
+        http2 = settings.SECONDARY_API_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("SECONDARY_API_HTTP2 ativo, mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.SECONDARY_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SECONDARY_API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.SECONDARY_API_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=limits,
+            http2=http2,
+            timeout=_timeout(settings.SECONDARY_API_READ_TIMEOUT),
+            transport=self._transport,
+        )
+
+    async def startup(self) -> None:
+        """Abre o cliente HTTP compartilhado (chamado na inicialização da aplicação)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+
+    async def shutdown(self) -> None:
+        """Fecha o cliente HTTP e as conexões mantidas no pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente compartilhado; criado sob demanda fora do ciclo de vida da aplicação"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Estatísticas do pool de conexões com a API secundária"""
+        stats: Dict[str, Any] = {
+            "open": self._client is not None and not self._client.is_closed,
+            "max_connections": settings.SECONDARY_API_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.SECONDARY_API_MAX_KEEPALIVE_CONNECTIONS,
+            "connections": 0,
+            "in_use": 0,
+            "idle": 0,
+        }
+        if not stats["open"]:
+            return stats
+
+        # O httpx não expõe o pool publicamente; lê o pool do httpcore quando disponível
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return stats
+
+        for connection in connections:
+            if connection.is_closed():
+                continue
+            stats["connections"] += 1
+            if connection.is_idle():
+                stats["idle"] += 1
+            else:
+                stats["in_use"] += 1
+        return stats
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Estado do circuit breaker e ocupação dos bulkheads"""
+        return {
+            "circuit": self.breaker.snapshot(),
+            "bulkheads": {
+                "requests": self.bulkhead.snapshot(),
+                "uploads": self.upload_bulkhead.snapshot(),
+            },
+        }
+
+    async def _call(
+        self,
+        operation: str,
+        request: Callable[[], Awaitable[T]],
+        bulkhead: Optional[Bulkhead] = None,
+        idempotent: bool = False,
+        hedged: bool = False,
+    ) -> T:
+        """Executa ``request`` atrás do circuit breaker e do bulkhead.
 
-    async def upload_file(self, file_content: bytes, filename: str, file_type: str):
-        """ Envia arquivo para a API secundária para processamento"""
-        async with httpx.AsyncClient(timeout=120.0) as client:  # 2 minutos para imagens grandes
-            files = {"file": (filename, file_content, file_type)}
-            response = await client.post(f"{self.base_url}/api/files/process", files=files) 
+        Operações idempotentes ganham novas tentativas com jitter e, se
+        ``hedged`` (só GETs), uma cópia extra quando a primeira demora. Cada
+        tentativa entra nas métricas de ``operation``.
+        """
+        async def attempt() -> T:
+            self.breaker.before_call()
+            started = time.perf_counter()
+            try:
+                result = await request()
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                record_secondary_call(operation, time.perf_counter() - started, e)
+                # 4xx é resposta válida do serviço: não conta como falha
+                if is_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                raise
+            record_secondary_call(operation, time.perf_counter() - started)
+            self.breaker.record_success()
+            return result
+
+        try:
+            # Circuito aberto falha antes mesmo de ocupar uma vaga no bulkhead
+            self.breaker.raise_if_open()
+            async with bulkhead or self.bulkhead:
+                if not idempotent:
+                    return await attempt()
+                call = (lambda: hedge(attempt, settings.SECONDARY_API_HEDGE_DELAY_SECONDS)) if hedged else attempt
+                return await retry(
+                    call,
+                    attempts=settings.SECONDARY_API_RETRY_ATTEMPTS,
+                    base_delay=settings.SECONDARY_API_RETRY_BASE_DELAY,
+                    max_delay=settings.SECONDARY_API_RETRY_MAX_DELAY,
+                )
+        except SecondaryAPIUnavailable as e:
+            record_secondary_rejection(operation, e)
+            raise
+
+    async def upload_file(self, file_content: Union[bytes, BinaryIO], filename: str, file_type: str):
+        """ Envia arquivo para a API secundária para processamento.
+
+        ``file_content`` pode ser um arquivo aberto, enviado em pedaços pelo
+        httpx sem carregar o conteúdo inteiro em memória. Sem novas
+        tentativas: o conteúdo já foi consumido e o upload não é idempotente.
+        """
+        files = {"file": (filename, file_content, file_type)}
+
+        async def request():
+            response = await self.client.post(
+                "/api/files/process",
+                files=files,
+                timeout=_timeout(settings.SECONDARY_API_UPLOAD_READ_TIMEOUT)
+            )
             response.raise_for_status()
             return response.json()
 
+        data = await self._call("upload", request, self.upload_bulkhead)
+
+        # As tags retornadas no upload já alimentam o cache
+        if data.get("file_id") and "tags" in data:
+            await self.tag_cache.set_many({data["file_id"]: data.get("tags") or []})
+        return data
+
     async def get_file_tags(self, file_id: int):
         """Busca tags de um arquivo na API secundária"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/api/files/{file_id}/tags")
+        async def request():
+            response = await self.client.get(f"/api/files/{file_id}/tags")
             response.raise_for_status()
             return response.json()
-    
-    async def search_by_tags(self, tags: list):
-        """Busca arquivos por tags na API secundária"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/api/files/search",
-                json={"tags": tags}
+
+        return await self._call("get_tags", request, idempotent=True, hedged=True)
+
+    async def open_file_content(self, file_id: int, byte_range: Optional[str] = None) -> httpx.Response:
+        """Abre o download do conteúdo de um arquivo, sem ler o corpo.
+
+        Retorna a resposta em streaming (200, ou 206 se a API secundária
+        atender o ``Range``); quem chama lê com ``aiter_bytes`` e fecha com
+        ``aclose``. Novas tentativas só até o início da resposta.
+        """
+        # Sem compressão: o Content-Length e o Range valem para os bytes do arquivo
+        headers = {"Accept-Encoding": "identity"}
+        if byte_range:
+            headers["Range"] = byte_range
+
+        async def request():
+            response = await self.client.send(
+                self.client.build_request(
+                    "GET", f"/api/files/{file_id}/content", headers=headers,
+                    timeout=_timeout(settings.SECONDARY_API_DOWNLOAD_READ_TIMEOUT)
+                ),
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError:
+                await response.aclose()
+                raise
+            return response
+
+        return await self._call("download", request, idempotent=True)
+
+    async def get_tags_bulk(self, file_ids: List[int]) -> Dict[int, List[str]]:
+        """Busca tags de vários arquivos em uma única requisição à API secundária.
+
+        Aceita as respostas ``{"tags": {"<id>": [...]}}`` ou
+        ``{"files": [{"file_id": <id>, "tags": [...]}]}``.
+        """
+        async def request():
+            response = await self.client.post(
+                "/api/files/tags/batch",
+                json={"file_ids": file_ids}
             )
             response.raise_for_status()
             return response.json()
 
+        # POST só de leitura: pode repetir, mas sem hedging
+        data = await self._call("get_tags_bulk", request, idempotent=True)
+
+        result: Dict[int, List[str]] = {}
+        if isinstance(data.get("tags"), dict):
+            for file_id, tags in data["tags"].items():
+                result[int(file_id)] = tags or []
+        for item in data.get("files", []):
+            result[int(item["file_id"])] = item.get("tags") or []
+        return result
+
+    async def get_tags_for_files(self, file_ids: Iterable[int]) -> Dict[int, List[str]]:
+        """Busca tags de vários arquivos, consultando o cache antes da API.
+
+        Os ids fora do cache são buscados em lote quando possível; sem suporte
+        ao lote, faz uma chamada por arquivo em paralelo, limitada por
+        ``SECONDARY_API_TAGS_CONCURRENCY``. Arquivos cujas tags não puderam ser
+        obtidas ficam com lista vazia e a falha fica em cache por pouco tempo.
+        """
+        ids = list(dict.fromkeys(file_id for file_id in file_ids if file_id))
+        if not ids:
+            return {}
+
+        cached = await self.tag_cache.get_many(ids)
+        result = {file_id: tags or [] for file_id, tags in cached.items()}
+        missing = [file_id for file_id in ids if file_id not in cached]
+        if missing:
+            fetched = await self.fetch_tags(missing)
+            await self.tag_cache.set_many(
+                {file_id: tags for file_id, tags in fetched.items() if tags is not None}
+            )
+            await self.tag_cache.set_failed(
+                file_id for file_id, tags in fetched.items() if tags is None
+            )
+            result.update({file_id: tags or [] for file_id, tags in fetched.items()})
+        return result
+
+    async def invalidate_tags(self, file_ids: Iterable[int]) -> None:
+        """Descarta tags em cache (ex.: após excluir o arquivo)"""
+        await self.tag_cache.invalidate(file_ids)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Acertos e faltas do cache de tags"""
+        return self.tag_cache.stats()
+
+    async def fetch_tags(self, ids: List[int]) -> Dict[int, Optional[List[str]]]:
+        """Busca tags na API secundária sem passar pelo cache; ``None`` indica falha.
+
+        Com o circuito aberto nenhuma chamada é feita: as listagens seguem com
+        as tags em cache (ou vazias).
+        """
+        if self.breaker.is_open():
+            return dict.fromkeys(ids)
+
+        result: Dict[int, Optional[List[str]]] = {}
+        if settings.SECONDARY_API_BULK_TAGS_ENABLED and self._bulk_supported is not False:
+            try:
+                result = dict(await self.get_tags_bulk(ids))
+                self._bulk_supported = True
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in BULK_UNSUPPORTED_STATUS:
+                    logger.info("API secundária não suporta tags em lote, usando chamadas individuais")
+                    self._bulk_supported = False
+                else:
+                    logger.warning(f"Falha ao buscar tags em lote: {str(e)}")
+            except (httpx.HTTPError, SecondaryAPIUnavailable) as e:
+                logger.warning(f"Falha ao buscar tags em lote: {str(e)}")
+
+        missing = [file_id for file_id in ids if file_id not in result]
+        if missing and self.breaker.is_open():
+            result.update(dict.fromkeys(missing))
+        elif missing:
+            result.update(await self._get_tags_individually(missing))
+        return result
+
+    async def _get_tags_individually(self, file_ids: List[int]) -> Dict[int, Optional[List[str]]]:
+        """Busca tags arquivo a arquivo com concorrência limitada"""
+        semaphore = asyncio.Semaphore(max(1, settings.SECONDARY_API_TAGS_CONCURRENCY))
+
+        async def fetch(file_id: int) -> Optional[List[str]]:
+            async with semaphore:
+                try:
+                    tag_response = await self.get_file_tags(file_id)
+                    return tag_response.get("tags") or []
+                except (httpx.HTTPError, SecondaryAPIUnavailable, ValueError) as e:
+                    logger.warning(f"Falha ao buscar tags do arquivo {file_id}: {str(e)}")
+                    return None
+
+        tags = await asyncio.gather(*(fetch(file_id) for file_id in file_ids))
+        return dict(zip(file_ids, tags))
+
+    async def delete_file(self, file_id: int) -> None:
+        """Remove um arquivo da API secundária; arquivo inexistente conta como removido"""
+        async def request():
+            response = await self.client.delete(f"/api/files/{file_id}")
+            if response.status_code != 404:
+                response.raise_for_status()
+
+        await self._call("delete", request, idempotent=True)
+
+    async def delete_files_bulk(self, file_ids: List[int]) -> None:
+        """Remove vários arquivos em uma única requisição à API secundária"""
+        async def request():
+            response = await self.client.post("/api/files/delete/batch", json={"file_ids": file_ids})
+            response.raise_for_status()
+
+        await self._call("delete_bulk", request, idempotent=True)
+
+    async def delete_files(self, file_ids: List[int]) -> Dict[int, Optional[str]]:
+        """Remove vários arquivos, em lote quando possível; retorna o erro de cada id (``None`` = removido).
+
+        Sem suporte ao lote, faz uma chamada por arquivo em paralelo, limitada
+        por ``SECONDARY_DELETE_CONCURRENCY``.
+        """
+        ids = list(dict.fromkeys(file_ids))
+        if not ids:
+            return {}
+
+        if self._bulk_delete_supported is not False:
+            try:
+                await self.delete_files_bulk(ids)
+                self._bulk_delete_supported = True
+                return dict.fromkeys(ids)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in BULK_UNSUPPORTED_STATUS:
+                    return dict.fromkeys(ids, str(e))
+                logger.info("API secundária não suporta exclusão em lote, usando chamadas individuais")
+                self._bulk_delete_supported = False
+            except (httpx.HTTPError, SecondaryAPIUnavailable) as e:
+                return dict.fromkeys(ids, str(e) or e.__class__.__name__)
+
+        semaphore = asyncio.Semaphore(max(1, settings.SECONDARY_DELETE_CONCURRENCY))
+
+        async def delete(file_id: int) -> Optional[str]:
+            async with semaphore:
+                try:
+                    await self.delete_file(file_id)
+                    return None
+                except (httpx.HTTPError, SecondaryAPIUnavailable) as e:
+                    return str(e) or e.__class__.__name__
+
+        errors = await asyncio.gather(*(delete(file_id) for file_id in ids))
+        return dict(zip(ids, errors))
+
 secondary_api = SecondaryAPIService()
-            
\ No newline at end of file
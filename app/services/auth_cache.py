@@ -0,0 +1,85 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import event, inspect
+
+from app.config import settings
+from app.database.db import User
+from app.services.cache import MISSING, LRUCache
+
+@dataclass(frozen=True)
+class Principal:
+    """Usuário autenticado; cópia imutável dos dados do banco, segura para cache"""
+    id: int
+    email: str
+    name: str
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, email=user.email, name=user.name, created_at=user.created_at)
+
+class AuthCache:
+    """Caches da autenticação por requisição.
+
+    ``tokens`` guarda o payload de tokens com assinatura já verificada (até a
+    expiração do token) e ``users`` o ``Principal`` resolvido, por id (tokens
+    com ``uid``) ou por email (tokens antigos). Alterações em ``User`` pelo
+    ORM invalidam o usuário; o TTL curto limita a defasagem entre processos.
+    """
+
+    def __init__(self, max_entries: int, token_ttl: float, user_ttl: float) -> None:
+        self.tokens = LRUCache(max_entries=max_entries, ttl=token_ttl)
+        self.users = LRUCache(max_entries=max_entries, ttl=user_ttl)
+
+    def get_token(self, token: str) -> Optional[Dict[str, Any]]:
+        payload = self.tokens.get(token)
+        return None if payload is MISSING else payload
+
+    def set_token(self, token: str, payload: Dict[str, Any]) -> None:
+        ttl = self.tokens.ttl
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            self.tokens.set(token, payload, ttl=ttl)
+
+    def get_user(self, user_id: Optional[int], email: str) -> Optional[Principal]:
+        principal = self.users.get(self._user_key(user_id, email))
+        return None if principal is MISSING else principal
+
+    def set_user(self, principal: Principal, by_id: bool) -> None:
+        if self.users.ttl > 0:
+            self.users.set(self._user_key(principal.id if by_id else None, principal.email), principal)
+
+    def invalidate_user(self, user_id: Optional[int], emails: Iterable[str] = ()) -> None:
+        """Remove o usuário do cache (por id e pelos emails informados)"""
+        if user_id is not None:
+            self.users.delete(("id", user_id))
+        for email in emails:
+            self.users.delete(("email", email))
+
+    def clear(self) -> None:
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens": self.tokens.stats(), "users": self.users.stats()}
+
+    @staticmethod
+    def _user_key(user_id: Optional[int], email: str):
+        return ("id", user_id) if user_id is not None else ("email", email)
+
+auth_cache = AuthCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    token_ttl=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+    user_ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User) -> None:
+    # Inclui o email anterior, caso ele tenha sido alterado
+    history = inspect(target).attrs.email.history
+    auth_cache.invalidate_user(target.id, [target.email, *history.deleted])
@@ -0,0 +1,186 @@
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sufixo dos arquivos ainda sendo gravados; sobras de um processo interrompido
+# são apagadas na inicialização
+PARTIAL_SUFFIX = ".part"
+
+class PendingEntry:
+    """Arquivo sendo gravado no cache; só entra no índice em ``commit``"""
+
+    def __init__(self, cache: "ContentCache", key: str, expected_size: int) -> None:
+        self.cache = cache
+        self.key = key
+        self.expected_size = expected_size
+        self.size = 0
+        fd, self.path = tempfile.mkstemp(dir=cache.directory, prefix=f"{key}-", suffix=PARTIAL_SUFFIX)
+        self._file: Optional[BinaryIO] = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> None:
+        """Publica o arquivo se o tamanho bate com o esperado; caso contrário descarta"""
+        self._file.close()
+        self._file = None
+        if self.size != self.expected_size:
+            logger.warning(f"⚠️ Conteúdo {self.key} com {self.size} bytes, esperado {self.expected_size}; não cacheado")
+            self.discard()
+            return
+        self.cache._publish(self.key, self.path, self.size)
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class ContentCache:
+    """Cache em disco do conteúdo dos arquivos, limitado em bytes (LRU).
+
+    O conteúdo de um arquivo na API secundária não muda depois do upload,
+    então as entradas não expiram: saem só pelo limite de espaço ou quando o
+    arquivo é removido da API secundária. O índice fica em memória e é
+    refeito a partir do diretório na inicialização, na ordem do último acesso
+    (mtime, atualizado a cada leitura).
+
+    Os métodos fazem E/S de disco curta (abrir, renomear, apagar) e são
+    chamados direto do event loop; a leitura e a gravação do conteúdo em si
+    ficam com quem usa o cache.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_file_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self) -> None:
+        """Cria o diretório e reconstrói o índice com os arquivos já gravados"""
+        self._loaded = True
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(PARTIAL_SUFFIX):
+                    os.remove(entry.path)
+                    continue
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        self._entries.clear()
+        self.total_bytes = 0
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        if found:
+            logger.info(f"📦 Cache de conteúdo: {len(self._entries)} arquivos, {self.total_bytes} bytes")
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Abre o arquivo em cache para leitura (``None`` se ausente).
+
+        O arquivo aberto continua legível mesmo que a entrada seja descartada
+        em seguida para liberar espaço.
+        """
+        self._ensure_loaded()
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            # Apagado por fora: esquece a entrada
+            self.total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        os.utime(path)
+        self.hits += 1
+        return file
+
+    def start(self, key: str, size: int) -> Optional[PendingEntry]:
+        """Começa a gravar o conteúdo de ``key``; ``None`` se não deve ser cacheado"""
+        self._ensure_loaded()
+        if not self.enabled or size > min(self.max_file_bytes, self.max_bytes):
+            return None
+        return PendingEntry(self, key, size)
+
+    def _publish(self, key: str, path: str, size: int) -> None:
+        os.replace(path, self._path(key))
+        self.total_bytes += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def discard(self, key: str) -> None:
+        """Remove a entrada (arquivo apagado da API secundária)"""
+        if key not in self._entries:
+            return
+        self.total_bytes -= self._entries.pop(key)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def content_key(secondary_file_id: int) -> str:
+    # Uploads reaproveitados (dedupe) compartilham o id na API secundária e a entrada
+    return f"s{secondary_file_id}"
+
+content_cache = ContentCache(
+    directory=settings.CONTENT_CACHE_DIR,
+    max_bytes=settings.CONTENT_CACHE_MAX_BYTES,
+    max_file_bytes=settings.CONTENT_CACHE_MAX_FILE_BYTES,
+)
@@ -0,0 +1,91 @@
+import hashlib
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import settings
+from app.database.db import File, Project
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class DedupeStats:
+    """Economia obtida ao reaproveitar uploads repetidos"""
+    hits: int = 0
+    bytes_saved: int = 0
+    calls_saved: int = 0
+
+    def record(self, size: int) -> None:
+        self.hits += 1
+        self.bytes_saved += size
+        self.calls_saved += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "scope": settings.DEDUPE_SCOPE,
+            "hits": self.hits,
+            "bytes_saved": self.bytes_saved,
+            "calls_saved": self.calls_saved,
+        }
+
+dedupe_stats = DedupeStats()
+
+def dedupe_enabled() -> bool:
+    return settings.DEDUPE_SCOPE in ("user", "global")
+
+def hash_stream(file: BinaryIO) -> Tuple[int, str]:
+    """Calcula tamanho e SHA-256 do arquivo e volta ao início.
+
+    Função bloqueante (E/S de disco): chame fora do event loop.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    while chunk := file.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return size, digest.hexdigest()
+
+def find_duplicate(db: Session, content_hash: str, user_id: int) -> Optional[File]:
+    """Arquivo já processado com o mesmo conteúdo, respeitando ``DEDUPE_SCOPE``"""
+    if not dedupe_enabled() or not content_hash:
+        return None
+
+    query = db.query(File).filter(
+        File.content_hash == content_hash,
+        File.status == "ready",
+        File.secondary_file_id.is_not(None),
+    ).options(selectinload(File.tags))
+    if settings.DEDUPE_SCOPE == "user":
+        query = query.join(Project).filter(Project.user_id == user_id)
+    return query.order_by(File.id).first()
+
+def find_duplicates(db: Session, content_hashes: Iterable[str], user_id: int) -> Dict[str, File]:
+    """Versão em lote de ``find_duplicate``: um arquivo de origem por hash, numa só consulta"""
+    content_hashes = {content_hash for content_hash in content_hashes if content_hash}
+    if not dedupe_enabled() or not content_hashes:
+        return {}
+
+    query = db.query(File).filter(
+        File.content_hash.in_(content_hashes),
+        File.status == "ready",
+        File.secondary_file_id.is_not(None),
+    ).options(selectinload(File.tags))
+    if settings.DEDUPE_SCOPE == "user":
+        query = query.join(Project).filter(Project.user_id == user_id)
+
+    donors: Dict[str, File] = {}
+    for file in query.order_by(File.id):
+        donors.setdefault(file.content_hash, file)
+    return donors
+
+def copy_processed_data(file: File, donor: File) -> None:
+    """Reaproveita no novo arquivo o resultado do processamento do arquivo original"""
+    file.file_path = donor.file_path
+    file.secondary_file_id = donor.secondary_file_id
+    file.content_hash = donor.content_hash
+    file.tags = list(donor.tags)
+    file.tags_synced_at = donor.tags_synced_at
+    file.status = "ready"
@@ -0,0 +1,189 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Select, delete, insert, select
+
+from app.config import settings
+from app.database.db import DBSession, File, FileDerivative, Project, SecondaryDeletion, UploadJob, file_tags, open_session
+from app.services.api_secondary import secondary_api
+from app.services.content_cache import content_cache, content_key
+from app.services.derivatives import derivative_store
+from app.services.response_cache import bump_versions
+from app.services.uploads import discard_staged
+from app.services.workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+# Ids por DELETE/SELECT com IN, abaixo do limite de parâmetros dos bancos
+ID_CHUNK_SIZE = 500
+
+# O DELETE em conjunto não sincroniza objetos já carregados na sessão
+BULK_OPTIONS = {"synchronize_session": False}
+
+def _chunks(ids: List[int]):
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[start:start + ID_CHUNK_SIZE]
+
+@dataclass
+class DeleteResult:
+    """Resultado de uma exclusão; ``complete_deletion`` finaliza o que fica fora do banco"""
+    files_deleted: int = 0
+    projects_deleted: int = 0
+    # Arquivos da API secundária sem mais nenhuma referência, enfileirados para remoção
+    secondary_file_ids: List[int] = field(default_factory=list)
+    staging_paths: List[str] = field(default_factory=list)
+    # Miniaturas sem mais nenhuma referência, removidas do disco após o commit
+    derivative_hashes: List[str] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "projects_deleted": self.projects_deleted,
+            "files_deleted": self.files_deleted,
+            "secondary_deletions": len(self.secondary_file_ids),
+        }
+
+async def delete_files(db: DBSession, file_ids: Select) -> DeleteResult:
+    """Exclui os arquivos selecionados por ``file_ids`` (um SELECT de ``File.id``).
+
+    Os ids são lidos uma vez e removidos com DELETEs em conjunto (tags, jobs
+    de upload e arquivos), sem carregar os objetos. Arquivos da API secundária
+    que deixaram de ser referenciados (com a deduplicação vários arquivos
+    podem compartilhar um) entram no outbox ``secondary_deletions``, na mesma
+    transação. Não faz commit.
+    """
+    rows = (await db.execute(
+        select(File.id, File.secondary_file_id, File.project_id).where(File.id.in_(file_ids))
+    )).all()
+    result = DeleteResult()
+    if not rows:
+        return result
+
+    ids = [file_id for file_id, _, _ in rows]
+    derivative_hashes = set()
+    secondary_ids = sorted({secondary_id for _, secondary_id, _ in rows if secondary_id is not None})
+    # Os DELETEs em conjunto não passam pelo flush do ORM
+    await db.run_sync(bump_versions, project_ids={project_id for _, _, project_id in rows})
+    for chunk in _chunks(ids):
+        # Jobs ainda na fila não vão rodar: o arquivo em espera pode ser apagado
+        result.staging_paths.extend((await db.scalars(
+            select(UploadJob.staging_path).where(UploadJob.file_id.in_(chunk), UploadJob.status == "queued")
+        )).all())
+        derivative_hashes.update((await db.scalars(
+            select(FileDerivative.content_hash).where(
+                FileDerivative.file_id.in_(chunk), FileDerivative.content_hash.is_not(None)
+            ).distinct()
+        )).all())
+        # Tags, jobs e derivados também saem pelo ON DELETE CASCADE; explícito para bancos sem FKs ativas (SQLite)
+        await db.execute(delete(file_tags).where(file_tags.c.file_id.in_(chunk)))
+        await db.execute(delete(FileDerivative).where(FileDerivative.file_id.in_(chunk)), execution_options=BULK_OPTIONS)
+        await db.execute(delete(UploadJob).where(UploadJob.file_id.in_(chunk)), execution_options=BULK_OPTIONS)
+        deleted = await db.execute(delete(File).where(File.id.in_(chunk)), execution_options=BULK_OPTIONS)
+        result.files_deleted += deleted.rowcount
+
+    for chunk in _chunks(secondary_ids):
+        in_use = set((await db.scalars(
+            select(File.secondary_file_id).where(File.secondary_file_id.in_(chunk)).distinct()
+        )).all())
+        result.secondary_file_ids.extend(secondary_id for secondary_id in chunk if secondary_id not in in_use)
+    if result.secondary_file_ids:
+        await db.execute(
+            insert(SecondaryDeletion),
+            [{"secondary_file_id": secondary_id} for secondary_id in result.secondary_file_ids]
+        )
+
+    # O armazenamento de miniaturas é endereçado pelo conteúdo: outros arquivos podem usar o mesmo
+    hashes = sorted(derivative_hashes)
+    for start in range(0, len(hashes), ID_CHUNK_SIZE):
+        chunk = hashes[start:start + ID_CHUNK_SIZE]
+        in_use = set((await db.scalars(
+            select(FileDerivative.content_hash).where(FileDerivative.content_hash.in_(chunk)).distinct()
+        )).all())
+        result.derivative_hashes.extend(content_hash for content_hash in chunk if content_hash not in in_use)
+    return result
+
+async def delete_projects(db: DBSession, project_ids: Select) -> DeleteResult:
+    """Exclui os projetos selecionados por ``project_ids`` junto com seus arquivos. Não faz commit."""
+    ids = (await db.scalars(project_ids)).all()
+    if not ids:
+        return DeleteResult()
+
+    # Antes de apagar: os donos dos projetos vêm da própria tabela
+    await db.run_sync(bump_versions, project_ids=ids)
+    result = await delete_files(db, select(File.id).where(File.project_id.in_(ids)))
+    for chunk in _chunks(list(ids)):
+        deleted = await db.execute(delete(Project).where(Project.id.in_(chunk)), execution_options=BULK_OPTIONS)
+        result.projects_deleted += deleted.rowcount
+    return result
+
+async def complete_deletion(result: DeleteResult) -> None:
+    """Depois do commit: limpa arquivos em espera, miniaturas e cache de tags e acorda o outbox"""
+    for path in result.staging_paths:
+        discard_staged(path)
+    for content_hash in result.derivative_hashes:
+        derivative_store.discard(content_hash)
+    if result.secondary_file_ids:
+        await secondary_api.invalidate_tags(result.secondary_file_ids)
+        secondary_deletions.wake()
+
+async def process_secondary_deletions(batch_size: Optional[int] = None) -> int:
+    """Remove da API secundária um lote do outbox; retorna quantos itens foram processados.
+
+    Itens removidos saem da tabela; falhas voltam com espera exponencial até
+    ``SECONDARY_DELETE_MAX_ATTEMPTS`` e depois ficam como "failed".
+    """
+    batch_size = batch_size or settings.SECONDARY_DELETE_BATCH_SIZE
+    now = datetime.utcnow()
+
+    async with open_session() as db:
+        pending = (await db.scalars(
+            select(SecondaryDeletion)
+            .where(SecondaryDeletion.status == "pending", SecondaryDeletion.next_attempt_at <= now)
+            .order_by(SecondaryDeletion.next_attempt_at, SecondaryDeletion.id)
+            .limit(batch_size)
+        )).all()
+        if not pending:
+            return 0
+
+        # Um upload deduplicado pode ter voltado a usar o arquivo depois da exclusão
+        ids = {item.secondary_file_id for item in pending}
+        in_use = set(await db.scalars(select(File.secondary_file_id).where(File.secondary_file_id.in_(ids))))
+        to_delete = sorted(ids - in_use)
+        errors = await secondary_api.delete_files(to_delete) if to_delete else {}
+        # Conteúdo removido da API secundária sai também do cache em disco
+        for secondary_file_id in to_delete:
+            if errors.get(secondary_file_id) is None:
+                content_cache.discard(content_key(secondary_file_id))
+
+        for item in pending:
+            error = errors.get(item.secondary_file_id)
+            if error is None:
+                await db.delete(item)
+                continue
+            item.attempts += 1
+            item.last_error = error
+            if item.attempts >= settings.SECONDARY_DELETE_MAX_ATTEMPTS:
+                logger.error(f"❌ Exclusão na API secundária falhou após {item.attempts} tentativas (arquivo {item.secondary_file_id}): {error}")
+                item.status = "failed"
+            else:
+                delay = settings.SECONDARY_DELETE_RETRY_BACKOFF_SECONDS * (2 ** (item.attempts - 1))
+                item.next_attempt_at = now + timedelta(seconds=delay)
+        await db.commit()
+        return len(pending)
+
+class SecondaryDeletionWorker(PeriodicWorker):
+    """Executa ``process_secondary_deletions`` periodicamente e logo após novas exclusões"""
+
+    error_message = "Erro ao remover arquivos da API secundária"
+
+    def interval(self) -> float:
+        return settings.SECONDARY_DELETE_INTERVAL_SECONDS
+
+    def batch_size(self) -> int:
+        return settings.SECONDARY_DELETE_BATCH_SIZE
+
+    async def process(self) -> int:
+        return await process_secondary_deletions()
+
+secondary_deletions = SecondaryDeletionWorker()
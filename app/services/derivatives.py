@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, exists, select, update
+
+from app.config import settings
+from app.database.db import DBSession, File, FileDerivative, open_session
+from app.services import downloads
+from app.services.resilience import SecondaryAPIUnavailable
+from app.services.thumbnails import MEDIA_TYPE, Rendered, render_derivatives
+from app.services.workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+# Miniaturas e prévias das imagens.
+#
+# Depois do upload o worker busca os arquivos de imagem ainda sem derivados,
+# lê o conteúdo (cache em disco ou API secundária) e gera os JPEGs em um pool
+# de processos, fora do event loop e sem disputar o GIL com as requisições.
+# Os bytes ficam em um armazenamento endereçado pelo SHA-256 do conteúdo e
+# cada arquivo aponta para eles pela tabela ``file_derivatives``.
+
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Mesmo hash, mesmo conteúdo: o cliente pode guardar indefinidamente
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Tipos de imagem com derivados
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff")
+
+def derivative_sizes() -> List[Tuple[str, int]]:
+    """(tipo, maior lado em pixels) de cada derivado"""
+    return [("thumbnail", settings.THUMBNAIL_SIZE), ("preview", settings.PREVIEW_SIZE)]
+
+DERIVATIVE_KINDS = tuple(kind for kind, _ in derivative_sizes())
+
+def derivatives_enabled() -> bool:
+    return settings.DERIVATIVES_ENABLED and PILLOW_AVAILABLE
+
+class DerivativeStore:
+    """Arquivos gerados, endereçados pelo SHA-256 do conteúdo.
+
+    Conteúdo igual (uploads repetidos, imagens idênticas) é gravado uma vez.
+    Os métodos fazem E/S de disco: chame fora do event loop, exceto ``path``.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def path(self, content_hash: str) -> str:
+        # Dois níveis de diretório para não concentrar milhões de arquivos em um só
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def open(self, content_hash: str) -> Optional[BinaryIO]:
+        try:
+            return open(self.path(content_hash), "rb")
+        except FileNotFoundError:
+            return None
+
+    def put(self, data: bytes) -> str:
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(content_hash)
+        if os.path.exists(path):
+            return content_hash
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{content_hash}-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(partial, path)
+        except BaseException:
+            try:
+                os.remove(partial)
+            except FileNotFoundError:
+                pass
+            raise
+        return content_hash
+
+    def discard(self, content_hash: str) -> None:
+        try:
+            os.remove(self.path(content_hash))
+        except FileNotFoundError:
+            pass
+
+derivative_store = DerivativeStore(settings.DERIVATIVE_STORE_DIR)
+
+class DerivativeRenderer:
+    """Pool de processos que executa ``render_derivatives``.
+
+    Processos iniciados com "spawn": não herdam conexões, threads e o event
+    loop do processo da API. Criado no primeiro uso.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self.rendered = 0
+        self.failed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def render(self, data: bytes) -> List[Rendered]:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, render_derivatives, data, derivative_sizes(), settings.DERIVATIVE_JPEG_QUALITY
+            )
+        except BrokenProcessPool:
+            # Um processo morreu (falta de memória, por exemplo): recria o pool na próxima chamada
+            self.shutdown()
+            raise
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "rendered": self.rendered, "failed": self.failed}
+
+renderer = DerivativeRenderer(settings.DERIVATIVE_WORKERS)
+
+async def _pending_files(db: DBSession, limit: int):
+    # Arquivos cujo conteúdo não pôde ser buscado vão para o fim da fila, do mais antigo ao mais recente
+    has_derivatives = exists().where(FileDerivative.file_id == File.id)
+    return (await db.execute(
+        select(File.id, File.secondary_file_id)
+        .where(
+            File.status == "ready",
+            File.secondary_file_id.is_not(None),
+            File.file_type.in_(IMAGE_TYPES),
+            File.size <= settings.DERIVATIVE_MAX_SOURCE_BYTES,
+            ~has_derivatives,
+        )
+        .order_by(File.derivatives_attempted_at.is_not(None), File.derivatives_attempted_at, File.id)
+        .limit(limit)
+    )).all()
+
+# Colunas copiadas entre arquivos com o mesmo conteúdo
+DERIVATIVE_COLUMNS = ("kind", "status", "content_hash", "media_type", "width", "height", "size")
+
+async def _existing_rows(db: DBSession, secondary_file_id: int) -> List[Dict[str, Any]]:
+    # Uploads deduplicados compartilham o conteúdo: reaproveita o que já foi gerado
+    donor = await db.scalar(
+        select(FileDerivative.file_id)
+        .join(File, File.id == FileDerivative.file_id)
+        .where(File.secondary_file_id == secondary_file_id)
+        .limit(1)
+    )
+    if donor is None:
+        return []
+    derivatives = await db.scalars(select(FileDerivative).where(FileDerivative.file_id == donor))
+    return [{column: getattr(derivative, column) for column in DERIVATIVE_COLUMNS} for derivative in derivatives]
+
+async def _render(secondary_file_id: int) -> Optional[List[Rendered]]:
+    """Derivados do conteúdo; ``None`` se a imagem não pôde ser lida (não tenta de novo)"""
+    data = await downloads.read_content(secondary_file_id)
+    try:
+        rendered = await renderer.render(data)
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        # Formato não suportado, arquivo corrompido ou grande demais para o Pillow
+        renderer.failed += 1
+        logger.warning(f"⚠️ Não foi possível gerar miniaturas do arquivo {secondary_file_id}: {e}")
+        return None
+    renderer.rendered += 1
+    return rendered
+
+async def process_pending_derivatives(batch_size: Optional[int] = None) -> int:
+    """Gera os derivados de um lote de imagens; retorna quantos arquivos foram processados.
+
+    Falhas ao buscar o conteúdo (API secundária indisponível) deixam o
+    arquivo para as próximas rodadas, depois dos que ainda não falharam;
+    imagens ilegíveis ou ausentes na API secundária ficam marcadas como
+    "failed".
+    """
+    batch_size = batch_size or settings.DERIVATIVE_BATCH_SIZE
+    async with open_session() as db:
+        pending = await _pending_files(db, batch_size)
+        rows_by_content: Dict[int, List[Dict[str, Any]]] = {}
+        for _, secondary_file_id in pending:
+            if secondary_file_id not in rows_by_content:
+                rows_by_content[secondary_file_id] = await _existing_rows(db, secondary_file_id)
+
+    # Download, geração e gravação no disco sem sessão aberta: podem levar minutos
+    done = 0
+    for file_id, secondary_file_id in pending:
+        rows = rows_by_content[secondary_file_id]
+        if not rows:
+            rows = await _render_rows(file_id, secondary_file_id)
+            if rows is None:
+                continue
+            # Cópias deduplicadas no mesmo lote usam o que acabou de ser gerado
+            rows_by_content[secondary_file_id] = rows
+        if await _save(file_id, rows):
+            done += 1
+    return done
+
+async def _render_rows(file_id: int, secondary_file_id: int) -> Optional[List[Dict[str, Any]]]:
+    """Linhas de ``file_derivatives`` do conteúdo; ``None`` se não foi possível buscá-lo"""
+    try:
+        rendered = await _render(secondary_file_id)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            await _record_failure(file_id, e)
+            return None
+        logger.warning(f"⚠️ Arquivo {file_id} não existe mais na API secundária; sem miniaturas")
+        rendered = None
+    except (httpx.HTTPError, SecondaryAPIUnavailable) as e:
+        await _record_failure(file_id, e)
+        return None
+    if rendered is None:
+        return [{"kind": kind, "status": "failed"} for kind in DERIVATIVE_KINDS]
+    rows = []
+    for kind, data, width, height in rendered:
+        content_hash = await run_in_threadpool(derivative_store.put, data)
+        rows.append({
+            "kind": kind, "status": "ready", "content_hash": content_hash,
+            "media_type": MEDIA_TYPE, "width": width, "height": height, "size": len(data),
+        })
+    return rows
+
+async def _save(file_id: int, rows: List[Dict[str, Any]]) -> bool:
+    async with open_session() as db:
+        # O arquivo pode ter sido excluído enquanto os derivados eram gerados
+        if await db.get(File, file_id) is None:
+            return False
+        db.add_all(FileDerivative(file_id=file_id, **row) for row in rows)
+        await db.commit()
+    return True
+
+async def _record_failure(file_id: int, error: Exception) -> None:
+    logger.warning(f"⚠️ Conteúdo do arquivo {file_id} indisponível para miniaturas: {error}")
+    async with open_session() as db:
+        # Pelo Core: a data da tentativa não muda as listagens (sem incrementar as versões do cache)
+        await db.execute(
+            update(File).where(File.id == file_id).values(derivatives_attempted_at=datetime.utcnow())
+        )
+        await db.commit()
+
+async def forget_missing(content_hash: str) -> None:
+    """Apaga as linhas de um derivado cujo arquivo sumiu do disco, para o worker gerar de novo"""
+    async with open_session() as db:
+        await db.execute(delete(FileDerivative).where(FileDerivative.content_hash == content_hash))
+        await db.commit()
+    derivative_worker.wake()
+
+class DerivativeWorker(PeriodicWorker):
+    """Executa ``process_pending_derivatives`` periodicamente e logo após novos uploads"""
+
+    error_message = "Erro ao gerar miniaturas"
+
+    def interval(self) -> float:
+        return settings.DERIVATIVE_INTERVAL_SECONDS
+
+    def batch_size(self) -> int:
+        return settings.DERIVATIVE_BATCH_SIZE
+
+    async def process(self) -> int:
+        return await process_pending_derivatives()
+
+    def start(self) -> None:
+        if self.interval() <= 0 or self._task is not None:
+            return
+        if not derivatives_enabled():
+            if settings.DERIVATIVES_ENABLED:
+                logger.warning("DERIVATIVES_ENABLED ativo, mas o pacote 'Pillow' não está instalado; sem miniaturas")
+            return
+        super().start()
+
+    async def stop(self) -> None:
+        await super().stop()
+        renderer.shutdown()
+
+derivative_worker = DerivativeWorker()
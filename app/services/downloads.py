@@ -0,0 +1,271 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.engine import Row
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.services.api_secondary import secondary_api
+from app.services.content_cache import PendingEntry, content_cache, content_key
+
+# Download do conteúdo dos arquivos (GET /files/{id}/content).
+#
+# O tamanho, a data e o hash vêm do banco, então Range, ETag e Last-Modified
+# são resolvidos antes de qualquer chamada à API secundária. Arquivos no
+# cache em disco saem direto dele; os demais vêm da API secundária em
+# streaming e são gravados no cache enquanto seguem para o cliente.
+
+CACHE_CONTROL = "private, no-cache"
+
+# O tipo vem do cliente no upload: só tipos que o navegador não executa são
+# exibidos (inline); os demais (HTML, SVG, JavaScript...) viram download
+INLINE_TYPES = frozenset({
+    "image/png", "image/jpeg", "image/gif", "image/webp", "image/bmp", "image/avif",
+    "application/pdf", "text/plain",
+    "audio/mpeg", "audio/ogg", "audio/wav", "video/mp4", "video/webm", "video/ogg",
+})
+
+def content_disposition(file_type: Optional[str], filename: str) -> str:
+    media_type = (file_type or "").split(";", 1)[0].strip().lower()
+    disposition = "inline" if media_type in INLINE_TYPES else "attachment"
+    return f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+class RangeNotSatisfiable(Exception):
+    """Range fora do tamanho do arquivo"""
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Lê um cabeçalho ``Range: bytes=...`` e retorna ``(início, fim)`` inclusivos.
+
+    ``None`` (resposta completa) para cabeçalho ausente, malformado ou com
+    vários intervalos, que o RFC 9110 permite ignorar. Em arquivo vazio
+    nenhum intervalo pode ser atendido.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # Sufixo: os últimos N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def http_date(value: datetime) -> str:
+    # As datas do banco são UTC sem fuso
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def _parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _modified_at(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+def not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """If-None-Match (comparação fraca) ou, na sua falta, If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+    since = _parse_http_date(request.headers.get("if-modified-since"))
+    return since is not None and _modified_at(last_modified) <= since
+
+def range_applies(request: Request, etag: str, last_modified: datetime) -> bool:
+    """If-Range: o Range só vale se o cliente tem a mesma versão (comparação forte)"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    since = _parse_http_date(if_range)
+    return since is not None and _modified_at(last_modified) == since
+
+def content_etag(file: Row) -> str:
+    # ETag forte: o conteúdo de um arquivo não muda depois do upload
+    if file.content_hash:
+        return f'"{file.content_hash}"'
+    return f'"s{file.secondary_file_id}-{file.size}"'
+
+class FileRangeResponse(Response):
+    """Envia um trecho de um arquivo já aberto, sem carregá-lo em memória.
+
+    Com a extensão ASGI ``http.response.zerocopy`` o servidor usa
+    ``sendfile`` direto do descritor; sem ela o arquivo é lido em pedaços
+    fora do event loop. O arquivo é fechado ao final.
+    """
+
+    def __init__(self, file: BinaryIO, start: int, end: int, status_code: int, headers: Dict[str, str]) -> None:
+        super().__init__(status_code=status_code, headers={**headers, "Content-Length": str(end - start + 1)})
+        self.file = file
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            count = self.end - self.start + 1
+            if "http.response.zerocopy" in (scope.get("extensions") or {}):
+                await send({
+                    "type": "http.response.zerocopy", "file": self.file,
+                    "offset": self.start, "count": count, "more_body": False,
+                })
+                return
+            await run_in_threadpool(self.file.seek, self.start)
+            finished = False
+            while count > 0:
+                chunk = await run_in_threadpool(self.file.read, min(settings.CONTENT_STREAM_CHUNK_BYTES, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                finished = count <= 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": not finished})
+            if not finished:
+                # Arquivo vazio ou menor que o esperado: encerra o corpo mesmo assim
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+        if self.background is not None:
+            await self.background()
+
+async def _relay(
+    upstream: httpx.Response, entry: Optional[PendingEntry], start: int, end: Optional[int]
+) -> AsyncIterator[bytes]:
+    # Repassa o corpo da API secundária; com ``entry`` grava tudo no cache e
+    # entrega só o trecho [start, end] pedido pelo cliente
+    position = 0
+    try:
+        async for chunk in upstream.aiter_bytes(settings.CONTENT_STREAM_CHUNK_BYTES):
+            if entry is not None:
+                await run_in_threadpool(entry.write, chunk)
+            chunk_end = position + len(chunk)
+            if end is None or (start <= position and chunk_end <= end + 1):
+                yield chunk
+            elif position <= end and chunk_end > start:
+                yield chunk[max(start - position, 0):end + 1 - position]
+            position = chunk_end
+            if entry is None and end is not None and position > end:
+                break
+        if entry is not None:
+            await run_in_threadpool(entry.commit)
+            entry = None
+    finally:
+        if entry is not None:
+            await run_in_threadpool(entry.discard)
+        await upstream.aclose()
+
+async def content_response(request: Request, file: Row) -> Response:
+    """Resposta do conteúdo de ``file`` (linha com id na API secundária, tamanho, tipo, hash e data).
+
+    Erros da API secundária (``httpx.HTTPError``/``SecondaryAPIUnavailable``)
+    são propagados para a rota traduzir.
+    """
+    etag = content_etag(file)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(file.created_at),
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if not_modified(request, etag, file.created_at):
+        return Response(status_code=304, headers=headers)
+
+    size = file.size
+    try:
+        byte_range = parse_range(request.headers.get("range"), size) if range_applies(
+            request, etag, file.created_at
+        ) else None
+    except RangeNotSatisfiable:
+        raise HTTPException(
+            status_code=416, detail="Intervalo fora do tamanho do arquivo",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    headers.update({
+        "Content-Type": file.file_type or "application/octet-stream",
+        "Content-Disposition": content_disposition(file.file_type, file.filename),
+        # Sem adivinhar o tipo pelo conteúdo: o navegador usa o declarado
+        "X-Content-Type-Options": "nosniff",
+    })
+    status_code, start, end = 200, 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    key = content_key(file.secondary_file_id)
+    cached = content_cache.open(key)
+    if cached is not None:
+        return FileRangeResponse(cached, start, end, status_code, headers)
+
+    upstream = await secondary_api.open_file_content(
+        file.secondary_file_id, request.headers.get("range") if byte_range is not None else None
+    )
+    if upstream.status_code == 206:
+        # A API secundária já cortou o trecho: repassa sem cachear
+        headers["Content-Range"] = upstream.headers.get("content-range", headers["Content-Range"])
+        if "content-length" in upstream.headers:
+            headers["Content-Length"] = upstream.headers["content-length"]
+        return StreamingResponse(_relay(upstream, None, 0, None), status_code=206, headers=headers)
+
+    # Corpo completo: vai para o cache e o cliente recebe o trecho pedido
+    length = int(upstream.headers.get("content-length", size))
+    entry = content_cache.start(key, length)
+    if byte_range is None:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(_relay(upstream, entry, 0, None), status_code=200, headers=headers)
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_relay(upstream, entry, start, end), status_code=206, headers=headers)
+
+async def read_content(secondary_file_id: int) -> bytes:
+    """Conteúdo completo de um arquivo, do cache em disco ou da API secundária (que passa a ficar no cache)"""
+    key = content_key(secondary_file_id)
+    cached = content_cache.open(key)
+    if cached is not None:
+        with cached:
+            return await run_in_threadpool(cached.read)
+
+    upstream = await secondary_api.open_file_content(secondary_file_id)
+    try:
+        data = await upstream.aread()
+    finally:
+        await upstream.aclose()
+    entry = content_cache.start(key, len(data))
+    if entry is not None:
+        await run_in_threadpool(_write_entry, entry, data)
+    return data
+
+def _write_entry(entry: PendingEntry, data: bytes) -> None:
+    try:
+        entry.write(data)
+        entry.commit()
+    except BaseException:
+        entry.discard()
+        raise
@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Métricas no formato de exposição de texto do Prometheus, sem dependências:
+# contadores e histogramas acumulados em memória e gauges lidos na coleta.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+INF_LABEL = 'le="+Inf"'
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """Contador monotônico com labels"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def collect(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram:
+    """Histograma com buckets fixos; ``observe`` custa uma busca binária e um lock"""
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por série: contagem em cada bucket (não acumulada), soma e total
+        self._series: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[2] if series else 0
+
+    def collect(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+class Gauge:
+    """Valor lido no momento da coleta: ``callback`` retorna ``{(labels...): valor}``"""
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Dict[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self) -> Iterable[str]:
+        for key, value in sorted(self.callback().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica já registrada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        """Todas as métricas no formato de texto do Prometheus (versão 0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                samples = list(metric.collect())
+            except Exception as e:
+                # Uma fonte com problema não derruba a coleta inteira
+                logger.warning(f"Falha ao coletar a métrica {metric.name}: {str(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Duração das requisições HTTP por rota", ("method", "route", "status")
+)
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries", "Consultas SQL executadas por requisição", ("route",), QUERY_COUNT_BUCKETS
+)
+http_request_db_duration = registry.histogram(
+    "http_request_db_seconds", "Tempo total em consultas SQL por requisição", ("route",)
+)
+http_request_secondary_calls = registry.histogram(
+    "http_request_secondary_api_calls", "Chamadas à API secundária por requisição", ("route",), QUERY_COUNT_BUCKETS
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Duração de cada consulta SQL", ("operation",)
+)
+secondary_api_duration = registry.histogram(
+    "secondary_api_request_seconds", "Duração das chamadas à API secundária", ("operation", "outcome")
+)
+secondary_api_errors = registry.counter(
+    "secondary_api_errors", "Erros nas chamadas à API secundária", ("operation", "kind")
+)
+upload_bytes = registry.counter(
+    "upload_bytes", "Bytes recebidos em uploads, por destino", ("destination",)
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Atraso do event loop em relação ao agendado", buckets=LOOP_LAG_BUCKETS
+)
+
+@dataclass
+class RequestStats:
+    """Contadores da requisição em andamento (lidos pelo middleware e pelo profiler)"""
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    secondary_calls: int = 0
+    secondary_seconds: float = 0.0
+    # Preenchidos só quando a requisição está sendo perfilada (app.services.profiling)
+    queries: Optional[List[Tuple[str, float]]] = None
+    secondary_log: Optional[List[Tuple[str, float, Optional[str]]]] = None
+
+# Propagado para o threadpool (DB_MODE=sync) e para o greenlet do SQLAlchemy assíncrono
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def record_secondary_call(operation: str, seconds: float, error: Optional[BaseException] = None) -> None:
+    secondary_api_duration.observe(seconds, operation=operation, outcome="error" if error else "ok")
+    if error is not None:
+        secondary_api_errors.inc(operation=operation, kind=error_kind(error))
+    stats = current_request.get()
+    if stats is not None:
+        stats.secondary_calls += 1
+        stats.secondary_seconds += seconds
+        if stats.secondary_log is not None:
+            stats.secondary_log.append((operation, seconds, error_kind(error) if error else None))
+
+def record_secondary_rejection(operation: str, error: BaseException) -> None:
+    """Chamada recusada localmente (circuito aberto ou bulkhead cheio)"""
+    secondary_api_errors.inc(operation=operation, kind=error_kind(error))
+
+def error_kind(error: BaseException) -> str:
+    """Categoria curta do erro, usada como label (cardinalidade baixa)"""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return f"http_{status // 100}xx"
+    name = error.__class__.__name__
+    if "Timeout" in name:
+        return "timeout"
+    return {
+        "CircuitOpenError": "circuit_open",
+        "BulkheadFull": "bulkhead_full",
+    }.get(name, "transport" if "Error" in name else "other")
+
+def record_upload(size: int, destination: str) -> None:
+    upload_bytes.inc(size, destination=destination)
+
+# Consultas SQL: tempo por comando e totais da requisição corrente
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    db_query_duration.observe(elapsed, operation=statement.lstrip()[:6].upper())
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+        if stats.queries is not None and len(stats.queries) < settings.PROFILING_MAX_SQL:
+            stats.queries.append((statement, elapsed))
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+_hooks_installed = False
+
+def install_sqlalchemy_hooks() -> None:
+    """Instrumenta todos os engines (síncronos e os ``sync_engine`` dos assíncronos)"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _hooks_installed = True
+
+_route_paths: "WeakKeyDictionary[Any, Dict[Any, str]]" = WeakKeyDictionary()
+
+def route_template(scope) -> str:
+    """Caminho da rota que atendeu a requisição, com os {parâmetros}.
+
+    O roteador grava o endpoint no scope; agrupar pelo caminho da rota evita
+    uma série (ou entrada) por id.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    app = scope.get("app")
+    paths = _route_paths.get(app) if app is not None else None
+    if paths is None:
+        paths = {
+            route.endpoint: route.path
+            for route in getattr(app, "routes", [])
+            if hasattr(route, "endpoint")
+        }
+        if app is not None:
+            _route_paths[app] = paths
+    return paths.get(endpoint, getattr(endpoint, "__name__", "unknown"))
+
+class MetricsMiddleware:
+    """Middleware ASGI: latência por rota, consultas SQL e chamadas à API secundária.
+
+    Escrito direto sobre ASGI (sem ``BaseHTTPMiddleware``) para não adicionar
+    tarefas nem cópias do corpo no caminho de cada requisição. Com
+    ``METRICS_SERVER_TIMING`` a resposta leva o cabeçalho ``Server-Timing``.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.METRICS_SERVER_TIMING:
+                    timing = (
+                        f"app;dur={(time.perf_counter() - started) * 1000:.1f}, "
+                        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries", '
+                        f'secondary;dur={stats.secondary_seconds * 1000:.1f};desc="{stats.secondary_calls} calls"'
+                    )
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = route_template(scope)
+            http_request_duration.observe(
+                time.perf_counter() - started, method=scope["method"], route=route, status=status_code
+            )
+            http_request_db_queries.observe(stats.db_queries, route=route)
+            http_request_db_duration.observe(stats.db_seconds, route=route)
+            http_request_secondary_calls.observe(stats.secondary_calls, route=route)
+
+class LoopLagMonitor:
+    """Mede periodicamente quanto o event loop atrasa para retomar um ``sleep``.
+
+    Atraso alto indica código bloqueante rodando dentro de ``async def``.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self.last_lag = 0.0
+
+    def start(self) -> None:
+        if settings.METRICS_LOOP_LAG_INTERVAL_SECONDS <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = settings.METRICS_LOOP_LAG_INTERVAL_SECONDS
+        while True:
+            scheduled = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.last_lag = max(0.0, loop.time() - scheduled)
+            event_loop_lag.observe(self.last_lag)
+
+loop_lag_monitor = LoopLagMonitor()
+
+registry.gauge(
+    "event_loop_lag_last_seconds", "Último atraso medido do event loop", lambda: {(): loop_lag_monitor.last_lag}
+)
+
+def flatten_stats(stats: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Achata um dicionário de estatísticas em ``{"a.b": valor}``.
+
+    Números viram valores; booleanos, 0/1; textos (ex.: estado do circuito)
+    viram ``"a.b=texto"`` com valor 1.
+    """
+    result: Dict[str, float] = {}
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            result.update(flatten_stats(value, f"{name}."))
+        elif isinstance(value, (bool, int, float)):
+            result[name] = float(value)
+        elif isinstance(value, str):
+            result[f"{name}={value}"] = 1.0
+    return result
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from itertools import count
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.metrics import RequestStats, current_request, route_template
+
+logger = logging.getLogger(__name__)
+
+# Profiling por amostragem das requisições lentas.
+#
+# Uma thread de amostragem lê periodicamente a pilha da thread do event loop
+# (sys._current_frames) e atribui a amostra à requisição cuja task está
+# rodando no loop naquele instante. O que aparece nas pilhas é o tempo em que
+# a requisição segurou o event loop: exatamente o código bloqueante dentro de
+# ``async def`` (hash, I/O de disco, driver síncrono...). O tempo esperando
+# ``await`` não gera amostras e já aparece nos totais de SQL/API secundária.
+
+MAX_STACK_DEPTH = 64
+MAX_SQL_LENGTH = 1000
+
+Frame = Tuple[str, str, int]  # (função, arquivo, linha)
+
+# asyncio mantém a task em execução de cada loop neste dicionário (privado,
+# mas lido só para atribuição; sem ele toda amostra do loop conta)
+_current_tasks: Optional[Dict[Any, Any]] = getattr(asyncio.tasks, "_current_tasks", None)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+
+def _short_path(path: str) -> str:
+    marker = f"site-packages{os.sep}"
+    if marker in path:
+        return path.split(marker, 1)[1]
+    if path.startswith(_ROOT):
+        return path[len(_ROOT):]
+    return path
+
+def _extract_stack(frame) -> Tuple[Frame, ...]:
+    """Pilha da raiz para a folha, limitada às ``MAX_STACK_DEPTH`` chamadas mais internas"""
+    stack: List[Frame] = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_name, _short_path(code.co_filename), frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+def _format_frame(frame: Frame) -> str:
+    name, path, line = frame
+    return f"{name} ({path}:{line})"
+
+class RequestProfile:
+    """Amostras e eventos de uma requisição perfilada"""
+
+    def __init__(self, task, loop, thread_id: int) -> None:
+        self.task = task
+        self.loop = loop
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0  # amostras com a requisição ativa no loop
+        self.ticks = 0  # amostras tiradas durante a requisição
+
+    def add_sample(self, frames: Dict[int, Any]) -> None:
+        self.ticks += 1
+        if _current_tasks is not None and _current_tasks.get(self.loop) is not self.task:
+            return
+        frame = frames.get(self.thread_id)
+        if frame is None:
+            return
+        self.stacks[_extract_stack(frame)] += 1
+        self.samples += 1
+
+    def summary(self, top: int) -> Dict[str, Any]:
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, hits in self.stacks.items():
+            self_counts[stack[-1]] += hits
+            # Recursão não conta duas vezes no tempo acumulado
+            for frame in set(stack):
+                total_counts[frame] += hits
+        return {
+            "samples": self.samples,
+            "ticks": self.ticks,
+            "top_stacks": [
+                {"samples": hits, "stack": [_format_frame(frame) for frame in stack]}
+                for stack, hits in self.stacks.most_common(top)
+            ],
+            "top_functions": [
+                {"function": _format_frame(frame), "self": hits, "total": total_counts[frame]}
+                for frame, hits in self_counts.most_common(top)
+            ],
+            # Formato "folded" (uma pilha por linha), aceito por flamegraph.pl e speedscope
+            "flamegraph": "\n".join(
+                ";".join(name for name, _, _ in stack) + f" {hits}"
+                for stack, hits in self.stacks.items()
+            ),
+        }
+
+class StackSampler:
+    """Thread que amostra as pilhas enquanto houver requisições perfiladas"""
+
+    def __init__(self) -> None:
+        self._profiles: Dict[int, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[id(profile)] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.pop(id(profile), None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(settings.PROFILING_SAMPLE_INTERVAL_MS / 1000)
+            with self._lock:
+                profiles = list(self._profiles.values())
+                if not profiles:
+                    # Sem requisições perfiladas a thread termina; add() cria outra
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.add_sample(frames)
+            del frames
+
+sampler = StackSampler()
+
+class ProfileStore:
+    """Buffer circular com os perfis das requisições lentas"""
+
+    def __init__(self, maxlen: int) -> None:
+        self._profiles: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            profile["id"] = next(self._ids)
+            self._profiles.append(profile)
+        return profile
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Resumos, do mais recente ao mais antigo"""
+        with self._lock:
+            profiles = list(self._profiles)
+        keys = ("id", "method", "path", "route", "status", "duration_ms", "started_at", "forced", "samples",
+                "db_queries", "db_ms", "secondary_calls", "secondary_ms")
+        return [{key: profile[key] for key in keys} for profile in reversed(profiles)]
+
+    def get(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+profile_store = ProfileStore(settings.PROFILING_MAX_PROFILES)
+
+def is_admin(token: Optional[str]) -> bool:
+    """Compara o token recebido com ``PROFILING_ADMIN_TOKEN`` (vazio: ninguém é admin)"""
+    expected = settings.PROFILING_ADMIN_TOKEN
+    return bool(expected and token) and secrets.compare_digest(token.encode(), expected.encode())
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila as requisições e guarda as lentas.
+
+    Ativo para todas as requisições com ``PROFILING_ENABLED`` (só as acima de
+    ``PROFILING_SLOW_REQUEST_MS`` são guardadas) ou para uma requisição com
+    ``X-Profile: 1`` e um ``X-Admin-Token`` válido (guardada sempre). Deve
+    ficar dentro do ``MetricsMiddleware`` para reaproveitar os contadores da
+    requisição.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = _header(scope, b"x-profile") == "1" and is_admin(_header(scope, b"x-admin-token"))
+        if not (settings.PROFILING_ENABLED or forced):
+            await self.app(scope, receive, send)
+            return
+
+        stats = current_request.get()
+        token = None
+        if stats is None:
+            # Métricas desativadas: o profiler mantém seus próprios contadores
+            stats = RequestStats()
+            token = current_request.set(stats)
+        stats.queries = []
+        stats.secondary_log = []
+
+        profile = RequestProfile(asyncio.current_task(), asyncio.get_running_loop(), threading.get_ident())
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            sampler.remove(profile)
+            if token is not None:
+                current_request.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            if forced or duration_ms >= settings.PROFILING_SLOW_REQUEST_MS:
+                self._store(scope, status_code, started_at, duration_ms, forced, stats, profile)
+
+    def _store(self, scope, status_code, started_at, duration_ms, forced, stats, profile) -> None:
+        path = scope["path"]
+        entry = profile_store.add({
+            "method": scope["method"],
+            "path": path,
+            "route": route_template(scope),
+            "status": status_code,
+            "duration_ms": round(duration_ms, 1),
+            "started_at": started_at.isoformat(),
+            "forced": forced,
+            "sample_interval_ms": settings.PROFILING_SAMPLE_INTERVAL_MS,
+            "db_queries": stats.db_queries,
+            "db_ms": round(stats.db_seconds * 1000, 1),
+            "secondary_calls": stats.secondary_calls,
+            "secondary_ms": round(stats.secondary_seconds * 1000, 1),
+            "sql": [
+                {"statement": statement[:MAX_SQL_LENGTH], "ms": round(seconds * 1000, 2)}
+                for statement, seconds in stats.queries
+            ],
+            "secondary_api": [
+                {"operation": operation, "ms": round(seconds * 1000, 1), "error": error}
+                for operation, seconds, error in stats.secondary_log
+            ],
+            **profile.summary(settings.PROFILING_TOP_STACKS),
+        })
+        if not forced:
+            logger.warning(
+                f"🐢 Requisição lenta #{entry['id']}: {scope['method']} {path} {duration_ms:.0f}ms "
+                f"({stats.db_queries} consultas, {stats.secondary_calls} chamadas à API secundária)"
+            )
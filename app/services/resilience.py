@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Respostas que indicam sobrecarga ou falha passageira: vale tentar de novo
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+class SecondaryAPIUnavailable(Exception):
+    """Chamada recusada localmente, sem chegar à API secundária"""
+
+    def __init__(self, message: str, retry_after: float = 1.0) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpenError(SecondaryAPIUnavailable):
+    """Circuito aberto: a API secundária falhou demais e está em espera"""
+
+class BulkheadFull(SecondaryAPIUnavailable):
+    """Limite de chamadas simultâneas atingido"""
+
+def is_failure(error: BaseException) -> bool:
+    """Erro que conta para abrir o circuito: rede, timeout ou resposta 5xx"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code in RETRYABLE_STATUS
+
+class CircuitBreaker:
+    """Circuit breaker por falhas consecutivas.
+
+    ``closed``: chamadas passam. Após ``failure_threshold`` falhas seguidas vai
+    para ``open`` e recusa tudo por ``recovery_timeout`` segundos; depois
+    ``half_open`` deixa passar uma chamada de teste, que fecha o circuito se
+    der certo ou o reabre se falhar.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        recovery_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def _retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (self._clock() - self.opened_at))
+
+    def _reject(self) -> None:
+        self.rejected += 1
+        raise CircuitOpenError("Circuito da API secundária aberto", retry_after=max(1.0, self._retry_after()))
+
+    def is_open(self) -> bool:
+        """Circuito aberto e ainda dentro do tempo de espera"""
+        return self.state == "open" and self._retry_after() > 0
+
+    def raise_if_open(self) -> None:
+        """Falha rápido enquanto o circuito estiver aberto, sem consumir a chamada de teste"""
+        if self.is_open():
+            self._reject()
+
+    def before_call(self) -> None:
+        """Autoriza uma chamada ou levanta ``CircuitOpenError``"""
+        if self.state == "open":
+            if self._retry_after() > 0:
+                self._reject()
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open":
+            if self._probing:
+                self._reject()
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("✅ API secundária respondeu, circuito fechado")
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(
+                    f"⚠️ Circuito da API secundária aberto após {self.failures} falhas; "
+                    f"novas chamadas em {self.recovery_timeout}s"
+                )
+            self.state = "open"
+            self.opened_at = self._clock()
+            self._probing = False
+
+    def release(self) -> None:
+        """Chamada encerrada sem resultado (cancelada): libera a vaga de teste"""
+        if self.state == "half_open":
+            self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after": round(self._retry_after(), 1) if self.state == "open" else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+class Bulkhead:
+    """Limita as chamadas simultâneas; quem espera mais que ``max_wait`` recebe ``BulkheadFull``"""
+
+    def __init__(self, name: str, max_concurrent: int, max_wait: float) -> None:
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # O semáforo pertence a um event loop (os testes criam um loop por asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+            self.in_flight = 0
+        return self._semaphore
+
+    async def __aenter__(self) -> "Bulkhead":
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BulkheadFull(f"Limite de chamadas simultâneas ({self.name}) atingido") from None
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"in_flight": self.in_flight, "max": self.max_concurrent, "rejected": self.rejected}
+
+async def retry(
+    call: Callable[[], Awaitable[T]],
+    attempts: int,
+    base_delay: float,
+    max_delay: float,
+) -> T:
+    """Repete ``call`` em erros passageiros com espera exponencial e jitter total"""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            attempt += 1
+            if attempt >= attempts or not is_retryable(e):
+                raise
+            # Jitter total: espera aleatória entre 0 e o teto exponencial
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1))))
+
+async def hedge(call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """Dispara uma segunda cópia de ``call`` se a primeira demorar mais que ``delay``.
+
+    Vale a primeira resposta bem-sucedida; a outra chamada é cancelada. Só
+    para operações idempotentes.
+    """
+    if delay <= 0:
+        return await call()
+
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
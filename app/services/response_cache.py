@@ -0,0 +1,185 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import Request, Response
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.db import DBSession, File, Project, User, open_session
+from app.services.cache import MISSING, LRUCache
+from app.services.serialization import JSONBytesResponse
+
+# Cache das listagens validado por contadores de versão.
+#
+# ``users.cache_version`` muda a cada alteração nos projetos ou arquivos do
+# usuário e ``projects.cache_version`` a cada alteração no projeto ou nos seus
+# arquivos. As rotas leem só o contador (uma consulta por chave primária):
+# com o mesmo valor, a resposta anterior continua válida e é devolvida do
+# cache em memória ou respondida com 304 quando o cliente já a tem.
+#
+# Com réplica de leitura o contador vem do primário: lido na réplica, um valor
+# atrasado confirmaria com 304 a cópia anterior logo depois de uma escrita do
+# próprio cliente. Enquanto a réplica não alcança o primário a rota responde
+# sem cache, para não guardar sob a versão nova o conteúdo antigo da réplica.
+
+# Cabeçalhos da resposta guardados junto com o conteúdo (paginação)
+CACHED_HEADERS = ("X-Next-Cursor", "Link")
+
+CACHE_CONTROL = "private, no-cache"
+
+users_table = User.__table__
+projects_table = Project.__table__
+
+def bump_versions(session: Session, project_ids: Iterable[int] = (), user_ids: Iterable[int] = ()) -> None:
+    """Incrementa as versões dos projetos e dos usuários (os donos dos projetos inclusive).
+
+    Para escritas em conjunto pelo Core, que não passam pelo ``after_flush``.
+    Deve rodar na mesma transação da alteração, antes de apagar os projetos.
+    """
+    project_ids = sorted(set(project_ids))
+    user_ids = sorted(set(user_ids))
+    if not (project_ids or user_ids):
+        return
+    conn = session.connection()
+    if project_ids:
+        conn.execute(
+            update(projects_table)
+            .where(projects_table.c.id.in_(project_ids))
+            .values(cache_version=projects_table.c.cache_version + 1)
+        )
+    conn.execute(
+        update(users_table)
+        .where(or_(
+            users_table.c.id.in_(user_ids),
+            users_table.c.id.in_(select(projects_table.c.user_id).where(projects_table.c.id.in_(project_ids))),
+        ))
+        .values(cache_version=users_table.c.cache_version + 1)
+    )
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_versions(session: Session, flush_context) -> None:
+    # Alterações pelo ORM (uploads, status dos jobs, tags sincronizadas,
+    # edição de projetos): o estado anterior ao flush ainda está disponível
+    project_ids: Set[int] = set()
+    user_ids: Set[int] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, File):
+            if instance in session.dirty and not session.is_modified(instance):
+                continue
+            if instance.project_id is not None:
+                project_ids.add(instance.project_id)
+        elif isinstance(instance, Project):
+            if instance in session.dirty and not session.is_modified(instance, include_collections=False):
+                continue
+            if instance in session.deleted:
+                user_ids.add(instance.user_id)
+            else:
+                project_ids.add(instance.id)
+    bump_versions(session, project_ids, user_ids)
+
+async def _current_version(db: DBSession, statement) -> Optional[int]:
+    """Versão no primário; ``None`` se a réplica ``db`` ainda não a alcançou"""
+    if not settings.DATABASE_REPLICA_URL:
+        return await db.scalar(statement)
+    async with open_session() as primary:
+        version = await primary.scalar(statement)
+    if version is None or await db.scalar(statement) != version:
+        return None
+    return version
+
+async def user_version(db: DBSession, user_id: int) -> Optional[int]:
+    return await _current_version(db, select(User.cache_version).where(User.id == user_id))
+
+async def project_version(db: DBSession, user_id: int, project_id: int) -> Optional[int]:
+    """Versão do projeto do usuário; ``None`` se o projeto não existe, é de outro usuário
+    ou a réplica está atrasada"""
+    return await _current_version(db, select(Project.cache_version).where(
+        Project.id == project_id,
+        Project.user_id == user_id
+    ))
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    # Comparação fraca (RFC 9110): ignora o prefixo W/
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+@dataclass
+class CachedResponse:
+    etag: str
+    body: bytes
+    headers: Dict[str, str]
+
+class ResponseCache:
+    """Cache por usuário das listagens, com ETag fraco derivado da versão.
+
+    ``lookup`` devolve um 304 (``If-None-Match`` igual ao ETag atual), o
+    corpo já serializado guardado para a mesma versão ou ``None`` para a rota
+    consultar o banco e chamar ``store``. Entradas de versões antigas nunca
+    são servidas: só saem pelo LRU ou pelo TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.not_modified = 0
+
+    @staticmethod
+    def etag(request: Request, scope: str, version: int) -> str:
+        # A URL inteira (filtros, ordenação, cursor) entra no hash
+        digest = hashlib.blake2b(str(request.url).encode(), digest_size=8).hexdigest()
+        return f'W/"{scope}.{version}.{digest}"'
+
+    @staticmethod
+    def _key(request: Request, user_id: int):
+        return user_id, request.url.path, request.url.query
+
+    def lookup(
+        self, request: Request, response: Response, user_id: int, scope: str, version: Optional[int]
+    ) -> Optional[Response]:
+        if version is None or not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        etag = self.etag(request, scope, version)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        cached = self.entries.get(self._key(request, user_id))
+        if cached is not MISSING and cached.etag == etag:
+            return JSONBytesResponse(cached.body, headers={**cached.headers, **headers})
+        # A resposta montada pela rota leva o ETag
+        response.headers.update(headers)
+        return None
+
+    def store(self, request: Request, user_id: int, result: Response, cacheable: bool = True) -> Response:
+        """Guarda o corpo de ``result`` sob o ETag definido em ``lookup`` e devolve ``result``.
+
+        Com ``cacheable=False`` (conteúdo que depende de algo fora do banco,
+        como tags ainda buscadas na API secundária) o ETag é retirado.
+        """
+        etag = result.headers.get("etag")
+        if etag is None:
+            return result
+        if not cacheable:
+            del result.headers["etag"]
+            del result.headers["cache-control"]
+            return result
+        headers = {name: result.headers[name] for name in CACHED_HEADERS if name in result.headers}
+        self.entries.set(self._key(request, user_id), CachedResponse(etag, result.body, headers))
+        return result
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "not_modified": self.not_modified}
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, union
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import ColumnElement
+
+from app.database.db import (
+    SEARCH_TEXT_CONFIG, DBSession, File, Project, Tag, file_tags, file_search_document, project_search_document
+)
+from app.database.pagination import Page, decode_cursor, encode_cursor, paginate
+from app.services.tags import tag_filter
+from app.services.uploads import FILE_ROW_COLUMNS
+
+# Peso de cada parte na relevância: nome do arquivo > tags > dados do projeto
+FILENAME_WEIGHT = 1.0
+TAG_WEIGHT = 0.5
+PROJECT_WEIGHT = 0.4
+
+# Ordenação usada no cursor das buscas por relevância
+RELEVANCE_SORT = "relevance"
+
+# Caractere de escape dos padrões LIKE (não depende do tratamento da barra invertida pelo banco)
+LIKE_ESCAPE = "!"
+
+@dataclass
+class TextMatch:
+    """Condições e relevância de um termo de busca em um banco específico"""
+    file_condition: ColumnElement
+    project_condition: ColumnElement
+    rank: ColumnElement
+
+def _escape_like(value: str) -> str:
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+def _postgres_match(q: str) -> TextMatch:
+    # tsvector/tsquery com ranking e similaridade por trigramas; cada condição
+    # usa um dos índices GIN criados em init_db
+    query = func.websearch_to_tsquery(SEARCH_TEXT_CONFIG, q)
+    file_document = file_search_document()
+    project_document = project_search_document()
+    return TextMatch(
+        file_condition=or_(
+            file_document.op("@@")(query),
+            File.filename.ilike(f"%{_escape_like(q)}%", escape=LIKE_ESCAPE),
+            File.filename.op("%")(q),
+        ),
+        project_condition=project_document.op("@@")(query),
+        rank=(
+            FILENAME_WEIGHT * (func.ts_rank(file_document, query) + func.similarity(File.filename, q))
+            + PROJECT_WEIGHT * func.ts_rank(project_document, query)
+        ),
+    )
+
+def _fallback_match(terms: List[str]) -> TextMatch:
+    # Sem índice textual (SQLite nos testes): todos os termos precisam
+    # aparecer no nome do arquivo ou nos dados do projeto
+    filename = func.lower(File.filename)
+    project_text = func.lower(
+        func.coalesce(Project.name, "") + " "
+        + func.coalesce(Project.client_name, "") + " "
+        + func.coalesce(Project.description, "")
+    )
+
+    def contains(column, term):
+        return column.like(f"%{_escape_like(term)}%", escape=LIKE_ESCAPE)
+
+    return TextMatch(
+        file_condition=and_(*(contains(filename, term) for term in terms)),
+        project_condition=and_(*(contains(project_text, term) for term in terms)),
+        rank=sum(
+            FILENAME_WEIGHT * case((contains(filename, term), 1.0), else_=0.0)
+            + PROJECT_WEIGHT * case((contains(project_text, term), 1.0), else_=0.0)
+            for term in terms
+        ) / len(terms),
+    )
+
+async def search_files(
+    db: DBSession,
+    user_id: int,
+    q: Optional[str],
+    tags: Optional[List[str]],
+    match_all: bool,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Row], Optional[str]]:
+    """Busca arquivos do usuário por texto e/ou tags, retornando (arquivos, próximo cursor).
+
+    Com ``q`` os resultados vêm por relevância: nome do arquivo, tags com o
+    mesmo nome dos termos e nome/cliente/descrição do projeto, numa única
+    consulta. Os candidatos saem de subconsultas apoiadas nos índices de
+    busca e já restritas ao usuário, então o custo acompanha o número de
+    resultados dele e não o tamanho da tabela. Só com tags a ordem é a da listagem (mais recentes primeiro).
+    Os arquivos vêm como linhas de ``FILE_ROW_COLUMNS``, sem as tags.
+    """
+    statement = select(*FILE_ROW_COLUMNS).join(Project).where(
+        Project.user_id == user_id
+    )
+
+    # Busca pelas tags gravadas localmente: "any" (OU) ou "all" (E)
+    if tags:
+        statement = statement.where(tag_filter(tags, match_all=match_all))
+
+    terms = [term.lower() for term in (q or "").split()]
+    if not terms:
+        return await paginate(
+            db, statement, Page(sort="created_at", order="desc", limit=limit, cursor=cursor),
+            File.created_at, File.id, datetime
+        )
+
+    if db.get_bind().dialect.name == "postgresql":
+        text_match = _postgres_match(q.strip())
+    else:
+        text_match = _fallback_match(terms)
+
+    tag_name = func.lower(Tag.name)
+    # Cada ramo já filtra pelo usuário: o índice de busca só é percorrido nos arquivos dele
+    candidates = union(
+        select(File.id).join(Project).where(Project.user_id == user_id, text_match.file_condition),
+        select(File.id).join(Project).where(Project.user_id == user_id, text_match.project_condition),
+        select(file_tags.c.file_id)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .join(File, File.id == file_tags.c.file_id)
+        .join(Project, Project.id == File.project_id)
+        .where(Project.user_id == user_id, tag_name.in_(terms)),
+    )
+    tag_hits = (
+        select(func.count())
+        .select_from(file_tags)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .where(file_tags.c.file_id == File.id, tag_name.in_(terms))
+        .scalar_subquery()
+    )
+    rank = text_match.rank + TAG_WEIGHT * tag_hits
+
+    # A relevância não tem índice, então o cursor guarda a posição na lista
+    offset = decode_cursor(cursor, RELEVANCE_SORT, "desc", int)[0] if cursor else 0
+    files = (await db.execute(
+        statement.where(File.id.in_(candidates))
+        .order_by(rank.desc(), File.id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+    )).all()
+    if len(files) <= limit:
+        return files, None
+    return files[:limit], encode_cursor(RELEVANCE_SORT, "desc", offset + limit, 0)
@@ -0,0 +1,50 @@
+import importlib.util
+import logging
+from typing import Any, Optional
+
+import pydantic_core
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Caminho rápido das listagens: os dicionários montados a partir das linhas do
+# banco já têm o formato do response_model, então vão direto para JSON sem a
+# validação e o jsonable_encoder do FastAPI. O response_model continua no
+# decorator e a documentação OpenAPI não muda.
+
+if importlib.util.find_spec("orjson") is not None:
+    import orjson
+
+    def dumps(content: Any) -> bytes:
+        # Datetimes sem fuso saem como no FastAPI ("2024-05-01T12:30:15.123456")
+        return orjson.dumps(content)
+else:
+    # Encoder em Rust do pydantic-core (já instalado com o pydantic): mesmo formato
+    dumps = pydantic_core.to_json
+
+class JSONBytesResponse(Response):
+    """JSONResponse que aceita o corpo já serializado (ex.: vindo do cache)"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+def trusted_response(content: Any, response: Response, adapter: Optional[TypeAdapter] = None) -> JSONBytesResponse:
+    """Serializa ``content`` sem revalidar e leva os cabeçalhos definidos em ``response``.
+
+    Com ``RESPONSE_VALIDATION`` o conteúdo passa pelo ``TypeAdapter``
+    (pré-compilado no import da rota), útil em desenvolvimento e nos testes
+    para detectar divergências com o response_model.
+    """
+    if adapter is not None and settings.RESPONSE_VALIDATION:
+        body = adapter.dump_json(adapter.validate_python(content))
+    else:
+        body = dumps(content)
+    # Response() injetada pelo FastAPI: sem content-length e status None por padrão
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return JSONBytesResponse(body, status_code=response.status_code or 200, headers=headers)
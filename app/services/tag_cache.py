@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.services.cache import MISSING, LRUCache
+
+# Valor armazenado quando a busca de tags falhou (cache negativo)
+FAILED = None
+
+class TagCacheBackend(ABC):
+    """Armazenamento das tags em cache.
+
+    A interface é assíncrona para permitir backends compartilhados entre
+    processos (ex.: Redis) além do cache em memória.
+    """
+
+    @abstractmethod
+    async def get_many(self, file_ids: List[int]) -> Dict[int, Optional[List[str]]]:
+        """Retorna apenas os ids encontrados; ``None`` indica falha em cache"""
+
+    @abstractmethod
+    async def set_many(self, items: Dict[int, Optional[List[str]]], ttl: float) -> None:
+        """Armazena tags (ou ``None`` para falhas) com o TTL informado"""
+
+    @abstractmethod
+    async def delete_many(self, file_ids: List[int]) -> None:
+        """Remove entradas do cache"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+class MemoryTagCacheBackend(TagCacheBackend):
+    """Backend em memória do processo com LRU + TTL"""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self._cache = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    async def get_many(self, file_ids: List[int]) -> Dict[int, Optional[List[str]]]:
+        result = {}
+        for file_id in file_ids:
+            value = self._cache.get(file_id)
+            if value is not MISSING:
+                result[file_id] = value
+        return result
+
+    async def set_many(self, items: Dict[int, Optional[List[str]]], ttl: float) -> None:
+        for file_id, tags in items.items():
+            self._cache.set(file_id, tags, ttl=ttl)
+
+    async def delete_many(self, file_ids: List[int]) -> None:
+        for file_id in file_ids:
+            self._cache.delete(file_id)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        return {"entries": stats["entries"], "max_entries": stats["max_entries"], "evictions": stats["evictions"]}
+
+class TagCache:
+    """Cache de tags por ``secondary_file_id`` com cache negativo de falhas"""
+
+    def __init__(
+        self,
+        backend: Optional[TagCacheBackend],
+        ttl: float,
+        negative_ttl: float,
+    ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get_many(self, file_ids: Iterable[int]) -> Dict[int, Optional[List[str]]]:
+        """Busca tags em cache; falhas recentes voltam como ``None``"""
+        ids = list(file_ids)
+        if not self.enabled or not ids:
+            self.misses += len(ids)
+            return {}
+
+        found = await self.backend.get_many(ids)
+        for value in found.values():
+            if value is FAILED:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+        self.misses += len(ids) - len(found)
+        return found
+
+    async def set_many(self, items: Dict[int, List[str]]) -> None:
+        if self.enabled and items:
+            await self.backend.set_many(items, self.ttl)
+
+    async def set_failed(self, file_ids: Iterable[int]) -> None:
+        """Registra falhas para não repetir a chamada durante ``negative_ttl``"""
+        ids = list(file_ids)
+        if self.enabled and ids and self.negative_ttl > 0:
+            await self.backend.set_many(dict.fromkeys(ids, FAILED), self.negative_ttl)
+
+    async def invalidate(self, file_ids: Iterable[int]) -> None:
+        ids = [file_id for file_id in file_ids if file_id]
+        if self.enabled and ids:
+            await self.backend.delete_many(ids)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de acerto/falta do cache"""
+        lookups = self.hits + self.negative_hits + self.misses
+        stats = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+        if self.enabled:
+            stats.update(self.backend.stats())
+        return stats
+
+def create_tag_cache() -> TagCache:
+    """Cria o cache de tags conforme ``TAG_CACHE_BACKEND``"""
+    backend: Optional[TagCacheBackend] = None
+    if settings.TAG_CACHE_BACKEND == "memory":
+        backend = MemoryTagCacheBackend(
+            max_entries=settings.TAG_CACHE_MAX_ENTRIES,
+            ttl=settings.TAG_CACHE_TTL_SECONDS,
+        )
+    elif settings.TAG_CACHE_BACKEND != "none":
+        raise ValueError(f"TAG_CACHE_BACKEND inválido: {settings.TAG_CACHE_BACKEND}")
+
+    return TagCache(
+        backend,
+        ttl=settings.TAG_CACHE_TTL_SECONDS,
+        negative_ttl=settings.TAG_CACHE_NEGATIVE_TTL_SECONDS,
+    )
@@ -0,0 +1,83 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import selectinload
+
+from app.config import settings
+from app.database.db import File, open_session
+from app.services.api_secondary import secondary_api
+from app.services.tags import store_file_tags
+from app.services.workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+async def reconcile_tags(batch_size: Optional[int] = None) -> int:
+    """Sincroniza com a API secundária as tags locais pendentes ou antigas.
+
+    Processa arquivos nunca sincronizados e os sincronizados há mais de
+    ``TAG_RECONCILE_MAX_AGE_HOURS``. Cada tentativa fica registrada em
+    ``tags_sync_attempted_at`` e os arquivos tentados há menos tempo vão para
+    o fim da fila: falhas permanentes (arquivo removido da API secundária,
+    por exemplo) não travam os demais. Retorna quantos arquivos foram
+    atualizados.
+    """
+    batch_size = batch_size or settings.TAG_RECONCILE_BATCH_SIZE
+    now = datetime.utcnow()
+    stale_before = now - timedelta(hours=settings.TAG_RECONCILE_MAX_AGE_HOURS)
+
+    async with open_session() as db:
+        files = (await db.scalars(
+            select(File)
+            .where(
+                File.secondary_file_id.is_not(None),
+                or_(File.tags_synced_at.is_(None), File.tags_synced_at < stale_before),
+            )
+            .order_by(
+                File.tags_sync_attempted_at.is_not(None), File.tags_sync_attempted_at,
+                File.tags_synced_at.is_not(None), File.tags_synced_at, File.id
+            )
+            .limit(batch_size)
+            .options(selectinload(File.tags))
+        )).all()
+        if not files:
+            return 0
+
+        fetched = await secondary_api.fetch_tags([file.secondary_file_id for file in files])
+
+        def store(session) -> int:
+            updated = 0
+            for file in files:
+                file.tags_sync_attempted_at = now
+                tags = fetched.get(file.secondary_file_id)
+                if tags is None:
+                    continue
+                store_file_tags(session, file, tags)
+                updated += 1
+            return updated
+
+        updated = await db.run_sync(store)
+        await db.commit()
+
+    # Mantém o cache coerente com o que foi gravado
+    await secondary_api.tag_cache.set_many(
+        {file_id: tags for file_id, tags in fetched.items() if tags is not None}
+    )
+    return updated
+
+class TagReconciler(PeriodicWorker):
+    """Executa ``reconcile_tags`` periodicamente em segundo plano"""
+
+    error_message = "Erro na sincronização de tags"
+
+    def interval(self) -> float:
+        return settings.TAG_RECONCILE_INTERVAL_SECONDS
+
+    def batch_size(self) -> int:
+        return settings.TAG_RECONCILE_BATCH_SIZE
+
+    async def process(self) -> int:
+        return await reconcile_tags()
+
+tag_reconciler = TagReconciler()
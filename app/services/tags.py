@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.database.db import DBSession, File, Tag, file_tags
+
+def normalize_tags(names: Iterable[str]) -> List[str]:
+    """Remove espaços, vazios e repetições mantendo a ordem original"""
+    seen = set()
+    result = []
+    for name in names or []:
+        name = (name or "").strip()
+        if name and name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+def get_or_create_tags(db: Session, names: Iterable[str]) -> List[Tag]:
+    """Retorna as tags com os nomes informados, criando as que não existem"""
+    names = normalize_tags(names)
+    if not names:
+        return []
+
+    # INSERT ... ON CONFLICT DO NOTHING evita erro com uploads simultâneos da mesma tag
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        db.execute(
+            insert(Tag).values([{"name": name} for name in names]).on_conflict_do_nothing(index_elements=["name"])
+        )
+        return list(db.scalars(select(Tag).where(Tag.name.in_(names))))
+
+    existing = {tag.name: tag for tag in db.scalars(select(Tag).where(Tag.name.in_(names)))}
+    for name in names:
+        if name not in existing:
+            existing[name] = Tag(name=name)
+            db.add(existing[name])
+    return list(existing.values())
+
+def store_file_tags(db: Session, file: File, names: Iterable[str]) -> None:
+    """Substitui as tags locais do arquivo e marca a sincronização"""
+    file.tags = get_or_create_tags(db, names)
+    file.tags_synced_at = datetime.utcnow()
+
+def tag_filter(names: Iterable[str], match_all: bool = False):
+    """Condição sobre ``File.id`` para arquivos com as tags informadas.
+
+    Com ``match_all`` o arquivo precisa ter todas as tags (AND); caso contrário
+    basta uma delas (OR). A comparação ignora maiúsculas/minúsculas.
+    """
+    lowered = sorted({name.lower() for name in normalize_tags(names)})
+    tag_name = func.lower(Tag.name)
+    matching = (
+        select(file_tags.c.file_id)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .where(tag_name.in_(lowered))
+    )
+    if match_all:
+        matching = matching.group_by(file_tags.c.file_id).having(
+            func.count(distinct(tag_name)) == len(lowered)
+        )
+    return File.id.in_(matching)
+
+async def local_tag_names(db: DBSession, file_ids: Iterable[int]) -> Dict[int, List[str]]:
+    """Nomes das tags gravadas localmente por arquivo, em uma consulta só das duas colunas"""
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    rows = await db.execute(
+        select(file_tags.c.file_id, Tag.name)
+        .join(Tag, Tag.id == file_tags.c.tag_id)
+        .where(file_tags.c.file_id.in_(file_ids))
+        .order_by(Tag.name)
+    )
+    names: Dict[int, List[str]] = {}
+    for file_id, name in rows:
+        names.setdefault(file_id, []).append(name)
+    return names
@@ -0,0 +1,42 @@
+import io
+from typing import List, Sequence, Tuple
+
+# Executado nos processos do pool de derivados: só depende do Pillow, sem
+# importar configuração, banco ou a aplicação.
+
+MEDIA_TYPE = "image/jpeg"
+
+# (tipo, bytes, largura, altura)
+Rendered = Tuple[str, bytes, int, int]
+
+def render_derivatives(data: bytes, sizes: Sequence[Tuple[str, int]], quality: int) -> List[Rendered]:
+    """Gera um JPEG por ``(tipo, maior lado)`` a partir da imagem em ``data``.
+
+    Imagens menores que o tamanho pedido não são ampliadas. A orientação
+    EXIF é aplicada e a transparência vira fundo branco. Erros de leitura
+    (formato desconhecido, arquivo corrompido, imagem grande demais) são
+    propagados.
+    """
+    from PIL import Image, ImageOps
+
+    largest = max(size for _, size in sizes)
+    with Image.open(io.BytesIO(data)) as original:
+        # JPEG: decodifica já reduzido (DCT em 1/2, 1/4 ou 1/8), bem mais rápido
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+    results = []
+    # Do maior para o menor: cada redução parte da anterior
+    for kind, size in sorted(sizes, key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True, progressive=size > 512)
+        results.append((kind, out.getvalue(), image.width, image.height))
+    return results
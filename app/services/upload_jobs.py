@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.database.db import DBSession, File, Project, UploadJob, open_session
+from app.services.api_secondary import secondary_api
+from app.services.dedupe import copy_processed_data, dedupe_stats, find_duplicate
+from app.services.derivatives import derivative_worker
+from app.services.upload_stream import HashingReader
+from app.services.uploads import apply_secondary_response, discard_staged
+
+logger = logging.getLogger(__name__)
+
+class UploadJobQueue:
+    """Fila em processo dos uploads assíncronos, com a tabela ``upload_jobs`` como registro durável.
+
+    Os jobs são processados por ``UPLOAD_WORKERS`` tarefas em paralelo, com
+    novas tentativas e espera exponencial em caso de falha. Na inicialização
+    os jobs pendentes (ou interrompidos) do banco voltam para a fila.
+    """
+
+    def __init__(self) -> None:
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Um evento por requisição em long-poll, por arquivo
+        self._waiters: Dict[int, Set[asyncio.Event]] = {}
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(max(1, settings.UPLOAD_WORKERS))
+        ]
+        for job_id in await self._recover_jobs():
+            self.enqueue(job_id)
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, job_id: int) -> None:
+        """Coloca o job na fila; sem workers ativos ele fica no banco até o próximo start"""
+        if self._queue is not None and self._workers:
+            self._queue.put_nowait(job_id)
+
+    async def wait_for_file(self, file_id: int, timeout: float) -> None:
+        """Espera até ``timeout`` segundos por uma mudança no processamento do arquivo"""
+        event = asyncio.Event()
+        waiters = self._waiters.setdefault(file_id, set())
+        waiters.add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # O job pode estar em outro processo e nunca notificar este
+            waiters.discard(event)
+            if not waiters and self._waiters.get(file_id) is waiters:
+                del self._waiters[file_id]
+
+    def _notify(self, file_id: int) -> None:
+        for event in self._waiters.pop(file_id, ()):
+            event.set()
+
+    async def _recover_jobs(self) -> List[int]:
+        """Retoma jobs na fila e jobs "running" abandonados por um processo que caiu"""
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_JOB_STALE_SECONDS)
+        async with open_session() as db:
+            await db.execute(
+                update(UploadJob)
+                .where(UploadJob.status == "running", UploadJob.updated_at < stale_before)
+                .values(status="queued")
+            )
+            await db.commit()
+            return list(await db.scalars(
+                select(UploadJob.id).where(UploadJob.status == "queued").order_by(UploadJob.id)
+            ))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error(f"❌ Erro ao processar upload (job {job_id}): {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: int) -> None:
+        file_id = None
+        try:
+            async with open_session() as db:
+                file_id = await self._process_job(db, job_id)
+        finally:
+            if file_id is not None:
+                self._notify(file_id)
+
+    async def _process_job(self, db: DBSession, job_id: int) -> Optional[int]:
+        """Processa o job na sessão ``db``; retorna o id do arquivo, se o job foi reivindicado"""
+        # Reivindica o job; outro processo pode ter chegado antes
+        claimed = (await db.execute(
+            update(UploadJob)
+            .where(UploadJob.id == job_id, UploadJob.status == "queued")
+            .values(status="running", attempts=UploadJob.attempts + 1, updated_at=datetime.utcnow())
+        )).rowcount
+        await db.commit()
+        if not claimed:
+            return None
+
+        job = await db.get(UploadJob, job_id)
+        file = await db.get(File, job.file_id)
+        if file is None:
+            job.status = "failed"
+            job.last_error = "Arquivo removido antes do processamento"
+            await db.commit()
+            discard_staged(job.staging_path)
+            return job.file_id
+
+        # Outro upload com o mesmo conteúdo pode ter terminado enquanto este esperava
+        user_id = await db.scalar(select(Project.user_id).where(Project.id == file.project_id))
+        donor = await db.run_sync(find_duplicate, file.content_hash, user_id)
+        if donor:
+            await db.run_sync(lambda _: copy_processed_data(file, donor))
+            job.status = "done"
+            await db.commit()
+            discard_staged(job.staging_path)
+            dedupe_stats.record(file.size)
+            derivative_worker.wake()
+            return file.id
+
+        file.status = "processing"
+        await db.commit()
+
+        try:
+            with open(job.staging_path, "rb") as staged:
+                secondary_response = await secondary_api.upload_file(
+                    file_content=HashingReader(staged),
+                    filename=file.filename,
+                    file_type=file.file_type
+                )
+        except Exception as e:
+            await self._handle_failure(db, job, file, e)
+            return file.id
+
+        await db.run_sync(apply_secondary_response, file, secondary_response)
+        file.status = "ready"
+        job.status = "done"
+        job.last_error = None
+        await db.commit()
+        discard_staged(job.staging_path)
+        derivative_worker.wake()
+        logger.info(f"✅ Upload assíncrono concluído: arquivo {file.id}")
+        return file.id
+
+    async def _handle_failure(self, db: DBSession, job: UploadJob, file: File, error: Exception) -> None:
+        """Agenda nova tentativa ou marca o upload como falho"""
+        job.last_error = str(error) or error.__class__.__name__
+        if job.attempts < settings.UPLOAD_JOB_MAX_ATTEMPTS:
+            delay = settings.UPLOAD_JOB_RETRY_BACKOFF_SECONDS * (2 ** (job.attempts - 1))
+            logger.warning(f"⚠️ Falha no upload (job {job.id}, tentativa {job.attempts}), nova tentativa em {delay}s: {job.last_error}")
+            job.status = "queued"
+            file.status = "pending"
+            await db.commit()
+            asyncio.get_running_loop().call_later(delay, self.enqueue, job.id)
+            return
+
+        logger.error(f"❌ Upload falhou após {job.attempts} tentativas (job {job.id}): {job.last_error}")
+        job.status = "failed"
+        file.status = "failed"
+        await db.commit()
+        discard_staged(job.staging_path)
+
+upload_queue = UploadJobQueue()
@@ -0,0 +1,50 @@
+import hashlib
+import os
+from typing import BinaryIO, Optional
+
+class UploadTooLarge(Exception):
+    """O arquivo ultrapassou o tamanho máximo permitido"""
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__(f"Arquivo maior que o limite de {max_size} bytes")
+        self.max_size = max_size
+
+class HashingReader:
+    """Envolve um arquivo binário contando bytes e calculando o SHA-256 na leitura.
+
+    Permite enviar o ``UploadFile`` (já em arquivo temporário) para a API
+    secundária em pedaços, sem carregar o conteúdo inteiro em memória. Se
+    ``max_size`` for excedido a leitura é interrompida com ``UploadTooLarge``.
+    Voltar ao início do arquivo reinicia a contagem, já que o httpx relê o
+    arquivo ao repetir uma requisição.
+    """
+
+    def __init__(self, file: BinaryIO, max_size: Optional[int] = None) -> None:
+        self._file = file
+        self.max_size = max_size
+        self._reset()
+
+    def _reset(self) -> None:
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file.read(size)
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise UploadTooLarge(self.max_size)
+        self._hash.update(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self._file.seek(offset, whence)
+        if position == 0:
+            self._reset()
+        return position
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def hexdigest(self) -> str:
+        """SHA-256 do conteúdo lido até aqui"""
+        return self._hash.hexdigest()
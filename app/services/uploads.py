@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.db import File, file_tags
+from app.services.response_cache import bump_versions
+from app.services.tags import get_or_create_tags, normalize_tags, store_file_tags
+from app.services.upload_stream import HashingReader
+
+# Tamanho dos pedaços ao copiar uploads para a área de espera
+COPY_CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class StagedUpload:
+    """Upload copiado para a área de espera do processamento assíncrono"""
+    path: str
+    size: int
+    content_hash: str
+
+def stage_upload(file: BinaryIO, max_size: Optional[int] = None) -> StagedUpload:
+    """Copia o upload em pedaços para ``UPLOAD_STAGING_DIR`` calculando tamanho e hash.
+
+    Função bloqueante (E/S de disco): chame fora do event loop.
+    """
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=settings.UPLOAD_STAGING_DIR, prefix="upload-")
+    reader = HashingReader(file, max_size=max_size)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(reader, out, COPY_CHUNK_SIZE)
+    except BaseException:
+        discard_staged(path)
+        raise
+    return StagedUpload(path=path, size=reader.size, content_hash=reader.hexdigest())
+
+def discard_staged(path: Optional[str]) -> None:
+    """Remove o arquivo da área de espera, se ainda existir"""
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def apply_secondary_response(db: Session, file: File, secondary_response: dict) -> None:
+    """Grava no arquivo o caminho, o id e as tags devolvidos pela API secundária"""
+    file.file_path = secondary_response.get("file_path", "")
+    file.secondary_file_id = secondary_response.get("file_id")
+    if "tags" in secondary_response:
+        store_file_tags(db, file, secondary_response.get("tags") or [])
+
+def apply_secondary_responses(db: Session, items: List[Tuple[File, dict]]) -> None:
+    """Versão em lote de ``apply_secondary_response``: as tags de todos os arquivos num só INSERT"""
+    tags = {tag.name: tag for tag in get_or_create_tags(
+        db, [name for _, response in items for name in response.get("tags") or []]
+    )}
+    synced_at = datetime.utcnow()
+    for file, secondary_response in items:
+        file.file_path = secondary_response.get("file_path", "")
+        file.secondary_file_id = secondary_response.get("file_id")
+        if "tags" in secondary_response:
+            file.tags = [tags[name] for name in normalize_tags(secondary_response.get("tags") or [])]
+            file.tags_synced_at = synced_at
+
+def bulk_insert_files(db: Session, files: List[File]) -> None:
+    """Insere os arquivos num único INSERT com RETURNING e grava as tags de todos juntos.
+
+    Os objetos não entram na sessão: recebem apenas ``id`` e ``created_at``.
+    Como o INSERT não passa pelo flush do ORM, as versões dos projetos são
+    incrementadas aqui.
+    """
+    created_at = datetime.utcnow()
+    for file in files:
+        file.status = file.status or "ready"
+    rows = [
+        {
+            "filename": file.filename,
+            "file_path": file.file_path or "",
+            "file_type": file.file_type,
+            "size": file.size,
+            "project_id": file.project_id,
+            "secondary_file_id": file.secondary_file_id,
+            "content_hash": file.content_hash,
+            "status": file.status,
+            "tags_synced_at": file.tags_synced_at,
+            "created_at": created_at,
+        }
+        for file in files
+    ]
+    ids = db.scalars(insert(File).returning(File.id, sort_by_parameter_order=True), rows).all()
+
+    links = []
+    for file, file_id in zip(files, ids):
+        file.id = file_id
+        file.created_at = created_at
+        links.extend({"file_id": file_id, "tag_id": tag.id} for tag in file.tags)
+    if links:
+        db.execute(insert(file_tags), links)
+    bump_versions(db, project_ids=[file.project_id for file in files])
+
+# Colunas lidas pelas listagens: os campos de ``FileResponse`` e os que dizem
+# de onde vêm as tags. As consultas devolvem linhas (tuplas nomeadas), sem
+# montar entidades ``File`` no identity map; quem precisa do caminho no disco
+# acrescenta ``File.file_path``.
+FILE_ROW_COLUMNS = (
+    File.id, File.filename, File.file_type, File.size, File.project_id,
+    File.status, File.created_at, File.secondary_file_id, File.tags_synced_at,
+)
+
+def file_to_dict(file: File, tags: List[str]) -> dict:
+    """Representação de ``FileResponse`` de um arquivo (entidade ou linha de ``FILE_ROW_COLUMNS``)"""
+    return {
+        "id": file.id,
+        "filename": file.filename,
+        "file_type": file.file_type,
+        "size": file.size,
+        "project_id": file.project_id,
+        "tags": tags,
+        "status": file.status,
+        "created_at": file.created_at
+    }
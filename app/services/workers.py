@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Base dos workers periódicos (tags, exclusões na API secundária, miniaturas).
+#
+# Cada rodada chama ``process`` até ele devolver um lote incompleto, então
+# espera o intervalo ou um ``wake``. Intervalo e tamanho do lote são lidos
+# das configurações a cada uso.
+
+class PeriodicWorker(ABC):
+    """Executa ``process`` em segundo plano a cada ``interval()`` segundos e logo após ``wake``.
+
+    Subclasses implementam ``interval``, ``batch_size`` e ``process`` e
+    definem ``error_message`` para o log.
+    """
+
+    error_message = "Erro no worker periódico"
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @abstractmethod
+    def interval(self) -> float:
+        """Segundos entre as rodadas; ``<= 0`` desativa o worker"""
+
+    @abstractmethod
+    def batch_size(self) -> int:
+        """Tamanho do lote: com um lote completo a rodada continua"""
+
+    @abstractmethod
+    async def process(self) -> int:
+        """Processa um lote e retorna quantos itens foram tratados"""
+
+    def start(self) -> None:
+        if self.interval() <= 0 or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self) -> None:
+        """Processa sem esperar o próximo intervalo"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # Continua enquanto houver lotes completos pendentes
+                while await self.process() >= self.batch_size():
+                    pass
+            except Exception as e:
+                logger.error(f"❌ {self.error_message}: {str(e)}", exc_info=True)
@@ -0,0 +1,137 @@
+"""
+Teste de carga comparando DB_MODE=sync e DB_MODE=async
+
+Dispara requisições concorrentes contra a aplicação em processo (httpx +
+ASGITransport, sem rede) com a autenticação real por token, e mede vazão
+e latência de cada modo de acesso ao banco nas mesmas rotas.
+
+Rode com:
+    python -m benchmarks.bench_db_modes --requests 2000 --concurrency 50
+    python -m benchmarks.bench_db_modes --database-url postgresql://...
+
+Sem --database-url usa SQLite em arquivo temporário (requer o pacote
+"aiosqlite"); os números representativos são os do PostgreSQL.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.database import db as database
+from app.database.db import Base, ThreadedSession, create_async_db_engine
+from app.main import app
+from app.routes.auth import create_access_token
+from benchmarks.bench_project_counts import seed
+
+ENDPOINTS = ["/projects?limit=50", "/files?limit=50"]
+
+
+def session_dependency(mode, url):
+    """Dependência que substitui ``get_db`` com o modo pedido"""
+    if mode == "async":
+        engine = create_async_db_engine(url)
+        Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+        async def get_db():
+            async with Session() as db:
+                yield db
+
+        return get_db, engine.dispose
+
+    engine = create_engine(url, pool_pre_ping=True)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        db = ThreadedSession(Session())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    async def dispose():
+        engine.dispose()
+
+    return get_db, dispose
+
+
+async def run_load(token, total, concurrency):
+    """Executa ``total`` requisições com ``concurrency`` em paralelo; retorna latências em ms"""
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(ENDPOINTS[i % len(ENDPOINTS)])
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def worker():
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+async def measure(mode, url, token, total, concurrency):
+    get_db, dispose = session_dependency(mode, url)
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[database.get_read_db] = get_db
+    try:
+        # Aquecimento: abre as conexões do pool antes de medir
+        await run_load(token, concurrency, concurrency)
+        latencies, elapsed = await run_load(token, total, concurrency)
+    finally:
+        app.dependency_overrides.pop(database.get_db, None)
+        app.dependency_overrides.pop(database.get_read_db, None)
+        await dispose()
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--files-per-project", type=int, default=20)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    seed(engine, args.projects, args.files_per_project)
+    engine.dispose()
+    token = create_access_token(data={"sub": "bench@example.com"})
+
+    print(f"{'modo':>6} {'concorrência':>12} | {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'máx ms':>9}")
+    for concurrency in args.concurrency:
+        for mode in args.modes:
+            result = asyncio.run(measure(mode, url, token, args.requests, concurrency))
+            print(
+                f"{mode:>6} {concurrency:>12} | {result['rps']:>9.1f} {result['p50']:>9.1f} "
+                f"{result['p95']:>9.1f} {result['max']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark das consultas das listagens: entidades do ORM x projeção de colunas
+
+Para ``GET /files`` compara ``select(File)`` com ``selectinload(File.tags)``
+(identity map, controle de alterações e estado dos relacionamentos) com a
+projeção de ``FILE_ROW_COLUMNS`` e as tags em uma consulta de duas colunas;
+para ``GET /projects``, ``select(Project, contagem)`` com as colunas de
+``PROJECT_ROW_COLUMNS``. Mede tempo de CPU e pico de memória (tracemalloc)
+por 10 mil linhas, da consulta até os dicionários da resposta.
+
+Rode com:
+    python -m benchmarks.bench_list_rows --rows 10000 --repeat 5
+    python -m benchmarks.bench_list_rows --database-url postgresql://...
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from app.database.db import Base, User, Project, File, Tag, ThreadedSession, file_tags
+from app.routes.projects import _project_dict, _projects_with_file_count
+from app.services.tags import local_tag_names
+from app.services.uploads import FILE_ROW_COLUMNS, file_to_dict
+
+TAGS = ["praia", "casamento", "retrato", "família", "pôr do sol"]
+
+
+def seed(engine, rows):
+    """Um usuário com ``rows`` projetos e ``rows`` arquivos (tags sincronizadas)"""
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for table in (file_tags, File.__table__, Tag.__table__, Project.__table__, User.__table__):
+            conn.execute(delete(table))
+        user_id = conn.execute(
+            insert(User).values(name="Bench", email="bench@example.com", hashed_password="x", created_at=start)
+            .returning(User.id)
+        ).scalar_one()
+        project_ids = conn.execute(
+            insert(Project).returning(Project.id),
+            [
+                {"name": f"Projeto {i}", "client_name": "Cliente", "user_id": user_id, "created_at": start}
+                for i in range(rows)
+            ],
+        ).scalars().all()
+        tag_ids = conn.execute(insert(Tag).returning(Tag.id), [{"name": name} for name in TAGS]).scalars().all()
+        file_ids = conn.execute(
+            insert(File).returning(File.id),
+            [
+                {
+                    "filename": f"arquivo-{i}.png", "file_path": f"/dados/arquivo-{i}.png", "file_type": "image/png",
+                    "size": 1024 + i, "project_id": project_ids[i % len(project_ids)],
+                    "created_at": start + timedelta(seconds=i), "tags_synced_at": start,
+                }
+                for i in range(rows)
+            ],
+        ).scalars().all()
+        conn.execute(insert(file_tags), [
+            {"file_id": file_id, "tag_id": tag_ids[(i + k) % len(tag_ids)]}
+            for i, file_id in enumerate(file_ids) for k in range(i % 3)
+        ])
+    return user_id
+
+
+def files_entities(db, user_id):
+    files = db.scalars(
+        select(File).join(Project).where(Project.user_id == user_id).options(selectinload(File.tags))
+    ).all()
+    return [file_to_dict(file, [tag.name for tag in file.tags]) for file in files]
+
+
+def files_rows(db, user_id):
+    rows = db.execute(select(*FILE_ROW_COLUMNS).join(Project).where(Project.user_id == user_id)).all()
+    names = asyncio.run(local_tag_names(ThreadedSession(db), [row.id for row in rows]))
+    return [file_to_dict(row, names.get(row.id, [])) for row in rows]
+
+
+def projects_entities(db, user_id):
+    # Mesma consulta, mas com a entidade Project no lugar das colunas
+    statement = _projects_with_file_count(user_id)
+    rows = db.execute(statement.with_only_columns(Project, statement.selected_columns.file_count)).all()
+    return [_project_dict(project, file_count) for project, file_count in rows]
+
+
+def projects_rows(db, user_id):
+    return [_project_dict(row, row.file_count) for row in db.execute(_projects_with_file_count(user_id)).all()]
+
+
+def measure(Session, listing, user_id, repeat):
+    # Tempo e memória em passadas separadas: o tracemalloc deixa tudo mais lento
+    cpu, peaks = [], []
+    for _ in range(repeat):
+        db = Session()
+        start = time.process_time()
+        result = listing(db, user_id)
+        cpu.append(time.process_time() - start)
+        db.close()
+
+        db = Session()
+        tracemalloc.start()
+        listing(db, user_id)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        db.close()
+    return len(result), min(cpu) * 1000, min(peaks) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    Base.metadata.create_all(engine)
+    user_id = seed(engine, args.rows)
+    Session = sessionmaker(bind=engine)
+
+    print(f"{'listagem':>9} {'consulta':>10} | {'linhas':>7} {'ms CPU/10k':>11} {'MB pico/10k':>12}")
+    for name, entities, rows in (
+        ("arquivos", files_entities, files_rows),
+        ("projetos", projects_entities, projects_rows),
+    ):
+        for label, listing in (("entidades", entities), ("colunas", rows)):
+            count, cpu_ms, peak_mb = measure(Session, listing, user_id, args.repeat)
+            scale = 10000 / max(count, 1)
+            print(f"{name:>9} {label:>10} | {count:>7} {cpu_ms * scale:>11.1f} {peak_mb * scale:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
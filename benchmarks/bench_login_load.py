@@ -0,0 +1,125 @@
+"""
+Latência de /health e /projects durante uma rajada de logins
+
+Compara o bcrypt executado dentro do event loop (comportamento anterior)
+com o pool dedicado de ``app.services.passwords``. Enquanto
+``--login-concurrency`` clientes fazem login sem parar, outro cliente
+mede a latência de ``/health`` e ``/projects``.
+
+Rode com:
+    python -m benchmarks.bench_login_load --duration 10 --login-concurrency 20
+    python -m benchmarks.bench_login_load --database-url postgresql://... --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine, update
+
+from app.database import db as database
+from app.database.db import Base, User
+from app.main import app
+from app.routes import auth
+from app.routes.auth import create_access_token
+from app.services.passwords import PasswordHasher
+from benchmarks.bench_db_modes import session_dependency
+from benchmarks.bench_project_counts import seed
+
+PASSWORD = "senha-do-benchmark"
+
+
+class InlineHasher(PasswordHasher):
+    """bcrypt direto no event loop, como antes do pool"""
+
+    async def _run(self, fn, *args):
+        return fn(*args)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)] if values else float("nan")
+
+
+async def run(duration, login_concurrency, token):
+    transport = httpx.ASGITransport(app=app)
+    deadline = time.perf_counter() + duration
+    logins = {"ok": 0, "rejected": 0}
+    probes = {"/health": [], "/projects?limit=20": []}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login_loop():
+            while time.perf_counter() < deadline:
+                response = await client.post(
+                    "/auth/login", data={"username": "bench@example.com", "password": PASSWORD}
+                )
+                logins["ok" if response.status_code == 200 else "rejected"] += 1
+
+        async def probe_loop():
+            headers = {"Authorization": f"Bearer {token}"}
+            while time.perf_counter() < deadline:
+                for path, latencies in probes.items():
+                    start = time.perf_counter()
+                    (await client.get(path, headers=headers)).raise_for_status()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(probe_loop(), *(login_loop() for _ in range(login_concurrency)))
+    return logins, probes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--db-mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--login-concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=64)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    seed(engine, 20, 10)
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=args.rounds)
+    with engine.begin() as conn:
+        conn.execute(update(User).values(hashed_password=hasher.context.hash(PASSWORD)))
+    engine.dispose()
+    token = create_access_token(data={"sub": "bench@example.com"})
+
+    print(f"{'bcrypt':>7} | {'logins/s':>9} {'503':>6} | {'health p50':>10} {'p99':>8} | {'projects p50':>12} {'p99':>8}")
+    for label, hasher in [
+        ("inline", InlineHasher(workers=1, max_pending=args.max_pending, rounds=args.rounds)),
+        ("pool", PasswordHasher(workers=args.workers, max_pending=args.max_pending, rounds=args.rounds)),
+    ]:
+        get_db, dispose = session_dependency(args.db_mode, url)
+        app.dependency_overrides[database.get_db] = get_db
+        app.dependency_overrides[database.get_read_db] = get_db
+        auth.password_hasher = hasher
+
+        async def scenario():
+            try:
+                return await run(args.duration, args.login_concurrency, token)
+            finally:
+                await dispose()
+
+        try:
+            logins, probes = asyncio.run(scenario())
+        finally:
+            hasher.shutdown()
+            app.dependency_overrides.pop(database.get_db, None)
+            app.dependency_overrides.pop(database.get_read_db, None)
+        health, projects = probes.values()
+        print(
+            f"{label:>7} | {logins['ok'] / args.duration:>9.1f} {logins['rejected']:>6} | "
+            f"{percentile(health, 0.5):>10.1f} {percentile(health, 0.99):>8.1f} | "
+            f"{percentile(projects, 0.5):>12.1f} {percentile(projects, 0.99):>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
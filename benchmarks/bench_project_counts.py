@@ -0,0 +1,110 @@
+"""
+Benchmark da contagem de arquivos na listagem de projetos
+
+Compara o carregamento preguiçoso de ``project.files`` (uma consulta por
+projeto) com a contagem agregada usada em ``GET /projects``.
+
+Rode com:
+    python -m benchmarks.bench_project_counts --projects 10 100 1000 --files-per-project 1000
+    python -m benchmarks.bench_project_counts --database-url postgresql://...
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, delete, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database.db import Base, User, Project, File
+from app.routes.projects import _project_dict, _projects_with_file_count
+
+
+def naive_listing(db, user_id):
+    # Implementação anterior: len(project.files) carrega todas as linhas
+    projects = db.query(Project).filter(Project.user_id == user_id).all()
+    return [_project_dict(project, len(project.files)) for project in projects]
+
+
+def aggregated_listing(db, user_id):
+    rows = db.execute(_projects_with_file_count(user_id)).all()
+    return [_project_dict(row, row.file_count) for row in rows]
+
+
+def seed(engine, projects, files_per_project):
+    """Cria um usuário com ``projects`` projetos de ``files_per_project`` arquivos"""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(delete(File))
+        conn.execute(delete(Project))
+        conn.execute(delete(User))
+        user_id = conn.execute(
+            insert(User).values(name="Bench", email="bench@example.com", hashed_password="x", created_at=now)
+            .returning(User.id)
+        ).scalar_one()
+        project_ids = conn.execute(
+            insert(Project).returning(Project.id),
+            [
+                {"name": f"Projeto {i}", "client_name": "Cliente", "user_id": user_id, "created_at": now}
+                for i in range(projects)
+            ],
+        ).scalars().all()
+        batch = []
+        for i in range(projects * files_per_project):
+            batch.append({
+                "filename": f"arquivo-{i}.png", "file_path": "", "file_type": "image/png",
+                "size": 1024, "project_id": project_ids[i % projects], "created_at": now,
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(File), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(File), batch)
+    return user_id
+
+
+def measure(engine, listing, user_id, repeat):
+    Session = sessionmaker(bind=engine)
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        timings = []
+        for _ in range(repeat):
+            statements.clear()
+            db = Session()
+            start = time.perf_counter()
+            listing(db, user_id)
+            timings.append(time.perf_counter() - start)
+            db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return len(statements), min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--projects", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--files-per-project", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    print(f"{'projetos':>9} {'arquivos':>9} | {'consultas (N+1)':>15} {'ms':>9} | {'consultas (agregado)':>20} {'ms':>9}")
+    for projects in args.projects:
+        user_id = seed(engine, projects, args.files_per_project)
+        naive_queries, naive_ms = measure(engine, naive_listing, user_id, args.repeat)
+        agg_queries, agg_ms = measure(engine, aggregated_listing, user_id, args.repeat)
+        print(f"{projects:>9} {projects * args.files_per_project:>9} | {naive_queries:>15} {naive_ms:>9.1f} | {agg_queries:>20} {agg_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark da serialização das listagens
+
+Compara, por 10 mil linhas no formato de ``FileResponse`` e ``ProjectResponse``:
+
+- o caminho padrão do FastAPI (validação pelo response_model,
+  ``serialize_response`` e ``JSONResponse`` com ``json.dumps``);
+- o caminho rápido usado nas rotas (``serialization.dumps`` direto dos dicionários);
+- o modo ``RESPONSE_VALIDATION`` (``TypeAdapter.validate_python`` + ``dump_json``).
+
+Rode com:
+    python -m benchmarks.bench_serialization --rows 10000 --repeat 5
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from app.main import app
+from app.routes.files import FILE_LIST_ADAPTER
+from app.routes.projects import PROJECT_LIST_ADAPTER
+from app.services.serialization import dumps
+
+
+def file_rows(rows):
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": i, "filename": f"arquivo-{i}.png", "file_type": "image/png", "size": 1024 + i,
+            "project_id": i % 100, "tags": ["praia", "verão", "família"][: i % 4], "status": "ready",
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ]
+
+
+def project_rows(rows):
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": i, "name": f"Projeto {i}", "client_name": "Cliente", "description": None,
+            "user_id": 1, "created_at": start + timedelta(seconds=i), "file_count": i % 50,
+        }
+        for i in range(rows)
+    ]
+
+
+def response_field(path):
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+def fastapi_path(field):
+    def render(content):
+        serialized = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(serialized).body
+    return render
+
+
+def trusted_path(content):
+    return dumps(content)
+
+
+def validated_path(adapter):
+    def render(content):
+        return adapter.dump_json(adapter.validate_python(content))
+    return render
+
+
+def measure(render, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = render(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    scale = 10000 / args.rows
+    datasets = [
+        ("arquivos", file_rows(args.rows), response_field("/files"), FILE_LIST_ADAPTER),
+        ("projetos", project_rows(args.rows), response_field("/projects"), PROJECT_LIST_ADAPTER),
+    ]
+    print(f"{'listagem':>9} {'caminho':>22} | {'ms/10k linhas':>13} {'bytes':>10}")
+    for name, content, field, adapter in datasets:
+        for label, render in (
+            ("FastAPI (padrão)", fastapi_path(field)),
+            ("rápido (dumps)", trusted_path),
+            ("RESPONSE_VALIDATION", validated_path(adapter)),
+        ):
+            ms, size = measure(render, content, args.repeat)
+            print(f"{name:>9} {label:>22} | {ms * scale:>13.1f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
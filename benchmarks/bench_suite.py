@@ -0,0 +1,385 @@
+"""
+Suíte de carga reprodutível das rotas de autenticação, projetos e arquivos
+
+Popula o banco na escala pedida (usuários, projetos e arquivos, parte deles
+ainda sem tags sincronizadas), troca a API secundária por
+``benchmarks.fake_secondary`` com latência e taxa de erros configuráveis e
+dispara cada cenário em cada nível de concorrência contra a aplicação em
+processo (httpx + ASGITransport, sem rede).
+
+Para cada cenário/concorrência registra vazão, p50/p95/p99, erros e, pelo
+cabeçalho Server-Timing, a média de consultas SQL e de chamadas à API
+secundária por requisição. O resultado vai para um JSON com o commit
+atual; ``--compare`` compara com um JSON anterior.
+
+Rode com:
+    python -m benchmarks.bench_suite --users 10 --projects 100 --files 10000
+    python -m benchmarks.bench_suite --database-url postgresql://... --projects 10000 --files 1000000 --reuse-db
+    python -m benchmarks.bench_suite --compare benchmarks/results/abc1234.json --max-regression 0.15
+
+Sem --database-url usa SQLite em arquivo temporário (requer o pacote
+"aiosqlite" no modo async); os números representativos são os do PostgreSQL.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import create_engine, delete, func, insert, select
+
+from app.config import settings
+from app.database import db as database
+from app.database.db import Base, File, Project, SecondaryDeletion, Tag, UploadJob, User, file_tags
+from app.main import app
+from app.routes import auth
+from app.routes.auth import create_access_token
+from app.services.api_secondary import secondary_api
+from app.services.content_cache import content_cache
+from app.services.passwords import PasswordHasher
+from benchmarks.bench_db_modes import session_dependency
+from benchmarks.fake_secondary import TAGS, FakeSecondaryConfig, content_size, create_app
+
+PASSWORD = "senha-do-benchmark"
+BATCH_SIZE = 10000
+# Arquivos de cada projeto sorteados nos cenários de download (conjunto quente do cache em disco)
+HOT_FILES_PER_PROJECT = 4
+
+SERVER_TIMING = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) \w+")?')
+
+
+def seed(engine, users, projects, files, unsynced_fraction, password_hash, rng):
+    """Popula o banco do zero com ids explícitos (1..N) para os cenários sortearem.
+
+    O projeto ``p`` pertence ao usuário ``p % users``; os arquivos são
+    distribuídos entre os projetos. Uma fração ``unsynced_fraction`` fica sem
+    tags locais e consulta a API secundária na listagem.
+    """
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for table in (file_tags, UploadJob.__table__, SecondaryDeletion.__table__, File.__table__,
+                      Project.__table__, User.__table__, Tag.__table__):
+            conn.execute(delete(table))
+        conn.execute(insert(User), [
+            {"id": i + 1, "name": f"Bench {i}", "email": f"bench{i}@example.com",
+             "hashed_password": password_hash, "created_at": now}
+            for i in range(users)
+        ])
+        conn.execute(insert(Tag), [{"id": i + 1, "name": name} for i, name in enumerate(TAGS)])
+        for start in range(0, projects, BATCH_SIZE):
+            conn.execute(insert(Project), [
+                {"id": i + 1, "name": f"Projeto {i}", "client_name": "Cliente",
+                 "user_id": i % users + 1, "created_at": now}
+                for i in range(start, min(projects, start + BATCH_SIZE))
+            ])
+        for start in range(0, files, BATCH_SIZE):
+            rows, links = [], []
+            for i in range(start, min(files, start + BATCH_SIZE)):
+                synced = rng.random() >= unsynced_fraction
+                rows.append({
+                    "id": i + 1, "filename": f"arquivo-{i}.png", "file_path": "", "file_type": "image/png",
+                    "size": content_size(i + 1), "project_id": i % projects + 1,
+                    "secondary_file_id": i + 1, "created_at": now, "status": "ready",
+                    "tags_synced_at": now if synced else None,
+                })
+                if synced:
+                    links.extend(
+                        {"file_id": i + 1, "tag_id": tag_id}
+                        for tag_id in {i % len(TAGS) + 1, (i // len(TAGS)) % len(TAGS) + 1}
+                    )
+            conn.execute(insert(File), rows)
+            if links:
+                conn.execute(insert(file_tags), links)
+
+
+def already_seeded(engine, users, projects, files):
+    with engine.connect() as conn:
+        counts = (
+            conn.scalar(select(func.count()).select_from(User)),
+            conn.scalar(select(func.count()).select_from(Project)),
+            conn.scalar(select(func.count()).select_from(File)),
+        )
+    return counts == (users, projects, files)
+
+
+def scenarios(users, projects, files, upload_bytes):
+    """Cenários: nome -> função que sorteia (usuário, método, caminho, kwargs do httpx)"""
+    def own_project(rng, user):
+        # Projetos do usuário u: u+1, u+1+users, ...
+        owned = (projects - user - 1) // users + 1
+        return user + 1 + rng.randrange(owned) * users
+
+    def hot_file(rng, user):
+        # Arquivos do projeto p: p, p+projects, ...; os primeiros de cada projeto são os mais acessados
+        project = own_project(rng, user)
+        per_project = max(1, (files - project) // projects + 1)
+        return project + rng.randrange(min(per_project, HOT_FILES_PER_PROJECT)) * projects
+
+    def login(rng, user):
+        return "POST", "/auth/login", {"data": {"username": f"bench{user}@example.com", "password": PASSWORD}}
+
+    def upload(rng, user):
+        # Conteúdo aleatório: não cai na deduplicação
+        content = rng.randbytes(upload_bytes)
+        return "POST", "/files/upload", {
+            "data": {"project_id": str(own_project(rng, user))},
+            "files": {"file": ("bench.png", content, "image/png")},
+        }
+
+    return {
+        "auth_login": login,
+        "auth_me": lambda rng, user: ("GET", "/auth/me", {}),
+        "projects_list": lambda rng, user: ("GET", "/projects?limit=50", {}),
+        "project_detail": lambda rng, user: ("GET", f"/projects/{own_project(rng, user)}", {}),
+        "files_list": lambda rng, user: ("GET", "/files?limit=50", {}),
+        "files_by_project": lambda rng, user: ("GET", f"/files?limit=50&project_id={own_project(rng, user)}", {}),
+        "files_search": lambda rng, user: ("GET", f"/files/search?tags={rng.choice(TAGS)}&limit=50", {}),
+        "files_upload": upload,
+        "files_content": lambda rng, user: ("GET", f"/files/{hot_file(rng, user)}/content", {}),
+        "content_range": lambda rng, user: (
+            "GET", f"/files/{hot_file(rng, user)}/content", {"headers": {"Range": "bytes=0-16383"}}
+        ),
+    }
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, max(0, int(len(values) * fraction + 0.5) - 1))] if values else None
+
+
+def server_timing(header):
+    """``{"db": (ms, consultas), "secondary": (ms, chamadas), ...}`` do cabeçalho Server-Timing"""
+    return {
+        name: (float(duration), int(count) if count else None)
+        for name, duration, count in SERVER_TIMING.findall(header or "")
+    }
+
+
+async def run_load(client, build, tokens, total, concurrency, rng):
+    """Executa ``total`` requisições com ``concurrency`` em paralelo"""
+    samples = []
+    statuses = {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            user = rng.randrange(len(tokens))
+            method, path, kwargs = build(rng, user)
+            headers = {"Authorization": f"Bearer {tokens[user]}", **kwargs.pop("headers", {})}
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            samples.append((elapsed, server_timing(response.headers.get("server-timing"))))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, statuses, time.perf_counter() - started
+
+
+def summarize(samples, statuses, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+
+    def mean_of(name, index):
+        values = [timing[name][index] for _, timing in samples if name in timing and timing[name][index] is not None]
+        return round(statistics.fmean(values), 2) if values else None
+
+    return {
+        "requests": len(samples),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "db_queries_mean": mean_of("db", 1),
+        "db_ms_mean": mean_of("db", 0),
+        "secondary_calls_mean": mean_of("secondary", 1),
+        "secondary_ms_mean": mean_of("secondary", 0),
+    }
+
+
+async def run_suite(args, url, tokens):
+    fake = create_app(FakeSecondaryConfig(
+        latency_ms=args.secondary_latency_ms, jitter_ms=args.secondary_jitter_ms,
+        upload_latency_ms=args.secondary_upload_latency_ms, error_rate=args.secondary_error_rate, seed=args.seed,
+    ))
+    # O cliente compartilhado é recriado apontando para a API de mentira
+    await secondary_api.shutdown()
+    secondary_api._transport = httpx.ASGITransport(app=fake)
+    # Cache em disco do conteúdo vazio a cada execução
+    content_cache.directory = tempfile.mkdtemp(prefix="bench-content-")
+    content_cache.load()
+
+    get_db, dispose = session_dependency(args.db_mode, url)
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[database.get_read_db] = get_db
+    builders = scenarios(args.users, args.projects, args.files, args.upload_bytes)
+    rng = random.Random(args.seed)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            print(f"{'cenário':>17} {'conc':>5} | {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'erros':>6} | {'sql/req':>7} {'api2/req':>8}")
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    build = builders[name]
+                    # Aquecimento: pools, caches e planos de consulta
+                    await run_load(client, build, tokens, args.warmup or concurrency, concurrency, rng)
+                    result = {"scenario": name, "concurrency": concurrency,
+                              **summarize(*await run_load(client, build, tokens, args.requests, concurrency, rng))}
+                    results.append(result)
+                    print(
+                        f"{name:>17} {concurrency:>5} | {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+                        f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6} | "
+                        f"{_fmt(result['db_queries_mean']):>7} {_fmt(result['secondary_calls_mean']):>8}"
+                    )
+    finally:
+        app.dependency_overrides.pop(database.get_db, None)
+        app.dependency_overrides.pop(database.get_read_db, None)
+        await secondary_api.shutdown()
+        secondary_api._transport = None
+        await dispose()
+    return results, fake.state.stats
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def compare(baseline, results, max_regression):
+    """Compara vazão e p95 com um resultado anterior; retorna as regressões acima do limite"""
+    previous = {(item["scenario"], item["concurrency"]): item for item in baseline["results"]}
+    regressions = []
+    print(f"\nComparação com {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    print(f"{'cenário':>17} {'conc':>5} | {'req/s antes':>11} {'depois':>8} {'Δ':>7} | {'p95 antes':>9} {'depois':>8} {'Δ':>7}")
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        rps_change = result["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+        p95_change = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        regressed = rps_change < -max_regression or p95_change > max_regression
+        if regressed:
+            regressions.append(result)
+        print(
+            f"{result['scenario']:>17} {result['concurrency']:>5} | {before['rps']:>11.1f} {result['rps']:>8.1f} "
+            f"{rps_change:>+7.1%} | {before['p95_ms']:>9.1f} {result['p95_ms']:>8.1f} {p95_change:>+7.1%}"
+            f"{'  ⚠️ regressão' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    names = list(scenarios(1, 1, 1, 0))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--db-mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--unsynced-fraction", type=float, default=0.1,
+                        help="fração de arquivos sem tags locais (consultam a API secundária)")
+    parser.add_argument("--reuse-db", action="store_true", help="não popula de novo se as contagens já batem")
+    parser.add_argument("--scenarios", nargs="+", choices=names, default=names)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=500, help="requisições medidas por cenário e concorrência")
+    parser.add_argument("--warmup", type=int, default=0, help="requisições de aquecimento (padrão: a concorrência)")
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--bcrypt-rounds", type=int, default=settings.BCRYPT_ROUNDS)
+    parser.add_argument("--secondary-latency-ms", type=float, default=20.0)
+    parser.add_argument("--secondary-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--secondary-upload-latency-ms", type=float, default=100.0)
+    parser.add_argument("--secondary-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="mantém os logs da aplicação")
+    parser.add_argument("--output", help="arquivo JSON (padrão: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="com --compare, sai com código 1 se a vazão cair ou o p95 subir mais que isso")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # Os logs por requisição (e os erros injetados) pesam na medição
+        logging.disable(logging.CRITICAL)
+    # As médias de SQL e chamadas por requisição vêm do Server-Timing
+    settings.METRICS_SERVER_TIMING = True
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    hasher = PasswordHasher(workers=settings.PASSWORD_HASH_WORKERS, max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+                            rounds=args.bcrypt_rounds)
+    if not (args.reuse_db and already_seeded(engine, args.users, args.projects, args.files)):
+        started = time.perf_counter()
+        seed(engine, args.users, args.projects, args.files, args.unsynced_fraction,
+             hasher.context.hash(PASSWORD), random.Random(args.seed))
+        print(f"Banco populado em {time.perf_counter() - started:.1f}s: "
+              f"{args.users} usuários, {args.projects} projetos, {args.files} arquivos")
+    engine.dispose()
+    tokens = [create_access_token(data={"sub": f"bench{i}@example.com", "uid": i + 1}) for i in range(args.users)]
+
+    previous_hasher = auth.password_hasher
+    auth.password_hasher = hasher
+    try:
+        results, fake_stats = asyncio.run(run_suite(args, url, tokens))
+    finally:
+        auth.password_hasher = previous_hasher
+        hasher.shutdown()
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "db_mode": args.db_mode,
+            "scale": {"users": args.users, "projects": args.projects, "files": args.files,
+                      "unsynced_fraction": args.unsynced_fraction},
+            "secondary_api": {"latency_ms": args.secondary_latency_ms, "jitter_ms": args.secondary_jitter_ms,
+                              "upload_latency_ms": args.secondary_upload_latency_ms,
+                              "error_rate": args.secondary_error_rate,
+                              "requests": fake_stats.requests, "errors": fake_stats.errors},
+            "requests_per_run": args.requests,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"{commit or 'local'}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.max_regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
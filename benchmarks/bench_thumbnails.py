@@ -0,0 +1,101 @@
+"""
+Benchmark da geração de miniaturas
+
+Gera miniatura e prévia de ``--images`` fotos sintéticas e mede, ao mesmo
+tempo, o atraso do event loop (um timer de 10 ms) em dois modos:
+
+- no event loop: ``render_derivatives`` chamado direto, como seria dentro
+  da rota de upload;
+- no pool de processos usado pelo worker (``DERIVATIVE_WORKERS``).
+
+Requer o pacote ``Pillow``. Rode com:
+    python -m benchmarks.bench_thumbnails --images 40 --width 4000 --height 3000
+"""
+import argparse
+import asyncio
+import io
+import sys
+import time
+
+from app.config import settings
+from app.services.derivatives import PILLOW_AVAILABLE, derivative_sizes, renderer
+from app.services.thumbnails import render_derivatives
+
+TICK_SECONDS = 0.01
+
+
+def sample_images(count, width, height):
+    from PIL import Image
+
+    images = []
+    for i in range(count):
+        image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        image.putpixel((i, i), (255, 0, 0))
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=90)
+        images.append(out.getvalue())
+    return images
+
+
+async def lag_probe(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+async def inline(images):
+    for data in images:
+        render_derivatives(data, derivative_sizes(), settings.DERIVATIVE_JPEG_QUALITY)
+        # Cede o loop entre uploads, como requisições separadas
+        await asyncio.sleep(0)
+
+
+async def pooled(images):
+    # Um worker por vez, como process_pending_derivatives, mais o paralelismo do pool
+    semaphore = asyncio.Semaphore(renderer.workers)
+
+    async def one(data):
+        async with semaphore:
+            await renderer.render(data)
+
+    await asyncio.gather(*(one(data) for data in images))
+
+
+async def measure(mode, images):
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(lag_probe(stop, lags))
+    start = time.perf_counter()
+    await mode(images)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    return elapsed, (lags[-1] if lags else 0.0), p99
+
+
+async def run(args):
+    images = sample_images(args.images, args.width, args.height)
+    # Aquece o pool: o primeiro uso inicia os processos
+    await renderer.render(images[0])
+    print(f"{'modo':>14} | {'imagens/s':>9} {'atraso máx. (ms)':>16} {'atraso p99 (ms)':>15}")
+    for label, mode in (("event loop", inline), (f"pool ({renderer.workers})", pooled)):
+        elapsed, worst, p99 = await measure(mode, images)
+        print(f"{label:>14} | {len(images) / elapsed:>9.1f} {worst * 1000:>16.1f} {p99 * 1000:>15.1f}")
+    renderer.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+    if not PILLOW_AVAILABLE:
+        sys.exit("O benchmark requer o pacote 'Pillow' (pip install Pillow)")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
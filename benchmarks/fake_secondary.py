@@ -0,0 +1,124 @@
+"""
+API secundária de mentira para os benchmarks
+
+Implementa os endpoints usados por ``app.services.api_secondary`` com
+latência e taxa de erros configuráveis. Usada em processo pelos benchmarks
+(``httpx.ASGITransport``) ou como servidor separado:
+
+    python -m benchmarks.fake_secondary --port 8001 --latency-ms 20 --error-rate 0.01
+    SECONDARY_API_URL=http://localhost:8001 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Dict, List
+
+from fastapi import FastAPI, Request, Response
+
+TAGS = ["Dog", "Cat", "Beach", "Car", "Person", "Tree", "Food", "Sky", "Building", "Document"]
+
+
+def content_size(file_id: int) -> int:
+    """Tamanho do conteúdo devolvido para o arquivo (16 a 256 KB); o seed usa o mesmo valor"""
+    return 16 * 1024 + (file_id * 7919) % (240 * 1024)
+
+
+def content_for(file_id: int) -> bytes:
+    pattern = file_id.to_bytes(8, "big") * 512
+    size = content_size(file_id)
+    return (pattern * (size // len(pattern) + 1))[:size]
+
+
+@dataclass
+class FakeSecondaryConfig:
+    latency_ms: float = 20.0
+    jitter_ms: float = 10.0  # soma uma espera exponencial com essa média (cauda longa)
+    upload_latency_ms: float = 100.0
+    error_rate: float = 0.0  # fração de respostas 503
+    seed: int = 0
+
+
+@dataclass
+class FakeSecondaryStats:
+    requests: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+
+
+def create_app(config: FakeSecondaryConfig) -> FastAPI:
+    app = FastAPI(title="API secundária (benchmark)")
+    rng = random.Random(config.seed)
+    ids = count(1_000_000)
+    stats = FakeSecondaryStats()
+    app.state.stats = stats
+
+    def tags_for(file_id: int) -> List[str]:
+        # Determinístico por arquivo, como a API real devolveria
+        return [TAGS[file_id % len(TAGS)], TAGS[(file_id // len(TAGS)) % len(TAGS)]]
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        operation = f"{request.method} {request.scope['path']}"
+        key = "upload" if request.url.path == "/api/files/process" else request.method.lower()
+        stats.requests[key] = stats.requests.get(key, 0) + 1
+        base = config.upload_latency_ms if key == "upload" else config.latency_ms
+        jitter = rng.expovariate(1 / config.jitter_ms) if config.jitter_ms > 0 else 0.0
+        await asyncio.sleep((base + jitter) / 1000)
+        if rng.random() < config.error_rate:
+            stats.errors += 1
+            return Response(status_code=503, content=f"falha simulada: {operation}")
+        return await call_next(request)
+
+    @app.post("/api/files/process")
+    async def process(request: Request):
+        # Consome o corpo inteiro como a API real faria
+        await request.body()
+        file_id = next(ids)
+        return {"file_id": file_id, "tags": tags_for(file_id)}
+
+    @app.get("/api/files/{file_id}/tags")
+    async def file_tags(file_id: int):
+        return {"file_id": file_id, "tags": tags_for(file_id)}
+
+    @app.post("/api/files/tags/batch")
+    async def tags_batch(payload: dict):
+        return {"tags": {str(file_id): tags_for(file_id) for file_id in payload.get("file_ids", [])}}
+
+    @app.get("/api/files/{file_id}/content")
+    async def file_content(file_id: int):
+        # Sempre o corpo completo (sem Range), como a API real
+        return Response(content=content_for(file_id), media_type="application/octet-stream")
+
+    @app.delete("/api/files/{file_id}", status_code=204)
+    async def delete_file(file_id: int):
+        return Response(status_code=204)
+
+    @app.post("/api/files/delete/batch", status_code=204)
+    async def delete_batch(payload: dict):
+        return Response(status_code=204)
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--upload-latency-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeSecondaryConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        upload_latency_ms=args.upload_latency_ms, error_rate=args.error_rate,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
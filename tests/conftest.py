@@ -0,0 +1,77 @@
+"""
+Fixtures compartilhadas: banco SQLite em memória e sessões das rotas
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import db as database
+from app.database.db import Base, ThreadedSession
+from app.main import app
+
+
+@pytest.fixture
+def memory_engine():
+    """Cria bancos em memória com o esquema completo; descartados ao fim do teste"""
+    engines = []
+
+    def create():
+        # Uma única conexão, também usada pelo threadpool da ThreadedSession
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        engines.append(engine)
+        return engine
+
+    try:
+        yield create
+    finally:
+        for engine in engines:
+            engine.dispose()
+
+
+@pytest.fixture
+def db_engine(memory_engine):
+    return memory_engine()
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return sessionmaker(bind=db_engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def session_dependency():
+    """Cria dependências no formato de get_db com sessões de uma fábrica"""
+    def make(factory):
+        async def get_session():
+            # Como o SessionLocal da aplicação: sem autoflush
+            session = ThreadedSession(factory(autoflush=False))
+            try:
+                yield session
+            finally:
+                await session.close()
+        return get_session
+    return make
+
+
+@pytest.fixture
+def db_overrides(session_factory, session_dependency):
+    """get_db e get_read_db das rotas no banco de teste; o dicionário permite trocar uma delas"""
+    get_session = session_dependency(session_factory)
+    app.dependency_overrides[database.get_db] = get_session
+    app.dependency_overrides[database.get_read_db] = get_session
+    try:
+        yield app.dependency_overrides
+    finally:
+        app.dependency_overrides.pop(database.get_db, None)
+        app.dependency_overrides.pop(database.get_read_db, None)
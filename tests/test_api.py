@@ -18,15 +18,15 @@ class TestHealthEndpoints:
         """Testa endpoint de health check"""
         response = client.get("/health")
         assert response.status_code == 200
-        assert response.json() == {"status": "healthy"}
+        data = response.json()
+        assert data["status"] == "healthy"
+        assert data["secondary_api"]["circuit"]["state"] == "closed"
     
     def test_root_endpoint(self):
-        """Testa endpoint raiz"""
-        response = client.get("/")
-        assert response.status_code == 200
-        data = response.json()
-        assert "message" in data
-        assert data["status"] == "online"
+        """Testa que o endpoint raiz redireciona para a documentação"""
+        response = client.get("/", follow_redirects=False)
+        assert response.status_code == 307
+        assert response.headers["location"] == "/docs"
 
 
 class TestErrorHandling:
@@ -0,0 +1,143 @@
+"""
+Testes do serviço de integração com a API secundária
+Rode com: pytest -v
+"""
+import asyncio
+
+import httpx
+
+from app.services.api_secondary import SecondaryAPIService
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://secundaria/api/files/tags/batch")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("erro", request=request, response=response)
+
+
+class TestTagsForFiles:
+    """Testes da busca de tags de vários arquivos"""
+
+    def test_usa_lote_quando_suportado(self, monkeypatch):
+        """Busca todas as tags em uma única chamada em lote"""
+        service = SecondaryAPIService()
+        calls = []
+
+        async def bulk(file_ids):
+            calls.append(file_ids)
+            return {file_id: [f"tag-{file_id}"] for file_id in file_ids}
+
+        async def single(file_id):
+            raise AssertionError("não deveria buscar individualmente")
+
+        monkeypatch.setattr(service, "get_tags_bulk", bulk)
+        monkeypatch.setattr(service, "get_file_tags", single)
+
+        result = asyncio.run(service.get_tags_for_files([1, 2, 2, None, 3]))
+
+        assert calls == [[1, 2, 3]]
+        assert result == {1: ["tag-1"], 2: ["tag-2"], 3: ["tag-3"]}
+
+    def test_fallback_individual_sem_lote(self, monkeypatch):
+        """Sem endpoint em lote, busca por arquivo e lembra da ausência"""
+        service = SecondaryAPIService()
+        bulk_calls = []
+
+        async def bulk(file_ids):
+            bulk_calls.append(file_ids)
+            raise _status_error(404)
+
+        async def single(file_id):
+            if file_id == 2:
+                raise _status_error(500)
+            return {"tags": [f"tag-{file_id}"]}
+
+        monkeypatch.setattr(service, "get_tags_bulk", bulk)
+        monkeypatch.setattr(service, "get_file_tags", single)
+
+        result = asyncio.run(service.get_tags_for_files([1, 2]))
+        assert result == {1: ["tag-1"], 2: []}
+
+        asyncio.run(service.get_tags_for_files([3]))
+        assert len(bulk_calls) == 1
+
+
+class TestSharedClient:
+    """Testes do cliente HTTP compartilhado"""
+
+    def test_reutiliza_cliente_entre_chamadas(self):
+        """As chamadas usam o mesmo cliente até o shutdown"""
+        def handler(request):
+            return httpx.Response(200, json={"tags": [request.url.path]})
+
+        service = SecondaryAPIService(transport=httpx.MockTransport(handler))
+
+        async def run():
+            await service.startup()
+            client = service.client
+            first = await service.get_file_tags(1)
+            second = await service.get_file_tags(2)
+            assert service.client is client
+            assert service.pool_stats()["open"] is True
+            await service.shutdown()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first == {"tags": ["/api/files/1/tags"]}
+        assert second == {"tags": ["/api/files/2/tags"]}
+        assert service.pool_stats()["open"] is False
+
+
+class TestTagCache:
+    """Testes do cache de tags"""
+
+    def test_cache_evita_nova_chamada(self, monkeypatch):
+        """Tags e falhas ficam em cache até serem invalidadas"""
+        service = SecondaryAPIService()
+        calls = []
+
+        async def bulk(file_ids):
+            calls.append(list(file_ids))
+            return {file_id: ["tag"] for file_id in file_ids if file_id != 2}
+
+        async def single(file_id):
+            raise _status_error(503)
+
+        monkeypatch.setattr(service, "get_tags_bulk", bulk)
+        monkeypatch.setattr(service, "get_file_tags", single)
+
+        async def run():
+            first = await service.get_tags_for_files([1, 2])
+            second = await service.get_tags_for_files([1, 2])
+            await service.invalidate_tags([1])
+            third = await service.get_tags_for_files([1, 2])
+            return first, second, third
+
+        first, second, third = asyncio.run(run())
+
+        assert first == second == third == {1: ["tag"], 2: []}
+        assert calls == [[1, 2], [1]]
+        stats = service.cache_stats()
+        assert stats["hits"] == 1
+        assert stats["negative_hits"] == 2
+        assert stats["misses"] == 3
+
+
+class TestLRUCache:
+    """Testes do cache LRU com TTL"""
+
+    def test_expiracao_e_descarte(self):
+        """Descarta itens expirados e o menos usado ao exceder o limite"""
+        from app.services.cache import MISSING, LRUCache
+
+        now = [0.0]
+        cache = LRUCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)  # descarta "b", o menos usado
+
+        assert cache.get("b") is MISSING
+        now[0] = 11
+        assert cache.get("a") is MISSING
+        assert cache.stats()["evictions"] == 1
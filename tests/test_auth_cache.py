@@ -0,0 +1,54 @@
+"""
+Testes do cache de autenticação
+Rode com: pytest -v
+"""
+import time
+from datetime import datetime
+
+from app.services.auth_cache import AuthCache, Principal
+
+
+def _principal(user_id=1, email="ana@example.com"):
+    return Principal(id=user_id, email=email, name="Ana", created_at=datetime(2024, 1, 1))
+
+
+class TestAuthCache:
+    """Testes dos caches de token e de usuário"""
+
+    def test_token_nao_passa_da_expiracao(self):
+        """Token prestes a expirar fica em cache só até o exp"""
+        cache = AuthCache(max_entries=10, token_ttl=300, user_ttl=60)
+        cache.set_token("valido", {"sub": "ana@example.com", "exp": time.time() + 600})
+        cache.set_token("expirado", {"sub": "ana@example.com", "exp": time.time() - 1})
+
+        assert cache.get_token("valido")["sub"] == "ana@example.com"
+        assert cache.get_token("expirado") is None
+
+    def test_usuario_por_id_e_por_email(self):
+        """Tokens com uid usam o id; tokens antigos usam o email"""
+        cache = AuthCache(max_entries=10, token_ttl=300, user_ttl=60)
+        cache.set_user(_principal(), by_id=True)
+
+        assert cache.get_user(1, "ana@example.com") == _principal()
+        assert cache.get_user(None, "ana@example.com") is None
+
+        cache.set_user(_principal(), by_id=False)
+        assert cache.get_user(None, "ana@example.com") == _principal()
+
+    def test_invalidacao(self):
+        """Invalidar remove as entradas por id e pelos emails informados"""
+        cache = AuthCache(max_entries=10, token_ttl=300, user_ttl=60)
+        cache.set_user(_principal(), by_id=True)
+        cache.set_user(_principal(), by_id=False)
+
+        cache.invalidate_user(1, ["ana@example.com"])
+
+        assert cache.get_user(1, "ana@example.com") is None
+        assert cache.get_user(None, "ana@example.com") is None
+        assert cache.stats()["users"]["misses"] == 2
+
+    def test_ttl_zero_desativa_cache_de_usuario(self):
+        """Com AUTH_USER_CACHE_TTL_SECONDS=0 o usuário é sempre consultado"""
+        cache = AuthCache(max_entries=10, token_ttl=300, user_ttl=0)
+        cache.set_user(_principal(), by_id=True)
+        assert cache.get_user(1, "ana@example.com") is None
@@ -0,0 +1,108 @@
+"""
+Testes do upload em lote (SQLite em memória)
+Rode com: pytest -v
+"""
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database.db import User, Project, File, SecondaryDeletion, Tag
+from app.main import app
+from app.routes import files as files_route
+from app.routes.auth import create_access_token
+from app.services.auth_cache import auth_cache
+
+
+@pytest.fixture
+def project(session_factory):
+    db = session_factory()
+    project = Project(name="P", client_name="C", owner=User(name="Ana", email="ana@example.com", hashed_password="x"))
+    db.add(project)
+    db.commit()
+    db.close()
+    return project
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """Conteúdos enviados à API secundária; "falha" no conteúdo simula erro de conexão"""
+    sent = []
+
+    async def upload_file(file_content, filename, file_type):
+        data = file_content.read()
+        if b"falha" in data:
+            raise httpx.ConnectError("connection refused")
+        sent.append(data)
+        return {"file_id": 100 + len(sent), "file_path": f"/remoto/{filename}", "tags": ["Dog"]}
+
+    monkeypatch.setattr(files_route.secondary_api, "upload_file", upload_file)
+    return sent
+
+
+@pytest.fixture
+def client(db_overrides, project):
+    auth_cache.clear()
+    token = create_access_token(data={"sub": "ana@example.com", "uid": project.user_id})
+    try:
+        yield TestClient(app, headers={"Authorization": f"Bearer {token}"})
+    finally:
+        auth_cache.clear()
+
+
+def _batch(client, project, *items):
+    return client.post(
+        "/files/upload/batch", data={"project_id": project.id},
+        files=[("files", (name, content, "image/png")) for name, content in items]
+    )
+
+
+class TestBatchUpload:
+    """Testes de POST /files/upload/batch"""
+
+    def test_sucessos_e_falhas_no_mesmo_lote(self, client, session_factory, project, uploads, monkeypatch):
+        """Falhas saem por item, na posição do arquivo, sem impedir os demais"""
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE_BYTES", 10)
+
+        response = _batch(client, project, ("a.png", b"aaa"), ("b.png", b"falha"), ("c.png", b"x" * 11))
+
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["created"], body["failed"]) == (1, 2)
+        ok, unreachable, too_large = body["results"]
+        assert (ok["status"], ok["status_code"], ok["file"]["tags"]) == ("created", 201, ["Dog"])
+        assert unreachable == {
+            "filename": "b.png", "status": "failed", "status_code": 502,
+            "file": None, "error": "Não foi possível conectar com a API secundária",
+        }
+        assert (too_large["status"], too_large["status_code"]) == ("failed", 413)
+        assert session_factory().scalars(select(File.filename)).all() == ["a.png"]
+
+    def test_conteudo_repetido_no_lote_e_enviado_uma_vez(self, client, session_factory, project, uploads):
+        """Arquivos iguais no mesmo lote compartilham um único envio"""
+        response = _batch(client, project, ("a.png", b"igual"), ("b.png", b"igual"), ("c.png", b"outro"))
+
+        assert response.json()["created"] == 3
+        assert sorted(uploads) == [b"igual", b"outro"]
+        rows = session_factory().execute(select(File.filename, File.secondary_file_id).order_by(File.filename)).all()
+        assert rows[0].secondary_file_id == rows[1].secondary_file_id != rows[2].secondary_file_id
+
+    def test_falha_na_gravacao_desfaz_o_lote(self, client, session_factory, project, uploads, monkeypatch):
+        """Erro no INSERT: nada fica no banco e os envios concluídos vão para o outbox de exclusão"""
+        def broken_insert(db, files):
+            raise RuntimeError("disco cheio")
+
+        monkeypatch.setattr(files_route, "bulk_insert_files", broken_insert)
+
+        response = _batch(client, project, ("a.png", b"aaa"), ("b.png", b"bbb"))
+
+        body = response.json()
+        assert (body["created"], body["failed"]) == (0, 2)
+        assert {(item["status_code"], item["error"]) for item in body["results"]} == {
+            (500, "Erro ao salvar arquivo: disco cheio")
+        }
+        db = session_factory()
+        assert db.scalar(select(func.count(File.id))) == 0
+        assert db.scalar(select(func.count(Tag.id))) == 0
+        assert db.scalars(select(SecondaryDeletion.secondary_file_id).order_by(SecondaryDeletion.secondary_file_id)).all() == [101, 102]
@@ -0,0 +1,84 @@
+"""
+Testes da deduplicação de uploads por hash de conteúdo (SQLite em memória)
+Rode com: pytest -v
+"""
+import hashlib
+import io
+
+import pytest
+
+from app.config import settings
+from app.database.db import User, Project, File
+from app.services.dedupe import copy_processed_data, find_duplicate, hash_stream
+from app.services.tags import store_file_tags
+
+
+def _project(db, email):
+    user = User(name=email, email=email, hashed_password="x")
+    project = Project(name="P", client_name="C", owner=user)
+    db.add(project)
+    db.flush()
+    return project
+
+
+def _processed_file(db, project, content_hash):
+    file = File(
+        filename="a.png", file_path="/remoto/a.png", file_type="image/png", size=4,
+        project=project, content_hash=content_hash, secondary_file_id=7
+    )
+    db.add(file)
+    store_file_tags(db, file, ["Dog"])
+    db.flush()
+    return file
+
+
+class TestDedupe:
+    """Testes de busca e reaproveitamento de uploads repetidos"""
+
+    def test_hash_stream_volta_ao_inicio(self):
+        """Calcula tamanho e SHA-256 e deixa o arquivo pronto para nova leitura"""
+        stream = io.BytesIO(b"conteudo")
+        size, digest = hash_stream(stream)
+        assert size == 8
+        assert digest == hashlib.sha256(b"conteudo").hexdigest()
+        assert stream.read() == b"conteudo"
+
+    def test_escopo_por_usuario(self, db, monkeypatch):
+        """No escopo "user" só reaproveita arquivos do mesmo usuário"""
+        monkeypatch.setattr(settings, "DEDUPE_SCOPE", "user")
+        owner = _project(db, "ana@example.com")
+        other = _project(db, "bia@example.com")
+        donor = _processed_file(db, owner, "abc")
+
+        assert find_duplicate(db, "abc", owner.user_id).id == donor.id
+        assert find_duplicate(db, "abc", other.user_id) is None
+
+        monkeypatch.setattr(settings, "DEDUPE_SCOPE", "global")
+        assert find_duplicate(db, "abc", other.user_id).id == donor.id
+
+        monkeypatch.setattr(settings, "DEDUPE_SCOPE", "off")
+        assert find_duplicate(db, "abc", owner.user_id) is None
+
+    def test_ignora_arquivos_nao_processados(self, db, monkeypatch):
+        """Arquivos ainda pendentes não servem de origem"""
+        monkeypatch.setattr(settings, "DEDUPE_SCOPE", "user")
+        project = _project(db, "ana@example.com")
+        donor = _processed_file(db, project, "abc")
+        donor.status = "pending"
+        db.flush()
+
+        assert find_duplicate(db, "abc", project.user_id) is None
+
+    def test_copia_resultado_do_processamento(self, db):
+        """O novo arquivo herda caminho, id remoto e tags do original"""
+        project = _project(db, "ana@example.com")
+        donor = _processed_file(db, project, "abc")
+        file = File(filename="b.png", file_type="image/png", size=4, project=project, status="pending")
+        copy_processed_data(file, donor)
+        db.add(file)
+        db.flush()
+
+        assert file.status == "ready"
+        assert file.secondary_file_id == 7
+        assert file.file_path == "/remoto/a.png"
+        assert [tag.name for tag in file.tags] == ["Dog"]
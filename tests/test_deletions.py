@@ -0,0 +1,160 @@
+"""
+Testes das exclusões em conjunto e do outbox de remoção na API secundária (SQLite em memória)
+Rode com: pytest -v
+"""
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database import db as database
+from app.database.db import User, Project, File, SecondaryDeletion, ThreadedSession, file_tags
+from app.services import deletions
+from app.services.api_secondary import SecondaryAPIService
+from app.services.tags import store_file_tags
+
+
+def _file(db, project, secondary_file_id):
+    file = File(
+        filename=f"{secondary_file_id}.png", file_path="", file_type="image/png", size=1,
+        project=project, secondary_file_id=secondary_file_id
+    )
+    db.add(file)
+    store_file_tags(db, file, ["Dog"])
+    db.flush()
+    return file
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestDeleteFiles:
+    """Testes da exclusão de arquivos e projetos"""
+
+    def test_remove_tags_e_enfileira_arquivos_sem_referencia(self, db):
+        """Apaga arquivos e associações e só enfileira arquivos da API secundária órfãos"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        project = Project(name="P", client_name="C", owner=user)
+        first = _file(db, project, 7)
+        second = _file(db, project, 8)
+        # Cópia deduplicada: compartilha o arquivo 7 da API secundária
+        kept = _file(db, project, 7)
+
+        result = run(deletions.delete_files(
+            ThreadedSession(db), select(File.id).where(File.id.in_([first.id, second.id]))
+        ))
+
+        assert result.files_deleted == 2
+        assert result.secondary_file_ids == [8]
+        assert db.scalars(select(File.id)).all() == [kept.id]
+        assert db.scalar(select(func.count()).select_from(file_tags)) == 1
+        assert db.scalars(select(SecondaryDeletion.secondary_file_id)).all() == [8]
+
+    def test_projeto_sai_com_os_arquivos(self, db):
+        """Excluir o projeto remove seus arquivos sem tocar nos de outros projetos"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        removed = Project(name="P", client_name="C", owner=user)
+        other = Project(name="Q", client_name="C", owner=user)
+        _file(db, removed, 1)
+        _file(db, removed, 2)
+        _file(db, other, 3)
+
+        result = run(deletions.delete_projects(
+            ThreadedSession(db), select(Project.id).where(Project.id == removed.id)
+        ))
+
+        assert (result.projects_deleted, result.files_deleted) == (1, 2)
+        assert sorted(result.secondary_file_ids) == [1, 2]
+        assert db.scalars(select(Project.name)).all() == ["Q"]
+        assert db.scalars(select(File.secondary_file_id)).all() == [3]
+
+    def test_selecao_vazia(self, db):
+        """Nada selecionado não gera exclusões nem itens no outbox"""
+        result = run(deletions.delete_files(ThreadedSession(db), select(File.id)))
+        assert result.summary() == {"projects_deleted": 0, "files_deleted": 0, "secondary_deletions": 0}
+
+
+class TestSecondaryDeletions:
+    """Testes do processamento do outbox"""
+
+    @pytest.fixture(autouse=True)
+    def outbox_session(self, session_factory, monkeypatch):
+        monkeypatch.setattr(settings, "DB_MODE", "sync")
+        monkeypatch.setattr(database, "SessionLocal", session_factory)
+
+    def _enqueue(self, db, *secondary_file_ids):
+        db.add_all(SecondaryDeletion(secondary_file_id=file_id) for file_id in secondary_file_ids)
+        db.commit()
+
+    def test_remove_itens_concluidos_e_reagenda_falhas(self, db, monkeypatch):
+        """Sucessos saem da tabela; falhas voltam com espera até o limite de tentativas"""
+        monkeypatch.setattr(settings, "SECONDARY_DELETE_MAX_ATTEMPTS", 2)
+        self._enqueue(db, 1, 2)
+        calls = []
+
+        async def delete_files(file_ids):
+            calls.append(file_ids)
+            return {file_id: ("erro" if file_id == 2 else None) for file_id in file_ids}
+
+        monkeypatch.setattr(deletions.secondary_api, "delete_files", delete_files)
+
+        assert run(deletions.process_secondary_deletions()) == 2
+        item = db.scalars(select(SecondaryDeletion)).one()
+        assert (item.secondary_file_id, item.status, item.attempts) == (2, "pending", 1)
+        # Ainda em espera: não é reenviado antes do horário
+        assert run(deletions.process_secondary_deletions()) == 0
+
+        db.expire_all()
+        item.next_attempt_at = item.created_at
+        db.commit()
+        assert run(deletions.process_secondary_deletions()) == 1
+        db.expire_all()
+        assert (item.status, item.attempts, item.last_error) == ("failed", 2, "erro")
+        assert calls == [[1, 2], [2]]
+
+    def test_nao_remove_arquivo_reutilizado(self, db, monkeypatch):
+        """Um upload deduplicado após a exclusão impede a remoção"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        _file(db, Project(name="P", client_name="C", owner=user), 5)
+        self._enqueue(db, 5)
+        calls = []
+
+        async def delete_files(file_ids):
+            calls.append(file_ids)
+            return dict.fromkeys(file_ids)
+
+        monkeypatch.setattr(deletions.secondary_api, "delete_files", delete_files)
+
+        assert run(deletions.process_secondary_deletions()) == 1
+        assert calls == []
+        assert db.scalar(select(func.count(SecondaryDeletion.id))) == 0
+
+
+class TestSecondaryDeleteAPI:
+    """Testes da remoção de arquivos na API secundária"""
+
+    def test_fallback_individual_sem_lote(self):
+        """Sem endpoint em lote, remove arquivo a arquivo; 404 conta como removido"""
+        requests = []
+
+        def handler(request):
+            requests.append((request.method, request.url.path))
+            if request.url.path == "/api/files/delete/batch":
+                return httpx.Response(404)
+            if request.url.path == "/api/files/3":
+                return httpx.Response(500)
+            return httpx.Response(404 if request.url.path == "/api/files/2" else 204)
+
+        service = SecondaryAPIService(transport=httpx.MockTransport(handler))
+
+        errors = run(service.delete_files([1, 2, 3]))
+
+        assert errors[1] is None and errors[2] is None and errors[3]
+        assert ("POST", "/api/files/delete/batch") in requests
+        # A ausência do lote fica registrada
+        requests.clear()
+        run(service.delete_files([4]))
+        assert requests == [("DELETE", "/api/files/4")]
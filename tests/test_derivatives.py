@@ -0,0 +1,314 @@
+"""
+Testes das miniaturas e prévias das imagens (SQLite em arquivo, com DB_MODE=sync e DB_MODE=async no worker)
+Rode com: pytest -v
+"""
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+import io
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+from app.database import db as database
+from app.database.db import Base, User, Project, File, FileDerivative, ThreadedSession
+from app.main import app
+from app.routes.auth import create_access_token
+from app.services import deletions, derivatives
+from app.services.auth_cache import auth_cache
+from app.services.derivatives import DerivativeStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # Em arquivo: o worker também o abre pelo aiosqlite no DB_MODE=async
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    try:
+        yield sessionmaker(bind=engine, expire_on_commit=False)
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def worker_session(session_factory, monkeypatch):
+    """open_session no banco de teste; DB_MODE=sync (ThreadedSession)"""
+    monkeypatch.setattr(settings, "DB_MODE", "sync")
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    return "sync"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = DerivativeStore(str(tmp_path))
+    monkeypatch.setattr(derivatives, "derivative_store", store)
+    monkeypatch.setattr(deletions, "derivative_store", store)
+    return store
+
+
+@pytest.fixture
+def owner(session_factory):
+    db = session_factory()
+    owner = User(name="Ana", email="ana@example.com", hashed_password="x")
+    project = Project(name="P", client_name="C", owner=owner)
+    db.add_all([
+        File(id=1, filename="a.png", file_path="", file_type="image/png", size=10, project=project, secondary_file_id=71),
+        File(id=2, filename="b.png", file_path="", file_type="image/png", size=10, project=project, secondary_file_id=71),
+        File(id=3, filename="c.jpg", file_path="", file_type="image/jpeg", size=10, project=project, secondary_file_id=72),
+        File(id=4, filename="d.pdf", file_path="", file_type="application/pdf", size=10, project=project, secondary_file_id=73),
+    ])
+    db.commit()
+    db.close()
+    return owner
+
+
+def _derivative(db, store, file_id, kind, data):
+    db.add(FileDerivative(
+        file_id=file_id, kind=kind, content_hash=store.put(data), media_type="image/jpeg", size=len(data)
+    ))
+    db.commit()
+
+
+class TestDerivativeStore:
+    """Testes do armazenamento endereçado pelo conteúdo"""
+
+    def test_conteudo_igual_grava_uma_vez(self, store, tmp_path):
+        """O mesmo conteúdo gera o mesmo hash e um único arquivo"""
+        first = store.put(b"jpeg")
+        second = store.put(b"jpeg")
+
+        assert first == second
+        assert store.open(first).read() == b"jpeg"
+        assert [path.name for path in (tmp_path / first[:2]).iterdir()] == [first]
+
+        store.discard(first)
+        assert store.open(first) is None
+
+
+class TestProcessPending:
+    """Testes do worker que gera os derivados"""
+
+    @pytest.fixture(autouse=True, params=["sync", "async"])
+    def worker_session(self, request, session_factory, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, "DB_MODE", request.param)
+        monkeypatch.setattr(database, "SessionLocal", session_factory)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}", poolclass=NullPool)
+        monkeypatch.setitem(
+            database.async_sessionmakers, "primary",
+            async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        )
+        return request.param
+
+    @pytest.fixture
+    def reads(self, monkeypatch):
+        reads = []
+
+        async def read_content(secondary_file_id):
+            reads.append(secondary_file_id)
+            return b"original"
+
+        async def render(data):
+            if data != b"original":
+                raise ValueError("imagem ilegível")
+            return [("thumbnail", b"thumb", 4, 3), ("preview", b"preview", 8, 6)]
+
+        monkeypatch.setattr(derivatives.downloads, "read_content", read_content)
+        monkeypatch.setattr(derivatives.renderer, "render", render)
+        return reads
+
+    def test_gera_e_reaproveita_o_conteudo_compartilhado(self, session_factory, store, owner, reads):
+        """Só imagens recebem derivados; cópias deduplicadas não baixam de novo"""
+        assert run(derivatives.process_pending_derivatives()) == 3
+
+        db = session_factory()
+        rows = db.execute(
+            select(FileDerivative.file_id, FileDerivative.kind, FileDerivative.content_hash, FileDerivative.width)
+            .order_by(FileDerivative.file_id, FileDerivative.kind)
+        ).all()
+        assert [(file_id, kind, width) for file_id, kind, _, width in rows] == [
+            (1, "preview", 8), (1, "thumbnail", 4), (2, "preview", 8), (2, "thumbnail", 4),
+            (3, "preview", 8), (3, "thumbnail", 4),
+        ]
+        assert reads == [71, 72]
+        assert store.open(rows[1].content_hash).read() == b"thumb"
+        # Nada mais pendente
+        assert run(derivatives.process_pending_derivatives()) == 0
+
+    def test_geracao_sem_sessao_aberta(self, session_factory, store, owner, reads, monkeypatch):
+        """Download e geração acontecem sem transação aberta no banco"""
+        open_sessions = []
+        during_render = []
+        original_open_session, original_render = derivatives.open_session, derivatives.renderer.render
+
+        @asynccontextmanager
+        async def open_session():
+            open_sessions.append(True)
+            try:
+                async with original_open_session() as db:
+                    yield db
+            finally:
+                open_sessions.pop()
+
+        async def render(data):
+            during_render.append(len(open_sessions))
+            return await original_render(data)
+
+        monkeypatch.setattr(derivatives, "open_session", open_session)
+        monkeypatch.setattr(derivatives.renderer, "render", render)
+
+        assert run(derivatives.process_pending_derivatives()) == 3
+        assert during_render == [0, 0]
+
+    def test_imagem_ilegivel_nao_e_tentada_de_novo(self, session_factory, store, owner, reads, monkeypatch):
+        """Falha na leitura da imagem marca os derivados como "failed\""""
+        async def read_content(secondary_file_id):
+            return b"corrompido"
+
+        monkeypatch.setattr(derivatives.downloads, "read_content", read_content)
+
+        run(derivatives.process_pending_derivatives())
+
+        db = session_factory()
+        assert set(db.scalars(select(FileDerivative.status))) == {"failed"}
+        assert run(derivatives.process_pending_derivatives()) == 0
+
+    def test_api_indisponivel_fica_para_depois(self, session_factory, store, owner, monkeypatch):
+        """Sem o conteúdo, o arquivo continua pendente"""
+        async def read_content(secondary_file_id):
+            raise httpx.ConnectError("fora do ar")
+
+        monkeypatch.setattr(derivatives.downloads, "read_content", read_content)
+
+        assert run(derivatives.process_pending_derivatives()) == 0
+        db = session_factory()
+        assert db.scalar(select(FileDerivative.id)) is None
+        assert None not in db.scalars(select(File.derivatives_attempted_at).where(File.id.in_([1, 2, 3]))).all()
+
+    def test_falhas_vao_para_o_fim_da_fila(self, session_factory, store, owner, reads, monkeypatch):
+        """Arquivos cujo conteúdo falhou não impedem os seguintes de receber derivados"""
+        async def read_content(secondary_file_id):
+            if secondary_file_id == 71:
+                raise httpx.ConnectError("fora do ar")
+            reads.append(secondary_file_id)
+            return b"original"
+
+        monkeypatch.setattr(derivatives.downloads, "read_content", read_content)
+
+        # Um arquivo por rodada: 1 e 2 falham, a terceira chega ao 3
+        assert [run(derivatives.process_pending_derivatives(batch_size=1)) for _ in range(3)] == [0, 0, 1]
+        assert reads == [72]
+        db = session_factory()
+        assert db.scalars(select(FileDerivative.file_id).distinct()).all() == [3]
+        attempted = dict(db.execute(select(File.id, File.derivatives_attempted_at)).all())
+        assert attempted[1] <= attempted[2] and attempted[3] is None
+
+    def test_arquivo_ausente_na_api_nao_e_tentado_de_novo(self, session_factory, store, owner, monkeypatch):
+        """404 da API secundária marca os derivados como "failed\""""
+        async def read_content(secondary_file_id):
+            request = httpx.Request("GET", f"http://secundaria/files/{secondary_file_id}/content")
+            raise httpx.HTTPStatusError("404", request=request, response=httpx.Response(404, request=request))
+
+        monkeypatch.setattr(derivatives.downloads, "read_content", read_content)
+
+        run(derivatives.process_pending_derivatives())
+
+        db = session_factory()
+        assert set(db.execute(select(FileDerivative.file_id, FileDerivative.status)).all()) == {
+            (1, "failed"), (2, "failed"), (3, "failed")
+        }
+
+
+class TestDeleteDerivatives:
+    """Testes da limpeza dos derivados na exclusão"""
+
+    def test_remove_so_o_que_ficou_sem_referencia(self, session_factory, store, owner):
+        """Conteúdo usado por outro arquivo continua no disco"""
+        db = session_factory()
+        _derivative(db, store, 1, "thumbnail", b"shared")
+        _derivative(db, store, 2, "thumbnail", b"shared")
+        _derivative(db, store, 3, "thumbnail", b"own")
+
+        result = run(deletions.delete_files(ThreadedSession(db), select(File.id).where(File.id.in_([1, 3]))))
+        db.commit()
+        run(deletions.complete_deletion(result))
+
+        assert db.scalars(select(FileDerivative.file_id)).all() == [2]
+        assert store.open(hashlib.sha256(b"shared").hexdigest()) is not None
+        assert result.derivative_hashes == [hashlib.sha256(b"own").hexdigest()]
+        assert store.open(result.derivative_hashes[0]) is None
+
+
+class TestThumbnailEndpoint:
+    """Testes de GET /files/{id}/thumbnail"""
+
+    @pytest.fixture
+    def client(self, session_factory, db_overrides, store, owner, worker_session):
+        db = session_factory()
+        stranger = User(name="Bia", email="bia@example.com", hashed_password="x")
+        db.add(File(id=5, filename="e.png", file_path="", file_type="image/png", size=1,
+                    project=Project(name="Q", client_name="C", owner=stranger), secondary_file_id=74))
+        db.commit()
+        _derivative(db, store, 1, "thumbnail", b"thumb")
+        _derivative(db, store, 5, "thumbnail", b"alheia")
+        db.close()
+
+        auth_cache.clear()
+        token = create_access_token(data={"sub": owner.email, "uid": owner.id})
+        try:
+            yield TestClient(app, headers={"Authorization": f"Bearer {token}"})
+        finally:
+            auth_cache.clear()
+
+    def test_serve_com_cache_permanente(self, client):
+        """A miniatura sai do armazenamento com ETag do conteúdo e 304 na revalidação"""
+        response = client.get("/files/1/thumbnail")
+
+        assert response.status_code == 200
+        assert response.content == b"thumb"
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["cache-control"] == "private, max-age=31536000, immutable"
+        etag = response.headers["etag"]
+        assert client.get("/files/1/thumbnail", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_indisponivel(self, client):
+        """Sem derivado, de outro usuário ou tipo inválido"""
+        assert client.get("/files/1/thumbnail", params={"kind": "preview"}).status_code == 404
+        assert client.get("/files/5/thumbnail").status_code == 404
+        assert client.get("/files/1/thumbnail", params={"kind": "original"}).status_code == 422
+
+    def test_arquivo_sumido_volta_para_a_fila(self, client, session_factory, store):
+        """Se o arquivo gerado sumiu do disco, a linha é apagada para o worker gerar de novo"""
+        content_hash = session_factory().scalar(select(FileDerivative.content_hash).where(FileDerivative.file_id == 1))
+        store.discard(content_hash)
+
+        assert client.get("/files/1/thumbnail").status_code == 404
+        assert session_factory().scalar(select(FileDerivative.id).where(FileDerivative.file_id == 1)) is None
+
+
+class TestRender:
+    """Testes da geração com o Pillow"""
+
+    def test_reduz_mantendo_a_proporcao(self):
+        """Gera JPEGs no tamanho pedido sem ampliar imagens pequenas"""
+        from PIL import Image
+        from app.services.thumbnails import render_derivatives
+
+        source = io.BytesIO()
+        Image.new("RGBA", (800, 400), (255, 0, 0, 128)).save(source, "PNG")
+
+        rendered = render_derivatives(source.getvalue(), [("thumbnail", 100), ("preview", 1024)], 80)
+
+        assert [(kind, width, height) for kind, _, width, height in rendered] == [
+            ("preview", 800, 400), ("thumbnail", 100, 50)
+        ]
+        assert Image.open(io.BytesIO(rendered[1][1])).format == "JPEG"
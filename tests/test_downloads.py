@@ -0,0 +1,179 @@
+"""
+Testes do download do conteúdo com Range, ETag e cache em disco (SQLite em memória)
+Rode com: pytest -v
+"""
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database.db import User, Project, File
+from app.main import app
+from app.routes.auth import create_access_token
+from app.services import downloads
+from app.services.api_secondary import SecondaryAPIService
+from app.services.auth_cache import auth_cache
+from app.services.content_cache import ContentCache
+from app.services.downloads import RangeNotSatisfiable, parse_range
+
+CONTENT = bytes(range(256)) * 40
+
+
+class TestParseRange:
+    """Testes da leitura do cabeçalho Range"""
+
+    @pytest.mark.parametrize("header, expected", [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-10", (990, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+        ("bytes=abc", None),
+    ])
+    def test_intervalos(self, header, expected):
+        """Intervalo único é aceito; vários ou malformados viram resposta completa"""
+        assert parse_range(header, 1000) == expected
+
+    def test_fora_do_arquivo(self):
+        """Início além do tamanho não pode ser atendido"""
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+
+    @pytest.mark.parametrize("header", ["bytes=0-", "bytes=0-0", "bytes=-1", "bytes=-500"])
+    def test_arquivo_vazio(self, header):
+        """Em arquivo de 0 bytes qualquer intervalo é 416, inclusive sufixos"""
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, 0)
+
+
+class TestContentCache:
+    """Testes do cache em disco"""
+
+    def test_descarta_o_menos_usado(self, tmp_path):
+        """Acima do limite sai a entrada acessada há mais tempo"""
+        cache = ContentCache(str(tmp_path), max_bytes=10, max_file_bytes=10)
+        for key in ("a", "b"):
+            entry = cache.start(key, 4)
+            entry.write(b"1234")
+            entry.commit()
+        cache.open("a").close()
+
+        entry = cache.start("c", 4)
+        entry.write(b"1234")
+        entry.commit()
+
+        assert cache.open("b") is None
+        assert cache.open("a") is not None
+        assert cache.total_bytes == 8
+
+    def test_tamanho_divergente_nao_entra(self, tmp_path):
+        """Download incompleto não fica no cache"""
+        cache = ContentCache(str(tmp_path), max_bytes=100, max_file_bytes=100)
+        entry = cache.start("a", 10)
+        entry.write(b"123")
+        entry.commit()
+
+        assert cache.open("a") is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_reconstroi_o_indice(self, tmp_path):
+        """Arquivos gravados sobrevivem ao reinício; sobras parciais são apagadas"""
+        cache = ContentCache(str(tmp_path), max_bytes=100, max_file_bytes=100)
+        entry = cache.start("a", 3)
+        entry.write(b"abc")
+        entry.commit()
+        cache.start("b", 3)
+
+        restarted = ContentCache(str(tmp_path), max_bytes=100, max_file_bytes=100)
+        restarted.load()
+
+        assert restarted.open("a").read() == b"abc"
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["a"]
+
+
+class TestContentEndpoint:
+    """Testes de GET /files/{id}/content"""
+
+    @pytest.fixture
+    def calls(self):
+        return []
+
+    @pytest.fixture
+    def client(self, db, db_overrides, tmp_path, monkeypatch, calls):
+        owner = User(name="Ana", email="ana@example.com", hashed_password="x")
+        stranger = User(name="Bia", email="bia@example.com", hashed_password="x")
+        project = Project(name="P", client_name="C", owner=owner)
+        db.add_all([
+            File(id=1, filename="foto da praia.png", file_path="", file_type="image/png", size=len(CONTENT),
+                 project=project, secondary_file_id=77, content_hash="abc123"),
+            File(id=2, filename="b.png", file_path="", file_type="image/png", size=1,
+                 project=project, status="pending"),
+            File(id=3, filename="c.png", file_path="", file_type="image/png", size=1,
+                 project=Project(name="Q", client_name="C", owner=stranger), secondary_file_id=78),
+            File(id=4, filename="pagina.html", file_path="", file_type="text/html", size=len(CONTENT),
+                 project=project, secondary_file_id=79, content_hash="def456"),
+        ])
+        db.commit()
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, content=CONTENT)
+
+        monkeypatch.setattr(downloads, "secondary_api", SecondaryAPIService(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(downloads, "content_cache", ContentCache(str(tmp_path), 10 * len(CONTENT), len(CONTENT)))
+        auth_cache.clear()
+        token = create_access_token(data={"sub": owner.email, "uid": owner.id})
+        try:
+            yield TestClient(app, headers={"Authorization": f"Bearer {token}"})
+        finally:
+            auth_cache.clear()
+
+    def test_segundo_download_vem_do_cache(self, client, calls):
+        """Só o primeiro download chama a API secundária"""
+        first = client.get("/files/1/content")
+        second = client.get("/files/1/content")
+
+        assert first.status_code == second.status_code == 200
+        assert first.content == second.content == CONTENT
+        assert len(calls) == 1
+        assert second.headers["etag"] == '"abc123"'
+        assert second.headers["content-type"] == "image/png"
+        assert second.headers["content-disposition"] == "inline; filename*=utf-8''foto%20da%20praia.png"
+        assert second.headers["x-content-type-options"] == "nosniff"
+
+    def test_tipo_ativo_vira_download(self, client, calls):
+        """Tipo informado no upload fora da lista segura não é exibido no navegador"""
+        response = client.get("/files/4/content")
+
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == "attachment; filename*=utf-8''pagina.html"
+        assert response.headers["x-content-type-options"] == "nosniff"
+
+    @pytest.mark.parametrize("cached", [False, True])
+    def test_range(self, client, calls, cached):
+        """Range devolve 206 com o trecho, com ou sem o arquivo em cache"""
+        if cached:
+            client.get("/files/1/content")
+
+        response = client.get("/files/1/content", headers={"Range": "bytes=10-19"})
+
+        assert response.status_code == 206
+        assert response.content == CONTENT[10:20]
+        assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+        assert len(calls) == 1
+
+    def test_condicionais(self, client, calls):
+        """If-None-Match igual responde 304 sem baixar; If-Range diferente ignora o Range"""
+        etag = client.get("/files/1/content").headers["etag"]
+
+        assert client.get("/files/1/content", headers={"If-None-Match": etag}).status_code == 304
+        stale = client.get("/files/1/content", headers={"Range": "bytes=0-9", "If-Range": '"outro"'})
+        assert stale.status_code == 200 and stale.content == CONTENT
+        assert client.get("/files/1/content", headers={"Range": "bytes=999999-"}).status_code == 416
+
+    def test_dono_e_status(self, client, calls):
+        """Arquivo de outro usuário é 404; ainda em processamento é 409"""
+        assert client.get("/files/3/content").status_code == 404
+        assert client.get("/files/2/content").status_code == 409
+        assert calls == []
@@ -0,0 +1,92 @@
+"""
+Testes das métricas: formato do Prometheus, hooks do SQLAlchemy e middleware
+Rode com: pytest -v
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.services import metrics
+from app.services.metrics import MetricsMiddleware, MetricsRegistry, RequestStats, current_request, flatten_stats
+
+
+class TestRegistry:
+    """Testes da exposição no formato de texto"""
+
+    def test_contador_e_histograma(self):
+        """Contadores ganham o sufixo _total e histogramas têm buckets acumulados"""
+        registry = MetricsRegistry()
+        counter = registry.counter("uploads", "Uploads", ("destination",))
+        histogram = registry.histogram("latency_seconds", "Latência", buckets=(0.1, 1.0))
+        counter.inc(3, destination="secondary")
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        lines = registry.render().splitlines()
+
+        assert "# TYPE uploads counter" in lines
+        assert 'uploads_total{destination="secondary"} 3' in lines
+        assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{le="1"} 2' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+        assert "latency_seconds_sum 5.55" in lines
+        assert "latency_seconds_count 3" in lines
+
+    def test_gauge_com_falha_nao_derruba_a_coleta(self):
+        """Uma fonte que falha é omitida e as demais continuam"""
+        registry = MetricsRegistry()
+        registry.gauge("broken", "Quebrada", lambda: 1 / 0)
+        registry.gauge("ok", "Ok", lambda: {(): 2})
+
+        output = registry.render()
+
+        assert "broken" not in output
+        assert "ok 2" in output
+
+    def test_flatten_stats(self):
+        """Dicionários aninhados viram nomes com ponto; textos viram nome=valor"""
+        assert flatten_stats({"circuit": {"state": "open", "failures": 2}, "enabled": True}) == {
+            "circuit.state=open": 1.0,
+            "circuit.failures": 2.0,
+            "enabled": 1.0,
+        }
+
+
+class TestInstrumentation:
+    """Testes da coleta por requisição"""
+
+    def test_consultas_contam_na_requisicao_corrente(self):
+        """Os hooks do SQLAlchemy somam consultas e tempo na requisição corrente"""
+        metrics.install_sqlalchemy_hooks()
+        engine = create_engine("sqlite://")
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+        finally:
+            current_request.reset(token)
+            engine.dispose()
+
+        assert stats.db_queries == 2
+        assert stats.db_seconds > 0
+
+    def test_middleware_agrupa_por_rota(self, monkeypatch):
+        """A latência é registrada pelo caminho da rota, com o Server-Timing na resposta"""
+        monkeypatch.setattr(metrics.settings, "METRICS_SERVER_TIMING", True)
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/itens/{item_id}")
+        async def item(item_id: int):
+            return {"id": item_id}
+
+        client = TestClient(app)
+        before = metrics.http_request_duration.count(method="GET", route="/itens/{item_id}", status=200)
+        response = client.get("/itens/1")
+        client.get("/itens/2")
+
+        assert response.headers["server-timing"].startswith("app;dur=")
+        assert metrics.http_request_duration.count(method="GET", route="/itens/{item_id}", status=200) == before + 2
@@ -0,0 +1,28 @@
+"""
+Testes dos cursores de paginação
+Rode com: pytest -v
+"""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.database.pagination import decode_cursor, encode_cursor
+
+
+class TestCursor:
+    """Testes de codificação do cursor opaco"""
+
+    def test_ida_e_volta(self):
+        """O cursor preserva valor e id da última linha"""
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+        cursor = encode_cursor("created_at", "desc", created_at, 42)
+
+        assert decode_cursor(cursor, "created_at", "desc", datetime) == (created_at, 42)
+
+    @pytest.mark.parametrize("cursor", ["invalido", encode_cursor("name", "asc", "a", 1)])
+    def test_cursor_invalido(self, cursor):
+        """Cursor corrompido ou de outra ordenação retorna 400"""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor(cursor, "created_at", "desc", datetime)
+        assert exc.value.status_code == 400
@@ -0,0 +1,44 @@
+"""
+Testes do pool de hash de senhas
+Rode com: pytest -v
+"""
+import asyncio
+
+import pytest
+
+from app.services.passwords import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.fixture
+def hasher():
+    # Custo mínimo do bcrypt para o teste ser rápido
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=4)
+    yield hasher
+    hasher.shutdown()
+
+
+class TestPasswordHasher:
+    """Testes de hash, verificação e limite de fila"""
+
+    def test_hash_e_verificacao(self, hasher):
+        """O hash gerado no pool valida a senha correta e usa o custo configurado"""
+        async def scenario():
+            hashed = await hasher.hash("segredo")
+            return hashed, await hasher.verify("segredo", hashed), await hasher.verify("outra", hashed)
+
+        hashed, ok, wrong = asyncio.run(scenario())
+        assert hashed.startswith("$2b$04$")
+        assert ok is True
+        assert wrong is False
+
+    def test_recusa_quando_a_fila_esta_cheia(self, hasher):
+        """Com a fila cheia a operação excedente falha sem esperar"""
+        async def scenario():
+            return await asyncio.gather(
+                hasher.hash("a"), hasher.hash("b"), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert isinstance(results[1], PasswordHasherBusy)
+        assert hasher.stats()["rejected"] == 1
+        assert hasher.stats()["pending"] == 0
@@ -0,0 +1,103 @@
+"""
+Testes do profiling por amostragem das requisições lentas
+Rode com: pytest -v
+"""
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.routes import admin
+from app.services import metrics, profiling
+from app.services.metrics import MetricsMiddleware
+from app.services.profiling import ProfileStore, ProfilingMiddleware
+
+TOKEN = "segredo"
+
+
+@pytest.fixture(autouse=True)
+def profiling_settings(monkeypatch):
+    monkeypatch.setattr(profiling.settings, "PROFILING_ENABLED", False)
+    monkeypatch.setattr(profiling.settings, "PROFILING_ADMIN_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling.settings, "PROFILING_SLOW_REQUEST_MS", 50.0)
+    monkeypatch.setattr(profiling.settings, "PROFILING_SAMPLE_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(profiling, "profile_store", ProfileStore(maxlen=2))
+    monkeypatch.setattr(admin, "profile_store", profiling.profile_store)
+
+
+def blocking_work(seconds: float) -> None:
+    # Espera ocupada: segura o event loop como um hash ou I/O síncrono faria
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.fixture
+def client():
+    metrics.install_sqlalchemy_hooks()
+    engine = create_engine("sqlite://")
+    app = FastAPI()
+    app.include_router(admin.router)
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/lenta/{item_id}")
+    async def slow(item_id: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        blocking_work(0.2)
+        return {"id": item_id}
+
+    @app.get("/rapida")
+    async def fast():
+        return {}
+
+    try:
+        yield TestClient(app)
+    finally:
+        engine.dispose()
+
+
+class TestProfiling:
+    """Testes da captura e do acesso aos perfis"""
+
+    def test_captura_codigo_bloqueante_e_sql(self, client, monkeypatch):
+        """Requisição lenta guarda a pilha do trecho bloqueante e o SQL executado"""
+        monkeypatch.setattr(profiling.settings, "PROFILING_ENABLED", True)
+
+        client.get("/lenta/1")
+        client.get("/rapida")
+
+        summaries = client.get("/admin/profiles", headers={"X-Admin-Token": TOKEN}).json()
+        assert [summary["route"] for summary in summaries] == ["/lenta/{item_id}"]
+
+        profile = client.get(f"/admin/profiles/{summaries[0]['id']}", headers={"X-Admin-Token": TOKEN}).json()
+        assert profile["sql"][0]["statement"] == "SELECT 1"
+        assert profile["db_queries"] == 1
+        assert profile["samples"] > 0
+        assert profile["top_functions"][0]["function"].startswith("blocking_work")
+        assert "slow;blocking_work" in profile["flamegraph"]
+
+    def test_cabecalho_exige_token(self, client):
+        """X-Profile só ativa o profiling com token válido e guarda mesmo requisições rápidas"""
+        client.get("/rapida", headers={"X-Profile": "1", "X-Admin-Token": "errado"})
+        assert profiling.profile_store.list() == []
+
+        client.get("/rapida", headers={"X-Profile": "1", "X-Admin-Token": TOKEN})
+        assert [summary["forced"] for summary in profiling.profile_store.list()] == [True]
+
+    def test_endpoints_protegidos(self, client, monkeypatch):
+        """Token errado recebe 403; sem token configurado os endpoints não existem"""
+        assert client.get("/admin/profiles", headers={"X-Admin-Token": "errado"}).status_code == 403
+        monkeypatch.setattr(profiling.settings, "PROFILING_ADMIN_TOKEN", None)
+        assert client.get("/admin/profiles", headers={"X-Admin-Token": TOKEN}).status_code == 404
+
+    def test_buffer_circular(self):
+        """Só os perfis mais recentes ficam guardados"""
+        store = ProfileStore(maxlen=2)
+        for _ in range(3):
+            store.add({"duration_ms": 1})
+        assert [profile["id"] for profile in store._profiles] == [2, 3]
+        assert store.get(1) is None
@@ -0,0 +1,50 @@
+"""
+Testes da contagem de arquivos dos projetos (SQLite em memória)
+Rode com: pytest -v
+"""
+import pytest
+from sqlalchemy import inspect, text
+
+from app.database import db as database
+from app.database.db import User, Project, File
+from app.routes.projects import _projects_with_file_count
+
+
+def _files(project, count):
+    return [
+        File(filename=f"{i}.png", file_path="", file_type="image/png", size=1, project=project)
+        for i in range(count)
+    ]
+
+
+class TestProjectFileCount:
+    """Testes da contagem agregada de arquivos"""
+
+    def test_conta_so_os_arquivos_do_projeto(self, db):
+        """Projetos vazios contam zero e arquivos de outros usuários não entram"""
+        ana = User(name="Ana", email="ana@example.com", hashed_password="x")
+        bia = User(name="Bia", email="bia@example.com", hashed_password="x")
+        full = Project(name="Cheio", client_name="C", owner=ana)
+        empty = Project(name="Vazio", client_name="C", owner=ana)
+        other = Project(name="Outro", client_name="C", owner=bia)
+        db.add_all([*_files(full, 2), empty, *_files(other, 3)])
+        db.commit()
+
+        counts = {row.name: row.file_count for row in db.execute(_projects_with_file_count(ana.id))}
+        single = db.execute(_projects_with_file_count(ana.id, empty.id)).one()
+
+        assert counts == {"Cheio": 2, "Vazio": 0}
+        assert single.file_count == 0
+        assert db.execute(_projects_with_file_count(ana.id, other.id)).first() is None
+
+    def test_remove_indice_substituido(self, db_engine, monkeypatch):
+        """O índice simples de files.project_id sai de bancos antigos"""
+        with db_engine.begin() as conn:
+            conn.execute(text("CREATE INDEX ix_files_project_id ON files (project_id)"))
+        monkeypatch.setattr(database, "engine", db_engine)
+
+        database.drop_obsolete_indexes()
+
+        names = {index["name"] for index in inspect(db_engine).get_indexes("files")}
+        assert "ix_files_project_id" not in names
+        assert "ix_files_project_created_id" in names
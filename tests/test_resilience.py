@@ -0,0 +1,190 @@
+"""
+Testes do circuit breaker, novas tentativas, hedging e bulkheads da API secundária
+Rode com: pytest -v
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services.api_secondary import SecondaryAPIService
+from app.services.resilience import Bulkhead, BulkheadFull, CircuitBreaker, CircuitOpenError, hedge, retry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "http://secundaria/api/files/1/tags")
+    return httpx.HTTPStatusError("erro", request=request, response=httpx.Response(status_code, request=request))
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "SECONDARY_API_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(settings, "SECONDARY_API_RETRY_MAX_DELAY", 0.0)
+
+
+class TestCircuitBreaker:
+    """Testes das transições de estado do circuito"""
+
+    def test_abre_espera_e_fecha_apos_chamada_de_teste(self):
+        """Abre após falhas seguidas, recusa até o tempo de espera e fecha com sucesso"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10, clock=clock)
+
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError) as error:
+            breaker.before_call()
+        assert error.value.retry_after == 10
+
+        clock.now = 10
+        breaker.before_call()
+        assert breaker.state == "half_open"
+        # Só uma chamada de teste por vez
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.snapshot()["state"] == "closed"
+        assert breaker.snapshot()["times_opened"] == 1
+
+    def test_falha_na_chamada_de_teste_reabre(self):
+        """Falha em half_open reabre o circuito imediatamente"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5, clock=clock)
+        breaker.record_failure()
+        clock.now = 5
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.is_open()
+
+
+class TestRetryAndHedge:
+    """Testes das novas tentativas e do hedging"""
+
+    def test_repete_apenas_erros_passageiros(self):
+        """503 é repetido até dar certo; 400 falha na primeira tentativa"""
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise _status_error(503)
+            return "ok"
+
+        assert asyncio.run(retry(flaky, attempts=3, base_delay=0, max_delay=0)) == "ok"
+        assert len(calls) == 3
+
+        async def bad_request():
+            calls.append(1)
+            raise _status_error(400)
+
+        calls.clear()
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(retry(bad_request, attempts=3, base_delay=0, max_delay=0))
+        assert len(calls) == 1
+
+    def test_hedge_usa_a_primeira_resposta(self):
+        """A cópia disparada após o atraso responde antes e a lenta é cancelada"""
+        started = []
+        cancelled = []
+
+        async def call():
+            started.append(1)
+            try:
+                await asyncio.sleep(1.0 if len(started) == 1 else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return len(started)
+
+        async def scenario():
+            result = await hedge(call, delay=0.02)
+            await asyncio.sleep(0)
+            return result
+
+        assert asyncio.run(scenario()) == 2
+        assert cancelled == [1]
+
+
+class TestBulkhead:
+    """Testes do limite de chamadas simultâneas"""
+
+    def test_recusa_quando_lotado(self):
+        """Quem não consegue vaga dentro do tempo de espera recebe BulkheadFull"""
+        bulkhead = Bulkhead("teste", max_concurrent=1, max_wait=0.01)
+
+        async def scenario():
+            async with bulkhead:
+                with pytest.raises(BulkheadFull):
+                    async with bulkhead:
+                        pass
+            async with bulkhead:
+                return bulkhead.snapshot()
+
+        assert asyncio.run(scenario()) == {"in_flight": 1, "max": 1, "rejected": 1}
+
+
+class TestSecondaryAPIResilience:
+    """Testes da camada de resiliência no serviço"""
+
+    def test_circuito_aberto_degrada_tags_sem_chamadas(self, monkeypatch):
+        """Com a API falhando o circuito abre e as listagens ficam sem chamadas à API"""
+        monkeypatch.setattr(settings, "SECONDARY_API_BREAKER_FAILURE_THRESHOLD", 3)
+        monkeypatch.setattr(settings, "SECONDARY_API_RETRY_ATTEMPTS", 1)
+        requests = []
+
+        def handler(request):
+            requests.append(request.url.path)
+            return httpx.Response(503)
+
+        service = SecondaryAPIService(transport=httpx.MockTransport(handler))
+
+        async def scenario():
+            first = await service.get_tags_for_files([1, 2, 3])
+            calls = len(requests)
+            second = await service.fetch_tags([4, 5])
+            return first, calls, second
+
+        first, calls, second = asyncio.run(scenario())
+
+        assert first == {1: [], 2: [], 3: []}
+        assert service.breaker.state == "open"
+        # Lote + chamadas individuais até abrir o circuito; depois nenhuma
+        assert calls == len(requests) <= 3
+        assert second == {4: None, 5: None}
+
+    def test_upload_falha_rapido_com_circuito_aberto(self):
+        """Uploads não chegam à API enquanto o circuito estiver aberto"""
+        def handler(request):
+            raise AssertionError("não deveria chamar a API")
+
+        service = SecondaryAPIService(transport=httpx.MockTransport(handler))
+        for _ in range(service.breaker.failure_threshold):
+            service.breaker.record_failure()
+
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(service.upload_file(b"conteudo", "a.png", "image/png"))
+        assert service.resilience_stats()["circuit"]["rejected"] == 1
+
+    def test_get_repetido_em_erro_passageiro(self, monkeypatch):
+        """GET de tags é repetido após 502 sem abrir o circuito"""
+        monkeypatch.setattr(settings, "SECONDARY_API_RETRY_ATTEMPTS", 3)
+        responses = [httpx.Response(502), httpx.Response(200, json={"tags": ["Dog"]})]
+
+        service = SecondaryAPIService(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+
+        assert asyncio.run(service.get_file_tags(1)) == {"tags": ["Dog"]}
+        assert service.breaker.snapshot()["state"] == "closed"
+        assert service.breaker.failures == 0
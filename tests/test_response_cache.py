@@ -0,0 +1,175 @@
+"""
+Testes do cache das listagens com ETag e versões de usuário/projeto (SQLite em memória)
+Rode com: pytest -v
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import db as database
+from app.database.db import User, Project, File
+from app.main import app
+from app.routes.auth import create_access_token
+from app.services.auth_cache import auth_cache
+from app.services.response_cache import response_cache
+
+
+@pytest.fixture
+def owner(db):
+    user = User(name="Ana", email="ana@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _version(db, model, id):
+    return db.scalar(select(model.cache_version).where(model.id == id))
+
+
+class TestVersions:
+    """Testes do incremento das versões"""
+
+    def test_flush_incrementa_projeto_e_dono(self, db, owner):
+        """Arquivo novo muda o seu projeto e o usuário, mas não os outros projetos"""
+        project = Project(name="P", client_name="C", owner=owner)
+        other = Project(name="Q", client_name="C", owner=owner)
+        db.add_all([project, other])
+        db.commit()
+        before = (_version(db, User, owner.id), _version(db, Project, project.id), _version(db, Project, other.id))
+
+        db.add(File(filename="a.png", file_path="", file_type="image/png", size=1, project=project))
+        db.commit()
+
+        after = (_version(db, User, owner.id), _version(db, Project, project.id), _version(db, Project, other.id))
+        assert after[0] > before[0]
+        assert after[1] > before[1]
+        assert after[2] == before[2]
+
+    def test_flush_sem_alteracao_nao_incrementa(self, db, owner):
+        """Objetos carregados e não alterados não mudam a versão"""
+        project = Project(name="P", client_name="C", owner=owner)
+        db.add(project)
+        db.commit()
+        version = _version(db, Project, project.id)
+
+        project.name = "P"
+        db.commit()
+
+        assert _version(db, Project, project.id) == version
+
+
+class TestConditionalGet:
+    """Testes das respostas 304 e do conteúdo em cache nas rotas"""
+
+    @pytest.fixture
+    def client(self, db_overrides, owner):
+        response_cache.clear()
+        auth_cache.clear()
+        token = create_access_token(data={"sub": owner.email, "uid": owner.id})
+        try:
+            yield TestClient(app, headers={"Authorization": f"Bearer {token}"})
+        finally:
+            auth_cache.clear()
+
+    def test_304_ate_a_proxima_alteracao(self, client):
+        """Mesmo ETag responde 304; criar um projeto gera outro ETag"""
+        first = client.get("/projects")
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+
+        not_modified = client.get("/projects", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.headers["etag"] == etag
+
+        client.post("/projects", json={"name": "Novo", "client_name": "C"})
+        changed = client.get("/projects", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert [project["name"] for project in changed.json()] == ["Novo"]
+
+    def test_conteudo_em_cache_so_consulta_a_versao(self, client, db_engine):
+        """Sem If-None-Match a resposta vem do cache com uma única consulta"""
+        project_id = client.post("/projects", json={"name": "P", "client_name": "C"}).json()["id"]
+        first = client.get(f"/projects/{project_id}")
+        statements = []
+        event.listen(db_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        second = client.get(f"/projects/{project_id}")
+
+        assert second.json() == first.json()
+        assert second.headers["etag"] == first.headers["etag"]
+        assert len(statements) == 1 and "cache_version" in statements[0]
+
+    def test_projeto_de_outro_usuario(self, client, db):
+        """A verificação da versão mantém o 404 para projetos de outros usuários"""
+        stranger = User(name="Bia", email="bia@example.com", hashed_password="x")
+        project = Project(name="Dela", client_name="C", owner=stranger)
+        db.add(project)
+        db.commit()
+
+        assert client.get(f"/projects/{project.id}").status_code == 404
+
+
+class TestReplicaLag:
+    """Testes da versão lida no primário quando há réplica de leitura"""
+
+    @pytest.fixture
+    def replica(self, memory_engine):
+        return memory_engine()
+
+    @pytest.fixture
+    def client(self, db_overrides, session_factory, session_dependency, replica, owner, monkeypatch):
+        # Versões lidas pelo open_session no primário
+        monkeypatch.setattr(settings, "DATABASE_REPLICA_URL", "sqlite://")
+        monkeypatch.setattr(settings, "DB_MODE", "sync")
+        monkeypatch.setattr(database, "SessionLocal", session_factory)
+        db_overrides[database.get_read_db] = session_dependency(sessionmaker(bind=replica, expire_on_commit=False))
+        response_cache.clear()
+        auth_cache.clear()
+        token = create_access_token(data={"sub": owner.email, "uid": owner.id})
+        try:
+            yield TestClient(app, headers={"Authorization": f"Bearer {token}"})
+        finally:
+            auth_cache.clear()
+
+    @staticmethod
+    def _replicate(primary, replica):
+        with primary.connect() as source, replica.begin() as target:
+            for table in (Project.__table__, User.__table__):
+                target.execute(table.delete())
+            for table in (User.__table__, Project.__table__):
+                rows = [dict(row._mapping) for row in source.execute(table.select())]
+                if rows:
+                    target.execute(table.insert(), rows)
+
+    def test_replica_atrasada_responde_sem_cache(self, client, db_engine, replica):
+        """Sem 304 para a cópia anterior enquanto a réplica não recebe a escrita do cliente"""
+        self._replicate(db_engine, replica)
+        etag = client.get("/projects").headers["etag"]
+
+        client.post("/projects", json={"name": "Novo", "client_name": "C"})
+        lagging = client.get("/projects", headers={"If-None-Match": etag})
+
+        assert lagging.status_code == 200
+        assert "etag" not in lagging.headers
+        assert client.get("/projects").json() == []
+
+        self._replicate(db_engine, replica)
+        current = client.get("/projects", headers={"If-None-Match": etag})
+        assert current.status_code == 200
+        assert current.headers["etag"] != etag
+        assert [project["name"] for project in current.json()] == ["Novo"]
+
+    def test_projeto_existente_com_replica_atrasada(self, client, db_engine, replica):
+        """Versão divergente não vira 404: o projeto sai da réplica, sem ETag"""
+        project_id = client.post("/projects", json={"name": "P", "client_name": "C"}).json()["id"]
+        self._replicate(db_engine, replica)
+        client.put(f"/projects/{project_id}", json={"name": "P2", "client_name": "C"})
+
+        response = client.get(f"/projects/{project_id}")
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "P"
+        assert "etag" not in response.headers
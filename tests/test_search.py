@@ -0,0 +1,94 @@
+"""
+Testes da busca de arquivos no índice de fallback (SQLite em memória)
+Rode com: pytest -v
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.database.db import User, Project, File, ThreadedSession
+from app.services import search
+from app.services.tags import store_file_tags
+
+
+@pytest.fixture
+def user(db):
+    user = User(name="Ana", email="ana@example.com", hashed_password="x")
+    wedding = Project(name="Casamento", client_name="Ana", description="fotos da praia", owner=user)
+    other = Project(name="Outro", client_name="Bia", owner=user)
+    for project, name, tags in [
+        (other, "praia_1.png", ["Sky"]),
+        (other, "cachorro.png", ["Praia"]),
+        (other, "bolo.png", []),
+        (wedding, "convite.pdf", []),
+        (other, "100%.png", []),
+    ]:
+        file = File(filename=name, file_path="", file_type="image/png", size=1, project=project)
+        db.add(file)
+        store_file_tags(db, file, tags)
+    db.flush()
+    return user
+
+
+def search_files(db, *args, **kwargs):
+    return asyncio.run(search.search_files(ThreadedSession(db), *args, **kwargs))
+
+
+def _names(files):
+    return [file.filename for file in files]
+
+
+class TestSearch:
+    """Testes de relevância e paginação da busca"""
+
+    def test_combina_nome_tags_e_projeto(self, db, user):
+        """Nome do arquivo pesa mais que tags, que pesam mais que o projeto"""
+        files, next_cursor = search_files(db, user.id, "praia", None, False, limit=10)
+        assert _names(files) == ["praia_1.png", "cachorro.png", "convite.pdf"]
+        assert next_cursor is None
+
+    def test_escapa_curingas(self, db, user):
+        """% e _ no termo são literais"""
+        files, _ = search_files(db, user.id, "0%", None, False, limit=10)
+        assert _names(files) == ["100%.png"]
+
+    def test_filtra_por_tags(self, db, user):
+        """Termo e tags são combinados na mesma consulta"""
+        files, _ = search_files(db, user.id, "png", ["sky"], False, limit=10)
+        assert _names(files) == ["praia_1.png"]
+
+    def test_paginacao_por_relevancia(self, db, user):
+        """O cursor percorre todos os resultados sem repetir"""
+        seen, cursor = [], None
+        while True:
+            files, cursor = search_files(db, user.id, "png", None, False, limit=2, cursor=cursor)
+            seen += _names(files)
+            if cursor is None:
+                break
+        assert sorted(seen) == ["100%.png", "bolo.png", "cachorro.png", "praia_1.png"]
+
+    def test_paginacao_so_por_tags(self, db, user):
+        """Só com tags o cursor vem das colunas projetadas, sem entidades File"""
+        first, cursor = search_files(db, user.id, None, ["sky", "praia"], False, limit=1)
+        second, last_cursor = search_files(db, user.id, None, ["sky", "praia"], False, limit=1, cursor=cursor)
+
+        assert sorted(_names(first + second)) == ["cachorro.png", "praia_1.png"]
+        assert last_cursor is None
+        assert not isinstance(first[0], File)
+
+    def test_outro_usuario_nao_ve_arquivos(self, db, user):
+        """A busca fica restrita aos projetos do usuário"""
+        files, _ = search_files(db, user.id + 1, "praia", None, False, limit=10)
+        assert files == []
+
+    def test_candidatos_restritos_ao_usuario(self, db, user):
+        """Os três ramos dos candidatos (nome, projeto e tags) filtram pelo usuário"""
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        search_files(db, user.id, "praia", None, False, limit=10)
+
+        candidates = statements[-1].split(" IN (SELECT ", 1)[1].split(" UNION ")
+        assert len(candidates) == 3
+        assert all("projects.user_id = ?" in branch for branch in candidates)
@@ -0,0 +1,73 @@
+"""
+Testes do caminho rápido de serialização das listagens
+Rode com: pytest -v
+"""
+import json
+from datetime import datetime
+from typing import List
+
+import pytest
+from fastapi import Response
+from pydantic import TypeAdapter, ValidationError
+
+from app.config import settings
+from app.models.schemas import FileResponse, ProjectResponse
+from app.services.serialization import dumps, trusted_response
+
+FILES = [
+    {
+        "id": i,
+        "filename": f"foto-{i}.png",
+        "file_type": "image/png",
+        "size": 1024 * i,
+        "project_id": 7,
+        "tags": ["praia", "pôr do sol"],
+        "status": "ready",
+        "created_at": datetime(2024, 5, 1, 12, 30, i, 123456),
+    }
+    for i in range(3)
+]
+
+FILE_LIST_ADAPTER = TypeAdapter(List[FileResponse])
+
+
+class TestTrustedResponse:
+    """Testes de ``trusted_response``"""
+
+    def test_mesmo_json_que_o_response_model(self):
+        """Sem validação o corpo equivale ao dump validado pelo pydantic"""
+        validated = FILE_LIST_ADAPTER.dump_json(FILE_LIST_ADAPTER.validate_python(FILES))
+
+        assert json.loads(dumps(FILES)) == json.loads(validated)
+
+    def test_projeto_com_datetime(self):
+        """Datas saem no formato ISO, como no FastAPI"""
+        project = {
+            "id": 1, "name": "P", "client_name": "C", "description": None,
+            "user_id": 2, "created_at": datetime(2024, 5, 1, 12, 30), "file_count": 0,
+        }
+        adapter = TypeAdapter(ProjectResponse)
+
+        assert json.loads(dumps(project)) == json.loads(adapter.dump_json(adapter.validate_python(project)))
+        assert json.loads(dumps(project))["created_at"] == "2024-05-01T12:30:00"
+
+    def test_leva_os_cabecalhos(self):
+        """Cabeçalhos definidos na Response injetada (paginação, ETag) são mantidos"""
+        response = Response()
+        response.headers["X-Next-Cursor"] = "abc"
+
+        result = trusted_response(FILES, response)
+
+        assert result.status_code == 200
+        assert result.headers["x-next-cursor"] == "abc"
+        assert result.headers["content-type"] == "application/json"
+        assert int(result.headers["content-length"]) == len(result.body)
+
+    def test_validacao_detecta_divergencia(self, monkeypatch):
+        """Com RESPONSE_VALIDATION um campo faltando gera erro"""
+        monkeypatch.setattr(settings, "RESPONSE_VALIDATION", True)
+        invalid = [{key: value for key, value in FILES[0].items() if key != "project_id"}]
+
+        assert json.loads(trusted_response(FILES, Response(), FILE_LIST_ADAPTER).body)[0]["id"] == 0
+        with pytest.raises(ValidationError):
+            trusted_response(invalid, Response(), FILE_LIST_ADAPTER)
@@ -0,0 +1,100 @@
+"""
+Testes das tags gravadas localmente (SQLite em memória)
+Rode com: pytest -v
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import db as database
+from app.database.db import User, Project, File, Tag, ThreadedSession
+from app.services import tag_sync
+from app.services.tags import local_tag_names, store_file_tags, tag_filter
+
+
+def _file(db, project, name, tags):
+    file = File(filename=name, file_path="", file_type="image/png", size=1, project=project)
+    db.add(file)
+    store_file_tags(db, file, tags)
+    db.flush()
+    return file
+
+
+class TestLocalTags:
+    """Testes de gravação e busca de tags"""
+
+    def test_reutiliza_tags_existentes(self, db):
+        """Tags repetidas não duplicam registros"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        project = Project(name="P", client_name="C", owner=user)
+        first = _file(db, project, "a.png", ["Dog", " Dog ", "Sky"])
+        second = _file(db, project, "b.png", ["Sky"])
+        db.commit()
+
+        assert [tag.name for tag in first.tags] == ["Dog", "Sky"]
+        assert second.tags[0].id == first.tags[1].id
+        assert first.tags_synced_at is not None
+        assert len(db.scalars(select(Tag)).all()) == 2
+
+    def test_busca_any_e_all(self, db):
+        """Busca por tags com semântica OU e E"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        project = Project(name="P", client_name="C", owner=user)
+        dog = _file(db, project, "dog.png", ["Dog", "Grass"])
+        both = _file(db, project, "both.png", ["Dog", "Sky"])
+        _file(db, project, "sky.png", ["Sky"])
+        db.commit()
+
+        any_ids = db.scalars(select(File.id).where(tag_filter(["dog"]))).all()
+        all_ids = db.scalars(select(File.id).where(tag_filter(["dog", "SKY"], match_all=True))).all()
+
+        assert sorted(any_ids) == sorted([dog.id, both.id])
+        assert all_ids == [both.id]
+
+    def test_nomes_por_arquivo_em_ordem(self, db):
+        """As tags da listagem saem agrupadas por arquivo e em ordem alfabética"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        project = Project(name="P", client_name="C", owner=user)
+        first = _file(db, project, "a.png", ["Sky", "Dog"])
+        second = _file(db, project, "b.png", [])
+        db.commit()
+
+        names = asyncio.run(local_tag_names(ThreadedSession(db), [first.id, second.id]))
+
+        assert names == {first.id: ["Dog", "Sky"]}
+        assert asyncio.run(local_tag_names(ThreadedSession(db), [])) == {}
+
+
+class TestReconcileTags:
+    """Testes da sincronização periódica das tags"""
+
+    def test_falhas_permanentes_nao_travam_a_fila(self, db, session_factory, monkeypatch):
+        """Arquivos cuja busca falha vão para o fim e os demais são sincronizados"""
+        user = User(name="Ana", email="ana@example.com", hashed_password="x")
+        project = Project(name="P", client_name="C", owner=user)
+        # Removidos da API secundária: sempre falham
+        gone = [File(filename=f"{i}.png", file_path="", file_type="image/png", size=1,
+                     project=project, secondary_file_id=i) for i in (1, 2)]
+        pending = File(filename="3.png", file_path="", file_type="image/png", size=1,
+                       project=project, secondary_file_id=3)
+        db.add_all([*gone, pending])
+        db.commit()
+        calls = []
+
+        async def fetch_tags(ids):
+            calls.append(ids)
+            return {file_id: (["Sky"] if file_id == 3 else None) for file_id in ids}
+
+        monkeypatch.setattr(settings, "DB_MODE", "sync")
+        monkeypatch.setattr(database, "SessionLocal", session_factory)
+        monkeypatch.setattr(tag_sync.secondary_api, "fetch_tags", fetch_tags)
+
+        assert asyncio.run(tag_sync.reconcile_tags(batch_size=2)) == 0
+        assert asyncio.run(tag_sync.reconcile_tags(batch_size=2)) == 1
+
+        assert calls == [[1, 2], [3, 1]]
+        db.expire_all()
+        assert [tag.name for tag in pending.tags] == ["Sky"]
+        assert all(file.tags_synced_at is None and file.tags_sync_attempted_at for file in gone)
@@ -0,0 +1,249 @@
+"""
+Testes dos uploads assíncronos: fila, novas tentativas, retomada e long-poll
+(SQLite em arquivo, com DB_MODE=sync e DB_MODE=async)
+Rode com: pytest -v
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+from app.database import db as database
+from app.database.db import Base, User, Project, File, UploadJob
+from app.main import app
+from app.routes.auth import create_access_token
+from app.services import upload_jobs
+from app.services.auth_cache import auth_cache
+from app.services.upload_jobs import UploadJobQueue
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(params=["sync", "async"])
+def session_factory(request, monkeypatch, tmp_path):
+    """Banco SQLite em arquivo acessado pelo open_session nos dois DB_MODE.
+
+    A fábrica retornada é síncrona, para preparar e conferir os dados.
+    """
+    path = tmp_path / "app.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        # Leituras dos testes não bloqueiam as escritas dos workers
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+
+    monkeypatch.setattr(settings, "DB_MODE", request.param)
+    monkeypatch.setattr(database, "SessionLocal", factory)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", factory)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    monkeypatch.setitem(
+        database.async_sessionmakers, "primary",
+        async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    )
+
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    monkeypatch.setattr(settings, "UPLOAD_STAGING_DIR", str(staging))
+    monkeypatch.setattr(settings, "UPLOAD_JOB_RETRY_BACKOFF_SECONDS", 0.01)
+    try:
+        yield factory
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def project(session_factory):
+    db = session_factory()
+    project = Project(name="P", client_name="C", owner=User(name="Ana", email="ana@example.com", hashed_password="x"))
+    db.add(project)
+    db.commit()
+    db.close()
+    return project
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """Respostas da API secundária por chamada: exceção ou id do arquivo"""
+    outcomes = []
+
+    async def upload_file(file_content, filename, file_type):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"file_id": outcome, "file_path": f"/remoto/{filename}", "tags": ["Dog"]}
+
+    monkeypatch.setattr(upload_jobs.secondary_api, "upload_file", upload_file)
+    return outcomes
+
+
+def _staged_job(session_factory, project, tmp_path, status="queued", updated_at=None, name="a.png"):
+    path = tmp_path / "staging" / f"upload-{name}"
+    path.write_bytes(name.encode())
+    db = session_factory()
+    file = File(filename=name, file_path="", file_type="image/png", size=5, project_id=project.id,
+                content_hash=name, status="pending")
+    db.add(file)
+    db.flush()
+    job = UploadJob(file_id=file.id, staging_path=str(path), status=status)
+    if updated_at is not None:
+        job.updated_at = updated_at
+    db.add(job)
+    db.commit()
+    db.close()
+    return file.id, job.id, path
+
+
+async def _process_until_done(queue, session_factory, file_id, timeout=5.0):
+    # Os workers rodam neste loop; as novas tentativas chegam por call_later
+    await queue.start()
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            db = session_factory()
+            status = db.get(File, file_id).status
+            db.close()
+            if status in ("ready", "failed"):
+                # O commit do status pode chegar antes do fim do job (remoção do arquivo em espera)
+                await asyncio.wait_for(queue._queue.join(), deadline - time.monotonic())
+                return status
+            await asyncio.sleep(0.01)
+        raise AssertionError("upload não terminou")
+    finally:
+        await queue.stop()
+
+
+class TestUploadJobQueue:
+    """Testes do processamento dos jobs"""
+
+    def test_falha_e_depois_conclui(self, session_factory, project, uploads, tmp_path):
+        """Uma falha é tentada de novo com espera e o upload termina"""
+        file_id, job_id, path = _staged_job(session_factory, project, tmp_path)
+        uploads.extend([ConnectionError("fora do ar"), 42])
+
+        assert run(_process_until_done(UploadJobQueue(), session_factory, file_id)) == "ready"
+
+        db = session_factory()
+        job, file = db.get(UploadJob, job_id), db.get(File, file_id)
+        assert (job.status, job.attempts, job.last_error) == ("done", 2, None)
+        assert (file.secondary_file_id, [tag.name for tag in file.tags]) == (42, ["Dog"])
+        assert not path.exists()
+
+    def test_esgota_as_tentativas(self, session_factory, project, uploads, tmp_path, monkeypatch):
+        """Após UPLOAD_JOB_MAX_ATTEMPTS falhas o arquivo fica como "failed\""""
+        monkeypatch.setattr(settings, "UPLOAD_JOB_MAX_ATTEMPTS", 2)
+        file_id, job_id, path = _staged_job(session_factory, project, tmp_path)
+        uploads.extend([ConnectionError("fora do ar"), ConnectionError("ainda fora")])
+
+        assert run(_process_until_done(UploadJobQueue(), session_factory, file_id)) == "failed"
+
+        job = session_factory().get(UploadJob, job_id)
+        assert (job.status, job.attempts, job.last_error) == ("failed", 2, "ainda fora")
+        assert uploads == []
+        assert not path.exists()
+
+    def test_retoma_jobs_pendentes_e_abandonados(self, session_factory, project, tmp_path):
+        """Na inicialização voltam à fila os jobs em espera e os "running" antigos"""
+        old = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_JOB_STALE_SECONDS + 60)
+        _, queued, _ = _staged_job(session_factory, project, tmp_path, name="a.png")
+        _, abandoned, _ = _staged_job(session_factory, project, tmp_path, "running", old, name="b.png")
+        _, running, _ = _staged_job(session_factory, project, tmp_path, "running", name="c.png")
+        _staged_job(session_factory, project, tmp_path, "done", name="d.png")
+
+        assert run(UploadJobQueue()._recover_jobs()) == [queued, abandoned]
+        assert session_factory().get(UploadJob, running).status == "running"
+
+
+class TestWaitForFile:
+    """Testes da espera usada pelo long-poll"""
+
+    def test_notificacao_e_tempo_esgotado(self):
+        """Termina ao ser notificado ou no tempo limite, sem deixar eventos para trás"""
+        queue = UploadJobQueue()
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, queue._notify, 1)
+            start = time.monotonic()
+            await asyncio.gather(queue.wait_for_file(1, 5), queue.wait_for_file(1, 5))
+            notified = time.monotonic() - start
+
+            start = time.monotonic()
+            await queue.wait_for_file(2, 0.05)
+            return notified, time.monotonic() - start
+
+        notified, timed_out = run(scenario())
+
+        assert notified < 1
+        assert timed_out >= 0.05
+        assert queue._waiters == {}
+
+
+class TestAsyncUploadRoutes:
+    """Testes de POST /files/upload?mode=async e GET /files/{id}/status"""
+
+    @pytest.fixture
+    def client(self, session_factory, project):
+        # Sem dependency_overrides: get_db/get_read_db abrem a sessão do DB_MODE
+        auth_cache.clear()
+        token = create_access_token(data={"sub": "ana@example.com", "uid": project.user_id})
+        try:
+            yield TestClient(app, headers={"Authorization": f"Bearer {token}"})
+        finally:
+            auth_cache.clear()
+
+    def test_aceita_com_202(self, client, session_factory, project, tmp_path):
+        """O upload vai para a área de espera e um job fica na fila"""
+        response = client.post(
+            "/files/upload", params={"mode": "async"},
+            data={"project_id": project.id}, files={"file": ("a.png", b"conteudo", "image/png")}
+        )
+
+        assert response.status_code == 202
+        body = response.json()
+        assert body["status"] == "pending"
+        assert body["status_url"] == f"/files/{body['file_id']}/status"
+        job = session_factory().get(UploadJob, body["job_id"])
+        assert (job.file_id, job.status) == (body["file_id"], "queued")
+        assert open(job.staging_path, "rb").read() == b"conteudo"
+        assert os.path.dirname(job.staging_path) == settings.UPLOAD_STAGING_DIR
+
+    def test_long_poll_tempo_esgotado(self, client, session_factory, project, tmp_path):
+        """Sem conclusão, responde com o status pendente ao fim da espera"""
+        file_id, _, _ = _staged_job(session_factory, project, tmp_path)
+
+        start = time.monotonic()
+        response = client.get(f"/files/{file_id}/status", params={"wait": 0.3})
+
+        assert time.monotonic() - start >= 0.3
+        assert response.json()["status"] == "pending"
+        assert upload_jobs.upload_queue._waiters == {}
+
+    def test_long_poll_conclusao(self, client, session_factory, project, tmp_path):
+        """Responde assim que o upload termina, antes do fim da espera"""
+        file_id, _, _ = _staged_job(session_factory, project, tmp_path)
+
+        def finish():
+            db = session_factory()
+            db.get(File, file_id).status = "ready"
+            db.commit()
+            db.close()
+
+        # Outro processo concluindo o job: percebido pela nova consulta do long-poll
+        threading.Timer(0.2, finish).start()
+        start = time.monotonic()
+        response = client.get(f"/files/{file_id}/status", params={"wait": 10})
+
+        assert time.monotonic() - start < 5
+        assert response.json()["status"] == "ready"
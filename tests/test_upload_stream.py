@@ -0,0 +1,41 @@
+"""
+Testes do envio de uploads em pedaços
+Rode com: pytest -v
+"""
+import hashlib
+import io
+
+import pytest
+
+from app.services.upload_stream import HashingReader, UploadTooLarge
+
+
+class TestHashingReader:
+    """Testes da leitura com contagem e hash"""
+
+    def test_conta_e_calcula_hash(self):
+        """Tamanho e SHA-256 são calculados durante a leitura"""
+        data = b"abc" * 1000
+        reader = HashingReader(io.BytesIO(data))
+        while reader.read(100):
+            pass
+
+        assert reader.size == len(data)
+        assert reader.hexdigest() == hashlib.sha256(data).hexdigest()
+
+    def test_reinicia_ao_voltar_ao_inicio(self):
+        """Reler o arquivo (ex.: nova tentativa do httpx) não duplica a contagem"""
+        reader = HashingReader(io.BytesIO(b"abcdef"))
+        reader.read()
+        reader.seek(0)
+        reader.read()
+
+        assert reader.size == 6
+        assert reader.hexdigest() == hashlib.sha256(b"abcdef").hexdigest()
+
+    def test_interrompe_acima_do_limite(self):
+        """A leitura falha assim que o limite é ultrapassado"""
+        reader = HashingReader(io.BytesIO(b"x" * 10), max_size=5)
+        reader.read(4)
+        with pytest.raises(UploadTooLarge):
+            reader.read(4)
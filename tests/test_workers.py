@@ -0,0 +1,104 @@
+"""
+Testes da base dos workers periódicos
+Rode com: pytest -v
+"""
+import asyncio
+
+import pytest
+
+from app.services.workers import PeriodicWorker
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Batches(PeriodicWorker):
+    """Worker de teste: cada chamada de ``process`` consome um resultado"""
+
+    def __init__(self, results, interval=60.0):
+        super().__init__()
+        self.results = list(results)
+        self.calls = 0
+        self._interval = interval
+
+    def interval(self) -> float:
+        return self._interval
+
+    def batch_size(self) -> int:
+        return 2
+
+    async def process(self) -> int:
+        self.calls += 1
+        result = self.results.pop(0) if self.results else 0
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+async def _until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "worker não processou"
+        await asyncio.sleep(0.01)
+
+
+class TestPeriodicWorker:
+    """Testes do ciclo start/wake/stop"""
+
+    def test_wake_processa_ate_o_lote_incompleto(self):
+        """Um wake processa sem esperar o intervalo e segue enquanto os lotes vêm cheios"""
+        worker = Batches([2, 2, 1, 2])
+
+        async def scenario():
+            worker.start()
+            worker.wake()
+            await _until(lambda: worker.calls == 3)
+            await asyncio.sleep(0.05)
+            await worker.stop()
+
+        run(scenario())
+
+        assert worker.calls == 3
+        assert worker._task is None
+
+    def test_erro_nao_encerra_o_worker(self):
+        """Uma falha é registrada e a próxima rodada acontece normalmente"""
+        worker = Batches([RuntimeError("banco fora do ar"), 1])
+
+        async def scenario():
+            worker.start()
+            worker.wake()
+            await _until(lambda: worker.calls == 1)
+            worker.wake()
+            await _until(lambda: worker.calls == 2)
+            await worker.stop()
+
+        run(scenario())
+
+        assert worker.results == []
+
+    def test_intervalo_zero_desativa(self):
+        """Sem intervalo o worker não inicia e wake/stop não fazem nada"""
+        worker = Batches([1], interval=0)
+
+        async def scenario():
+            worker.start()
+            worker.wake()
+            await worker.stop()
+
+        run(scenario())
+
+        assert (worker._task, worker.calls) == (None, 0)
+
+    def test_subclasse_incompleta_falha_ao_criar(self):
+        """Sem um dos métodos abstratos o erro aparece na criação, não na tarefa"""
+        class NoBatch(PeriodicWorker):
+            def interval(self) -> float:
+                return 1.0
+
+            async def process(self) -> int:
+                return 0
+
+        with pytest.raises(TypeError):
+            NoBatch()